@@ -0,0 +1,90 @@
+"""
+Compares the two encodings of the units.data / equipment.data columns (POPULATE_DB_DATA_ENCODING in populate_db.py).
+
+Loads the converted units once per encoding into a temporary database and reports the file size, the pages of
+the units table, and the time of three full scans:
+
+  no data   a check_unit_types.py-style table scan that never reads data
+  decode    every unit's data decoded in Python (decode_data)
+  sql       json_extract over every unit's data in SQL (data_json)
+
+Each scan runs on a fresh connection after a warm-up, so the timings compare the pages SQLite walks and the
+decoding, not disk speed.
+
+Usage: python benchmark_data_encoding.py [runs]
+"""
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import populate_db
+
+SCANS = {
+    "no data": lambda conn: conn.execute("SELECT unit_type, COUNT(*), AVG(mass_tons) FROM units NOT INDEXED GROUP BY unit_type").fetchall(),
+    "decode": lambda conn: [populate_db.decode_data(data) for data, in conn.execute("SELECT data FROM units")],
+    "sql": lambda conn: conn.execute("SELECT COUNT(*) FROM units WHERE json_extract(data_json(data), '$.era') = '3050'").fetchall(),
+}
+
+def load_database(db_path, encoding):
+    populate_db.DATA_ENCODING = encoding # Equipment rows are encoded in this process
+    conn = sqlite3.connect(db_path)
+    populate_db.register_data_functions(conn)
+    for pragma in populate_db.BULK_LOAD_PRAGMAS: conn.execute(pragma)
+    with contextlib.redirect_stdout(io.StringIO()): # The loaders' per-item messages are the same for both encodings
+        populate_db.create_schema(conn)
+        deferred_indexes = populate_db.drop_secondary_indexes(conn)
+        populate_db.populate_equipment(conn)
+        unit_count = populate_db.populate_units(conn, encoding=encoding)[0]
+        populate_db.build_indexes(conn, deferred_indexes)
+        populate_db.analyze(conn)
+    conn.close()
+    return unit_count
+
+def table_pages(conn, table):
+    try: return conn.execute("SELECT COUNT(*) FROM dbstat WHERE name = ?", (table,)).fetchone()[0]
+    except sqlite3.OperationalError: return None # SQLite built without the dbstat table
+
+def time_scan(db_path, scan, runs):
+    best = None
+    for _ in range(runs + 1): # The first run warms the OS cache and is not counted
+        conn = sqlite3.connect(db_path)
+        populate_db.register_data_functions(conn)
+        start = time.perf_counter()
+        scan(conn)
+        seconds = time.perf_counter() - start
+        conn.close()
+        best = seconds if best is None or _ == 0 else min(best, seconds)
+    return best
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    if not os.path.isdir(populate_db.MEKFILES_INPUT_DIR):
+        print(f"Error: Input directory '{populate_db.MEKFILES_INPUT_DIR}' not found."); return 1
+
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for encoding in populate_db.DATA_ENCODINGS:
+            db_path = os.path.join(temp_dir, f"{encoding}.sqlite")
+            start = time.perf_counter()
+            unit_count = load_database(db_path, encoding)
+            load_seconds = time.perf_counter() - start
+            conn = sqlite3.connect(db_path)
+            pages = table_pages(conn, "units")
+            conn.close()
+            results[encoding] = (os.path.getsize(db_path), pages, load_seconds, {name: time_scan(db_path, scan, runs) for name, scan in SCANS.items()})
+            print(f"{encoding}: {unit_count} units loaded in {load_seconds:.2f}s")
+
+    print(f"\n{'encoding':<10}{'file MB':>10}{'unit pages':>12}{'load s':>9}" + "".join(f"{name + ' ms':>12}" for name in SCANS))
+    for encoding, (size, pages, load_seconds, scan_seconds) in results.items():
+        print(f"{encoding:<10}{size / 1e6:>10.1f}{pages if pages is not None else '-':>12}{load_seconds:>9.2f}"
+              + "".join(f"{scan_seconds[name] * 1000:>12.1f}" for name in SCANS))
+    text_size, zlib_size = results["text"][0], results["zlib"][0]
+    print(f"\nzlib file size: {zlib_size / text_size:.0%} of text")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,124 @@
 import os
+import sys
 import json
+import contextlib
+import multiprocessing
+import hashlib
+import re
+import time
+import zlib
 import sqlite3 # Changed from psycopg2
 from pathlib import Path
 
 SCRIPT_DIR = Path(__file__).resolve().parent
 
+# Converted units are read through unit_bundle, which handles both the per-file JSON layout and the packed bundle.
+sys.path.append(str(SCRIPT_DIR.parent / "scripts" / "megameklab-conversion"))
+try:
+    from unit_bundle import iter_unit_paths, read_unit_record
+except ImportError as e:
+    print(f"Failed to import unit_bundle.py: {e}")
+    print("Ensure battletech-editor-app/scripts/megameklab-conversion is present.")
+    sys.exit(1)
+
 # --- Database File ---
 SQLITE_DB_FILE = SCRIPT_DIR / "battletech_dev.sqlite" # New SQLite DB file
 
 BASE_INPUT_DIR = SCRIPT_DIR / "megameklab_converted_output"
 MEKFILES_INPUT_DIR = BASE_INPUT_DIR / "mekfiles"
 
-def get_db_connection():
+# SQLite uses ? for placeholders. INSERT OR REPLACE resolves conflicts on the UNIQUE columns
+# (equipment.internal_id, unit_validation_options.name).
+# Note: For created_at with INSERT OR REPLACE, it will always be the time of the last operation.
+# Units are updated in place instead, so a unit keeps its id (and its custom_unit_variants) and its created_at.
+EQUIPMENT_UPSERT_SQL = """
+    INSERT OR REPLACE INTO equipment
+        (internal_id, name, type, category, tech_base, data, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+    """
+UNIT_VALIDATION_OPTIONS_UPSERT_SQL = """
+    INSERT OR REPLACE INTO unit_validation_options
+        (name, data, created_at, updated_at)
+    VALUES (?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+    """
+UNITS_UPSERT_SQL = """
+    INSERT INTO units
+        (original_file_path, unit_type, chassis, model, mul_id, tech_base, era, mass_tons, role, source_book, is_omnimech, omnimech_base_chassis, omnimech_configuration, config, data, content_hash, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+    ON CONFLICT (original_file_path) DO UPDATE SET
+        unit_type = excluded.unit_type, chassis = excluded.chassis, model = excluded.model, mul_id = excluded.mul_id,
+        tech_base = excluded.tech_base, era = excluded.era, mass_tons = excluded.mass_tons, role = excluded.role,
+        source_book = excluded.source_book, is_omnimech = excluded.is_omnimech, omnimech_base_chassis = excluded.omnimech_base_chassis,
+        omnimech_configuration = excluded.omnimech_configuration, config = excluded.config, data = excluded.data,
+        content_hash = excluded.content_hash, updated_at = CURRENT_TIMESTAMP
+    """
+# units_fts (see schema_sqlite.sql) holds each unit's searchable text under rowid = units.id. FTS5 has no upsert,
+# so upsert_units() removes a unit's old text before the upsert and inserts the new text after it, by original_file_path.
+UNITS_FTS_DELETE_SQL = "DELETE FROM units_fts WHERE rowid IN (SELECT id FROM units WHERE original_file_path = ?)"
+UNITS_FTS_INSERT_SQL = """
+    INSERT INTO units_fts (rowid, chassis, model, manufacturers, equipment, fluff)
+    VALUES ((SELECT id FROM units WHERE original_file_path = ?), ?, ?, ?, ?, ?)
+    """ # Not INSERT ... SELECT, which FTS5 handles several times slower
+UNITS_FTS_COLUMNS = ("chassis", "model", "manufacturers", "equipment", "fluff")
+UNIT_FLUFF_KEYS = ("overview", "capabilities", "deployment", "history") # In 'fluff_text' for MTF units, top-level for BLK
+UNITS_BATCH_SIZE = int(os.environ.get("POPULATE_DB_BATCH_SIZE", "500")) # Units per executemany
+# Units are read, hashed, decoded and turned into rows by a process pool while the parent, the single SQLite writer,
+# inserts them.
+UNIT_WORKERS = int(os.environ.get("POPULATE_DB_WORKERS", "0")) or multiprocessing.cpu_count() # 1 decodes in-process
+UNIT_WORKER_CHUNK_SIZE = 64 # Units per task sent to a worker
+
+# Encoding of units.data and equipment.data (POPULATE_DB_DATA_ENCODING). "text" stores the JSON as TEXT, which the app
+# reads directly. "zlib" stores a BLOB: the DATA_FORMAT_ZLIB byte, then zlib-compressed minified JSON, several times
+# smaller. Python reads either encoding through decode_data(); SQL through data_json(), which get_db_connection()
+# registers on its connections (e.g. json_extract(data_json(data), '$.era')).
+DATA_ENCODINGS = ("text", "zlib")
+DATA_ENCODING = os.environ.get("POPULATE_DB_DATA_ENCODING", "text")
+DATA_FORMAT_ZLIB = b"\x01"
+
+# Sync mode (POPULATE_DB_SYNC=1) updates the existing database in place: units are compared by content_hash and
+# only added, changed and removed ones are written, so ids stay stable and custom_unit_variants survive.
+# Without it, main() deletes the database and loads everything.
+SYNC = os.environ.get("POPULATE_DB_SYNC", "0") == "1"
+
+# Bulk-load mode for the full load (POPULATE_DB_BULK_LOAD=0 turns it off). It starts from an empty database, so the
+# secondary indexes are dropped once the schema exists and built in one pass after the inserts, then ANALYZE runs.
+# The pragmas trade crash safety for speed: a failed load is simply rerun. journal_mode=MEMORY (unlike OFF) keeps
+# rollback working; neither it nor synchronous is stored in the file, so the app opens the result with the defaults.
+BULK_LOAD = os.environ.get("POPULATE_DB_BULK_LOAD", "1") != "0"
+BULK_LOAD_PRAGMAS = (
+    "PRAGMA journal_mode=MEMORY",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA cache_size=-65536", # KiB, i.e. 64 MiB
+    "PRAGMA temp_store=MEMORY", # Index builds sort in memory
+)
+
+def encode_data(data):
+    """Value for a units/equipment data column in DATA_ENCODING."""
+    if DATA_ENCODING == "zlib":
+        return DATA_FORMAT_ZLIB + zlib.compress(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    return json.dumps(data)
+
+def data_json(value):
+    """The JSON text of a data column value in either encoding."""
+    if isinstance(value, bytes) and value[:1] == DATA_FORMAT_ZLIB: return zlib.decompress(value[1:]).decode("utf-8")
+    return value
+
+def decode_data(value):
+    """The data stored in a units/equipment data column, in either encoding."""
+    return json.loads(data_json(value))
+
+def register_data_functions(conn):
+    conn.create_function("data_json", 1, data_json, deterministic=True)
+
+def get_db_connection(db_file=SQLITE_DB_FILE):
     conn = None
     try:
-        conn = sqlite3.connect(SQLITE_DB_FILE)
-        print(f"Successfully connected to SQLite database: {SQLITE_DB_FILE}")
+        conn = sqlite3.connect(db_file)
+        register_data_functions(conn)
+        print(f"Successfully connected to SQLite database: {db_file}")
         return conn
     except sqlite3.Error as e:
-        print(f"Error connecting to SQLite database {SQLITE_DB_FILE}: {e}")
+        print(f"Error connecting to SQLite database {db_file}: {e}")
         raise # Re-raise SQLite errors
     except Exception as ex:
         print(f"An unexpected error occurred during DB connection: {ex}")
@@ -37,6 +137,11 @@ def create_schema(conn):
 
         cur = conn.cursor()
         cur.executescript(schema_sql)
+        if 'content_hash' not in [column[1] for column in cur.execute("PRAGMA table_info(units)")]: # Databases from before the column
+            cur.execute("ALTER TABLE units ADD COLUMN content_hash TEXT")
+        # A database created before units_fts existed gets its search text from the units already in it.
+        if cur.execute("SELECT EXISTS (SELECT 1 FROM units) AND NOT EXISTS (SELECT 1 FROM units_fts)").fetchone()[0]:
+            rebuild_unit_search(conn)
         conn.commit() # Commit schema changes
         print("SQLite schema created/verified successfully.")
         return True
@@ -49,7 +154,91 @@ def create_schema(conn):
         conn.rollback()
         return False
 
-def populate_equipment(conn):
+def drop_secondary_indexes(conn):
+    """Drops the schema's CREATE INDEX indexes and returns their SQL for build_indexes.
+
+    The automatic indexes behind UNIQUE columns stay, since INSERT OR REPLACE resolves conflicts through them.
+    """
+    index_rows = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL ORDER BY name").fetchall()
+    for name, _ in index_rows: conn.execute(f'DROP INDEX "{name}"')
+    conn.commit()
+    return [sql for _, sql in index_rows]
+
+def build_indexes(conn, index_sql_list):
+    """Creates the given indexes over the loaded tables and refreshes the query planner statistics."""
+    for sql in index_sql_list: conn.execute(sql)
+    conn.commit()
+
+def analyze(conn):
+    conn.execute("ANALYZE")
+    conn.commit()
+
+def build_equipment_row(item):
+    """Row for EQUIPMENT_UPSERT_SQL from a derivedEquipment.json entry, or None if the item is unusable."""
+    internal_id = item.get('internal_id')
+    name = item.get('name')
+    item_type = item.get('type', 'Unknown')
+    category = item.get('category', 'Unknown')
+    tech_base = item.get('tech_base', '')
+    
+    # Derive tech_base from naming patterns if not specified
+    if not tech_base or tech_base == 'Unknown':
+        item_name_lower = (item.get('name', '') or internal_id or '').lower()
+        
+        # Clan tech patterns
+        if (item_name_lower.startswith('cl') or 
+            item_name_lower.startswith('clan') or
+            'clan' in item_name_lower or
+            item_name_lower.startswith('c ') or
+            'streak' in item_name_lower or
+            ('er ' in item_name_lower and ('laser' in item_name_lower or 'ppc' in item_name_lower)) or
+            'ultra' in item_name_lower):
+            tech_base = 'Clan'
+        
+        # Inner Sphere tech patterns  
+        elif (item_name_lower.startswith('is') or
+              'inner sphere' in item_name_lower or
+              'autocannon' in item_name_lower or
+              'standard' in item_name_lower or
+              'lrm' in item_name_lower or
+              'srm' in item_name_lower or
+              'machine gun' in item_name_lower):
+            tech_base = 'IS'
+        
+        # Default fallback based on more patterns
+        elif any(clan_indicator in item_name_lower for clan_indicator in [
+            'gauss', 'pulse', 'lbx', 'artemis', 'narc', 'tag'
+        ]):
+            tech_base = 'Clan'
+        else:
+            tech_base = 'IS'  # Default to IS for unknown items
+
+    # Debug: Check for invalid tech_base values
+    if tech_base not in ['IS', 'Clan', 'Mixed']:
+        print(f"Invalid tech_base '{tech_base}' for item: {item.get('name', 'Unnamed')} (internal_id: {internal_id})")
+        tech_base = 'IS'  # Force to valid value
+
+    if not internal_id or not name:
+        print(f"Skipping equipment item due to missing internal_id or name: {item.get('name', 'Unnamed')}")
+        return None
+
+    return (
+        internal_id, name, item_type, category,
+        tech_base, encode_data(item) # Store full JSON data (as TEXT unless DATA_ENCODING compresses it)
+    )
+
+def build_equipment_rows(equipment_list):
+    equipment_to_insert = []
+    for item in equipment_list:
+        try:
+            row = build_equipment_row(item)
+            if row is not None: equipment_to_insert.append(row)
+        except Exception as ex: # Broad exception for data prep
+            print(f"Error preparing equipment data for {item.get('internal_id', 'N/A')}: {ex}")
+    return equipment_to_insert
+
+def populate_equipment(conn, sync=False):
+    """Loads derivedEquipment.json; with sync=True only changed items are written and items no longer listed are deleted."""
     filepath = MEKFILES_INPUT_DIR / "derivedEquipment.json"
     if not os.path.exists(filepath):
         print(f"Error: {filepath} not found.")
@@ -58,78 +247,23 @@ def populate_equipment(conn):
     with open(filepath, 'r', encoding='utf-8') as f:
         equipment_list = json.load(f)
 
-    equipment_to_insert = []
-    # SQLite uses ? for placeholders. ON CONFLICT requires an indexed column.
-    # Assuming internal_id is unique and indexed for conflict resolution.
-    sql = """
-    INSERT OR REPLACE INTO equipment
-        (internal_id, name, type, category, tech_base, data, created_at, updated_at)
-    VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-    """
-    # Note: For created_at with INSERT OR REPLACE, it will always be the time of the last operation.
-    # If strict "created_at only on first insert" is needed, a different approach is required.
-
+    equipment_to_insert = build_equipment_rows(equipment_list)
     cur = conn.cursor()
-    for item in equipment_list:
-        try:
-            internal_id = item.get('internal_id')
-            name = item.get('name')
-            item_type = item.get('type', 'Unknown')
-            category = item.get('category', 'Unknown')
-            tech_base = item.get('tech_base', '')
-            
-            # Derive tech_base from naming patterns if not specified
-            if not tech_base or tech_base == 'Unknown':
-                item_name_lower = (item.get('name', '') or internal_id or '').lower()
-                
-                # Clan tech patterns
-                if (item_name_lower.startswith('cl') or 
-                    item_name_lower.startswith('clan') or
-                    'clan' in item_name_lower or
-                    item_name_lower.startswith('c ') or
-                    'streak' in item_name_lower or
-                    ('er ' in item_name_lower and ('laser' in item_name_lower or 'ppc' in item_name_lower)) or
-                    'ultra' in item_name_lower):
-                    tech_base = 'Clan'
-                
-                # Inner Sphere tech patterns  
-                elif (item_name_lower.startswith('is') or
-                      'inner sphere' in item_name_lower or
-                      'autocannon' in item_name_lower or
-                      'standard' in item_name_lower or
-                      'lrm' in item_name_lower or
-                      'srm' in item_name_lower or
-                      'machine gun' in item_name_lower):
-                    tech_base = 'IS'
-                
-                # Default fallback based on more patterns
-                elif any(clan_indicator in item_name_lower for clan_indicator in [
-                    'gauss', 'pulse', 'lbx', 'artemis', 'narc', 'tag'
-                ]):
-                    tech_base = 'Clan'
-                else:
-                    tech_base = 'IS'  # Default to IS for unknown items
-
-            # Debug: Check for invalid tech_base values
-            if tech_base not in ['IS', 'Clan', 'Mixed']:
-                print(f"Invalid tech_base '{tech_base}' for item: {item.get('name', 'Unnamed')} (internal_id: {internal_id})")
-                tech_base = 'IS'  # Force to valid value
-
-            if not internal_id or not name:
-                print(f"Skipping equipment item due to missing internal_id or name: {item.get('name', 'Unnamed')}")
-                continue
 
-            equipment_to_insert.append((
-                internal_id, name, item_type, category,
-                tech_base, json.dumps(item) # Store full JSON data as TEXT
-            ))
-        except Exception as ex: # Broad exception for data prep
-            print(f"Error preparing equipment data for {item.get('internal_id', 'N/A')}: {ex}")
+    removed_ids = []
+    if sync:
+        stored_rows = {row[0]: row for row in cur.execute("SELECT internal_id, name, type, category, tech_base, data FROM equipment")}
+        current_ids = {row[0] for row in equipment_to_insert}
+        removed_ids = [(internal_id,) for internal_id in stored_rows if internal_id not in current_ids]
+        equipment_to_insert = [row for row in equipment_to_insert if stored_rows.get(row[0]) != row]
 
     inserted_updated_count = 0
-    if equipment_to_insert:
+    if equipment_to_insert or removed_ids:
         try:
-            cur.executemany(sql, equipment_to_insert)
+            cur.executemany(EQUIPMENT_UPSERT_SQL, equipment_to_insert)
+            if removed_ids:
+                cur.executemany("DELETE FROM equipment WHERE internal_id = ?", removed_ids)
+                print(f"Removed {len(removed_ids)} equipment items no longer in {filepath}.")
             conn.commit() # Commit all equipment inserts/replaces
             inserted_updated_count = len(equipment_to_insert) # Or cur.rowcount if preferred
         except sqlite3.Error as e:
@@ -140,7 +274,15 @@ def populate_equipment(conn):
             conn.rollback()
     return inserted_updated_count
 
-def populate_unit_validation_options(conn):
+def build_unit_validation_options_row(options_data_root, source="UnitVerifierOptions.json"):
+    """Row for UNIT_VALIDATION_OPTIONS_UPSERT_SQL from the converted UnitVerifierOptions data, or None."""
+    options_data = options_data_root.get('entityverifier') if isinstance(options_data_root, dict) else None
+    if not options_data:
+        print(f"Error: 'entityverifier' key not found in {source}")
+        return None
+    return ('DefaultSettings', json.dumps(options_data))
+
+def populate_unit_validation_options(conn, sync=False):
     filepath = MEKFILES_INPUT_DIR / "UnitVerifierOptions.json"
     if not os.path.exists(filepath):
         print(f"Error: {filepath} not found.")
@@ -151,9 +293,8 @@ def populate_unit_validation_options(conn):
         with open(filepath, 'r', encoding='utf-8') as f:
             options_data_root = json.load(f)
 
-        options_data = options_data_root.get('entityverifier')
-        if not options_data:
-            print(f"Error: 'entityverifier' key not found in {filepath}")
+        options_row = build_unit_validation_options_row(options_data_root, filepath)
+        if options_row is None:
             return 0
 
     except json.JSONDecodeError as e:
@@ -163,14 +304,11 @@ def populate_unit_validation_options(conn):
         print(f"Error reading {filepath}: {ex}")
         return 0
 
-    sql = """
-    INSERT OR REPLACE INTO unit_validation_options
-        (name, data, created_at, updated_at)
-    VALUES (?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-    """
     cur = conn.cursor()
+    if sync and cur.execute("SELECT data FROM unit_validation_options WHERE name = ?", (options_row[0],)).fetchone() == (options_row[1],):
+        return 0 # Unchanged
     try:
-        cur.execute(sql, ('DefaultSettings', json.dumps(options_data)))
+        cur.execute(UNIT_VALIDATION_OPTIONS_UPSERT_SQL, options_row)
         conn.commit()
         return 1
     except sqlite3.Error as e:
@@ -180,170 +318,319 @@ def populate_unit_validation_options(conn):
         print(f"Generic error processing unit_validation_options: {ex}")
         return 0
 
-def populate_units(conn):
-    inserted_updated_count = 0
-    units_to_insert = []
-    BATCH_SIZE = 500
-    cur = conn.cursor()
+def build_unit_row(original_file_rel_path, unit_json_data, content_hash=None):
+    """Row for UNITS_UPSERT_SQL from a converted unit and its path relative to mekfiles (e.g. "meks/3050U/Atlas AS7-D.json").
 
-    sql = """
-    INSERT OR REPLACE INTO units
-        (original_file_path, unit_type, chassis, model, mul_id, tech_base, era, mass_tons, role, source_book, is_omnimech, omnimech_base_chassis, omnimech_configuration, config, data, created_at, updated_at)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+    content_hash is unit_content_hash() of the JSON the unit was read from; None makes the next sync rewrite the unit.
     """
+    filename = os.path.basename(original_file_rel_path)
 
-    for dirpath, _, filenames in os.walk(MEKFILES_INPUT_DIR):
-        for filename in filenames:
-            if filename.endswith(".json") and filename not in ["derivedEquipment.json", "UnitVerifierOptions.json"]:
-                filepath = os.path.join(dirpath, filename)
-                original_file_rel_path = str(Path(filepath).relative_to(MEKFILES_INPUT_DIR))
-
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        unit_json_data = json.load(f)
-
-                    relative_to_mekfiles_root = Path(dirpath).relative_to(MEKFILES_INPUT_DIR)
-                    unit_type = relative_to_mekfiles_root.parts[0] if relative_to_mekfiles_root.parts else "Unknown"
-
-                    chassis = unit_json_data.get('chassis', unit_json_data.get('name'))
-                    model = unit_json_data.get('model', '')
-                    
-                    # If chassis is still None/empty, try to extract from filename
-                    if not chassis:
-                        # Extract chassis from filename (e.g., "Achileus BA (Sqd 4) [David].json" -> "Achileus BA")
-                        filename_without_ext = filename.replace('.json', '')
-                        # Split on first parenthesis to get the base name
-                        if '(' in filename_without_ext:
-                            chassis = filename_without_ext.split('(')[0].strip()
-                        else:
-                            chassis = filename_without_ext
-                    
-                    # If model is still empty, try to extract from filename
-                    if not model and '(' in filename and ')' in filename:
-                        # Extract model from parentheses and brackets (e.g., "(Sqd 4) [David]" -> "Sqd 4 David")
-                        import re
-                        # Find content in parentheses and brackets
-                        paren_match = re.search(r'\(([^)]+)\)', filename)
-                        bracket_match = re.search(r'\[([^\]]+)\]', filename)
-                        
-                        model_parts = []
-                        if paren_match:
-                            model_parts.append(paren_match.group(1))
-                        if bracket_match:
-                            model_parts.append(bracket_match.group(1))
-                        
-                        if model_parts:
-                            model = ' '.join(model_parts)
-                    mul_id = str(unit_json_data.get('mul_id', '')) if unit_json_data.get('mul_id') is not None else None
-
-                    # Handle tech base with proper validation
-                    tech_base = unit_json_data.get('techbase', unit_json_data.get('derived_tech_base', 'Unknown'))
-                    if not isinstance(tech_base, str): tech_base = str(tech_base)
-                    
-                    # Normalize tech base to match schema constraints
-                    tech_base_mapping = {
-                        'Inner Sphere': 'Inner Sphere',
-                        'Clan': 'Clan',
-                        'Mixed (IS Chassis)': 'Mixed (IS Chassis)',
-                        'Mixed (Clan Chassis)': 'Mixed (Clan Chassis)',
-                        'Mixed': 'Mixed (IS Chassis)',  # Default mixed to IS chassis
-                        'IS': 'Inner Sphere',
-                        'C': 'Clan',
-                        'Unknown': 'Inner Sphere'  # Default unknown to Inner Sphere
-                    }
-                    tech_base = tech_base_mapping.get(tech_base, 'Inner Sphere')
-
-                    era_raw = unit_json_data.get('era', unit_json_data.get('derived_era', 'Unknown'))
-                    era = str(era_raw)
-
-                    mass_raw = unit_json_data.get('mass', unit_json_data.get('tonnage'))
-                    mass_tons = None
-                    if mass_raw is not None:
-                        try: mass_tons = int(float(mass_raw))
-                        except (ValueError, TypeError): pass
-
-                    role = unit_json_data.get('role', 'Unknown')
-                    if not isinstance(role, str): role = str(role)
-
-                    source_book = unit_json_data.get('source', unit_json_data.get('source_book'))
-                    if not isinstance(source_book, str) and source_book is not None: source_book = str(source_book)
-
-                    # Extract OmniMech information
-                    config = unit_json_data.get('Config', unit_json_data.get('config', ''))
-                    if not isinstance(config, str): config = str(config) if config else ''
-                    
-                    # Determine if this is an OmniMech
-                    is_omnimech = 'Omnimech' in config or 'OmniMech' in config or unit_json_data.get('is_omnimech', False)
-                    
-                    # Extract OmniMech base chassis and configuration
-                    omnimech_base_chassis = None
-                    omnimech_configuration = None
-                    
-                    if is_omnimech:
-                        # Try to extract base chassis (everything before configuration letter/designation)
-                        omnimech_base_chassis = chassis
-                        
-                        # Try to extract configuration from model field or filename
-                        if model and any(variant in model.upper() for variant in ['PRIME', 'A', 'B', 'C', 'D', 'E', 'F', 'G', 'H']):
-                            # Look for standard OmniMech configuration patterns
-                            import re
-                            config_match = re.search(r'\b(Prime|[A-H])\b', model, re.IGNORECASE)
-                            if config_match:
-                                omnimech_configuration = config_match.group(1).title()
-                            elif 'Prime' in model:
-                                omnimech_configuration = 'Prime'
-                        
-                        # If no configuration found in model, check for it in chassis
-                        if not omnimech_configuration and chassis:
-                            import re
-                            config_match = re.search(r'\b(Prime|[A-H])\b', chassis, re.IGNORECASE)
-                            if config_match:
-                                omnimech_configuration = config_match.group(1).title()
-                                # Remove configuration from base chassis name
-                                omnimech_base_chassis = re.sub(r'\s*(Prime|[A-H])\b', '', chassis, flags=re.IGNORECASE).strip()
-
-                    units_to_insert.append((
-                        original_file_rel_path, unit_type, chassis, model, mul_id,
-                        tech_base, era, mass_tons, role, source_book,
-                        is_omnimech, omnimech_base_chassis, omnimech_configuration, config,
-                        json.dumps(unit_json_data)
-                    ))
-
-                    if len(units_to_insert) >= BATCH_SIZE:
-                        cur.executemany(sql, units_to_insert)
-                        inserted_updated_count += len(units_to_insert)
-                        units_to_insert = []
-
-                except json.JSONDecodeError as e:
-                    print(f"Error decoding JSON from {filepath}: {e}")
-                except sqlite3.Error as e: # This will catch errors from executemany
-                    print(f"Database error processing batch of units (up to {original_file_rel_path}): {e}")
-                    # Decide if to rollback here or let main handle it
-                    conn.rollback() # Rollback this batch
-                    units_to_insert = [] # Clear batch as it failed
-                except Exception as ex:
-                    print(f"Generic error processing unit file {filepath}: {ex}")
+    relative_to_mekfiles_root = Path(original_file_rel_path).parent
+    unit_type = relative_to_mekfiles_root.parts[0] if relative_to_mekfiles_root.parts else "Unknown"
 
-    # Insert any remaining units
-    if units_to_insert:
+    chassis = unit_json_data.get('chassis', unit_json_data.get('name'))
+    model = unit_json_data.get('model', '')
+    # BLK files that repeat a tag give a list of values; keep the first one
+    if isinstance(chassis, list): chassis = chassis[0] if chassis else None
+    if isinstance(model, list): model = model[0] if model else ''
+            
+    # If chassis is still None/empty, try to extract from filename
+    if not chassis:
+        # Extract chassis from filename (e.g., "Achileus BA (Sqd 4) [David].json" -> "Achileus BA")
+        filename_without_ext = filename.replace('.json', '')
+        # Split on first parenthesis to get the base name
+        if '(' in filename_without_ext:
+            chassis = filename_without_ext.split('(')[0].strip()
+        else:
+            chassis = filename_without_ext
+            
+    # If model is still empty, try to extract from filename
+    if not model and '(' in filename and ')' in filename:
+        # Extract model from parentheses and brackets (e.g., "(Sqd 4) [David]" -> "Sqd 4 David")
+        import re
+        # Find content in parentheses and brackets
+        paren_match = re.search(r'\(([^)]+)\)', filename)
+        bracket_match = re.search(r'\[([^\]]+)\]', filename)
+                
+        model_parts = []
+        if paren_match:
+            model_parts.append(paren_match.group(1))
+        if bracket_match:
+            model_parts.append(bracket_match.group(1))
+                
+        if model_parts:
+            model = ' '.join(model_parts)
+    mul_id = str(unit_json_data.get('mul_id', '')) if unit_json_data.get('mul_id') is not None else None
+
+    # Handle tech base with proper validation
+    tech_base = unit_json_data.get('techbase', unit_json_data.get('derived_tech_base', 'Unknown'))
+    if not isinstance(tech_base, str): tech_base = str(tech_base)
+            
+    # Normalize tech base to match schema constraints
+    tech_base_mapping = {
+        'Inner Sphere': 'Inner Sphere',
+        'Clan': 'Clan',
+        'Mixed (IS Chassis)': 'Mixed (IS Chassis)',
+        'Mixed (Clan Chassis)': 'Mixed (Clan Chassis)',
+        'Mixed': 'Mixed (IS Chassis)',  # Default mixed to IS chassis
+        'IS': 'Inner Sphere',
+        'C': 'Clan',
+        'Unknown': 'Inner Sphere'  # Default unknown to Inner Sphere
+    }
+    tech_base = tech_base_mapping.get(tech_base, 'Inner Sphere')
+
+    era_raw = unit_json_data.get('era', unit_json_data.get('derived_era', 'Unknown'))
+    era = str(era_raw)
+
+    mass_raw = unit_json_data.get('mass', unit_json_data.get('tonnage'))
+    mass_tons = None
+    if mass_raw is not None:
+        try: mass_tons = int(float(mass_raw))
+        except (ValueError, TypeError): pass
+
+    role = unit_json_data.get('role', 'Unknown')
+    if not isinstance(role, str): role = str(role)
+
+    source_book = unit_json_data.get('source', unit_json_data.get('source_book'))
+    if not isinstance(source_book, str) and source_book is not None: source_book = str(source_book)
+
+    # Extract OmniMech information
+    config = unit_json_data.get('Config', unit_json_data.get('config', ''))
+    if not isinstance(config, str): config = str(config) if config else ''
+            
+    # Determine if this is an OmniMech
+    is_omnimech = 'Omnimech' in config or 'OmniMech' in config or unit_json_data.get('is_omnimech', False)
+            
+    # Extract OmniMech base chassis and configuration
+    omnimech_base_chassis = None
+    omnimech_configuration = None
+            
+    if is_omnimech:
+        # Try to extract base chassis (everything before configuration letter/designation)
+        omnimech_base_chassis = chassis
+                
+        # Try to extract configuration from model field or filename
+        if model and any(variant in model.upper() for variant in ['PRIME', 'A', 'B', 'C', 'D', 'E', 'F', 'G', 'H']):
+            # Look for standard OmniMech configuration patterns
+            import re
+            config_match = re.search(r'\b(Prime|[A-H])\b', model, re.IGNORECASE)
+            if config_match:
+                omnimech_configuration = config_match.group(1).title()
+            elif 'Prime' in model:
+                omnimech_configuration = 'Prime'
+                
+        # If no configuration found in model, check for it in chassis
+        if not omnimech_configuration and chassis:
+            import re
+            config_match = re.search(r'\b(Prime|[A-H])\b', chassis, re.IGNORECASE)
+            if config_match:
+                omnimech_configuration = config_match.group(1).title()
+                # Remove configuration from base chassis name
+                omnimech_base_chassis = re.sub(r'\s*(Prime|[A-H])\b', '', chassis, flags=re.IGNORECASE).strip()
+
+    return (
+        original_file_rel_path, unit_type, chassis, model, mul_id,
+        tech_base, era, mass_tons, role, source_book,
+        is_omnimech, omnimech_base_chassis, omnimech_configuration, config,
+        encode_data(unit_json_data), content_hash
+    )
+
+def unit_content_hash(raw_unit_json):
+    # The encoding is part of the hash, so a sync after switching DATA_ENCODING rewrites every unit in the new one.
+    content_hash = hashlib.sha256(raw_unit_json).hexdigest()
+    return content_hash if DATA_ENCODING == "text" else f"{content_hash}:{DATA_ENCODING}"
+
+def _search_text(values):
+    # Distinct non-empty strings joined into one FTS column; lists (repeated BLK tags) contribute each entry.
+    strings = []
+    for value in values:
+        for item in value if isinstance(value, list) else [value]:
+            if isinstance(item, str) and item.strip() and item != 'None': strings.append(item.strip())
+    return ' '.join(dict.fromkeys(strings))
+
+def build_unit_search_row(unit_row, unit_json_data):
+    """Row for UNITS_FTS_INSERT_SQL from a unit's build_unit_row row and its converted data."""
+    original_file_rel_path, chassis, model = unit_row[0], unit_row[2], unit_row[3]
+
+    manufacturers = []
+    for key in ('manufacturers', 'system_manufacturers'): # [{"name": ...}, ...]
+        value = unit_json_data.get(key)
+        if isinstance(value, list): manufacturers.extend(entry.get('name') for entry in value if isinstance(entry, dict))
+    system_manufacturers = unit_json_data.get('systemmanufacturers') # BLK: "CHASSIS:Foundation Type 10X ENGINE:Vlar 300 ..."
+    if isinstance(system_manufacturers, str): manufacturers.append(re.sub(r'\b[A-Z]+:', ' ', system_manufacturers))
+
+    # MTF units list their equipment in weapons_and_equipment; BLK units in one <location>_equipment block per location.
+    equipment = []
+    for key, value in unit_json_data.items():
+        if not (key.endswith('_equipment') or key in ('primary', 'secondary')): continue # primary/secondary: infantry weapons
+        for item in value if isinstance(value, list) else [value]:
+            equipment.append(item.get('item_name') if isinstance(item, dict) else item)
+
+    fluff_text = unit_json_data.get('fluff_text')
+    fluff_source = fluff_text if isinstance(fluff_text, dict) else unit_json_data
+    fluff = [fluff_source.get(key) for key in UNIT_FLUFF_KEYS]
+
+    return (
+        original_file_rel_path,
+        _search_text([chassis, unit_json_data.get('name'), unit_json_data.get('clanname')]), _search_text([model]),
+        _search_text(manufacturers), _search_text(equipment), _search_text(fluff)
+    )
+
+def upsert_units(cur, unit_rows):
+    """Upserts [(build_unit_row row, build_unit_search_row row), ...] into units, replacing their units_fts text."""
+    cur.executemany(UNITS_FTS_DELETE_SQL, [(row[0],) for row, _ in unit_rows])
+    cur.executemany(UNITS_UPSERT_SQL, [row for row, _ in unit_rows])
+    cur.executemany(UNITS_FTS_INSERT_SQL, [search_row for _, search_row in unit_rows])
+
+def rebuild_unit_search(conn):
+    """Recomputes all of units_fts from the units table."""
+    conn.execute("DELETE FROM units_fts")
+    search_rows = []
+    for original_file_path, unit_type, chassis, model, data in conn.execute("SELECT original_file_path, unit_type, chassis, model, data FROM units"):
+        try: search_rows.append(build_unit_search_row((original_file_path, unit_type, chassis, model), decode_data(data)))
+        except (json.JSONDecodeError, zlib.error, AttributeError) as e: print(f"Error indexing unit {original_file_path} for search: {e}")
+    conn.executemany(UNITS_FTS_INSERT_SQL, search_rows)
+    return len(search_rows)
+
+def search_units(conn, text, limit=20, columns=UNITS_FTS_COLUMNS):
+    """Full-text unit search: [(id, original_file_path, chassis, model), ...], best match first.
+
+    Every word of text must match, the last one as a prefix ("atlas as7" finds "Atlas AS7-D"). columns narrows
+    the search to some of UNITS_FTS_COLUMNS, e.g. ("chassis", "model") for a name search.
+    """
+    words = re.findall(r'\w+', text)
+    if not words: return []
+    query = ' '.join(f'"{word}"' for word in words) + '*' # Quoted, so FTS5 operators typed by the user are plain words
+    if tuple(columns) != UNITS_FTS_COLUMNS: query = '{' + ' '.join(columns) + '} : (' + query + ')'
+    return conn.execute(
+        """SELECT units.id, units.original_file_path, units.chassis, units.model
+           FROM (SELECT rowid, rank FROM units_fts WHERE units_fts MATCH ? ORDER BY rank LIMIT ?) AS matches
+           JOIN units ON units.id = matches.rowid ORDER BY matches.rank""",
+        (query, limit)).fetchall()
+
+def _init_unit_worker(data_encoding):
+    # Pool initializer: spawned workers re-import this module, so the encoding is passed rather than inherited.
+    global DATA_ENCODING
+    DATA_ENCODING = data_encoding
+
+def _build_unit_rows(unit_tasks):
+    """Pool worker: [(relative_path, stored content_hash or None)] -> [(relative_path, rows, error)].
+
+    rows is (units row, units_fts row); both rows and error are None for a unit whose content hash equals the stored one.
+    """
+    results = []
+    for original_file_rel_path, stored_hash in unit_tasks:
+        filepath = os.path.join(MEKFILES_INPUT_DIR, original_file_rel_path)
         try:
-            cur.executemany(sql, units_to_insert)
-            inserted_updated_count += len(units_to_insert)
-        except sqlite3.Error as e:
-            print(f"Database error processing final batch of units: {e}")
-            conn.rollback()
+            raw_unit_json, load_unit_json = read_unit_record(MEKFILES_INPUT_DIR, original_file_rel_path)
+            content_hash = unit_content_hash(raw_unit_json)
+            if content_hash == stored_hash:
+                results.append((original_file_rel_path, None, None))
+                continue
+            unit_json_data = load_unit_json()
+            unit_row = build_unit_row(original_file_rel_path, unit_json_data, content_hash)
+            results.append((original_file_rel_path, (unit_row, build_unit_search_row(unit_row, unit_json_data)), None))
+        except json.JSONDecodeError as e:
+            results.append((original_file_rel_path, None, f"Error decoding JSON from {filepath}: {e}"))
         except Exception as ex:
-            print(f"Generic error processing final batch of units: {ex}")
-            conn.rollback()
+            results.append((original_file_rel_path, None, f"Generic error processing unit file {filepath}: {ex}"))
+    return results
+
+def populate_units(conn, sync=False, workers=UNIT_WORKERS, batch_size=UNITS_BATCH_SIZE, encoding=None):
+    """Loads the converted units; returns (written, unchanged, removed) counts.
+
+    With sync=True a unit whose content hash matches the stored one is skipped without being decoded, and units whose
+    converted files are gone are deleted. Written units keep their ids either way. encoding (default DATA_ENCODING) is
+    the data column encoding the rows are built in, in the workers and, with one worker, in this process.
+    """
+    encoding = encoding or DATA_ENCODING
+    inserted_updated_count = 0
+    unchanged_count = 0
+    units_to_insert = []
+    cur = conn.cursor()
+    stored_hashes = dict(cur.execute("SELECT original_file_path, content_hash FROM units")) if sync else {}
+    seen_paths = set()
+
+    def unit_chunks():
+        # Chunks of consecutive units, so each worker reads a stretch of the bundle (or directory) in order.
+        chunk = []
+        # Units come from the JSON files or the packed bundle, whichever layout the converter wrote.
+        for original_file_rel_path in iter_unit_paths(MEKFILES_INPUT_DIR):
+            seen_paths.add(original_file_rel_path)
+            chunk.append((original_file_rel_path, stored_hashes.get(original_file_rel_path)))
+            if len(chunk) >= UNIT_WORKER_CHUNK_SIZE: yield chunk; chunk = []
+        if chunk: yield chunk
+
+    def write_units(units_to_insert):
+        nonlocal inserted_updated_count
+        # Each batch is a savepoint, so a failed batch is undone without discarding the batches written before it.
+        cur.execute("SAVEPOINT unit_batch")
+        try:
+            upsert_units(cur, units_to_insert)
+        except sqlite3.Error as e:
+            print(f"Database error processing batch of units (up to {units_to_insert[-1][0][0]}): {e}")
+            cur.execute("ROLLBACK TO unit_batch") # Rollback this batch only
+        else:
+            inserted_updated_count += len(units_to_insert)
+        cur.execute("RELEASE unit_batch")
+
+    started = time.perf_counter()
+    # imap keeps the file order, so units get the same ids whatever the worker count.
+    with (multiprocessing.Pool(processes=workers, initializer=_init_unit_worker, initargs=(encoding,)) if workers > 1 else contextlib.nullcontext()) as pool:
+        if not pool: _init_unit_worker(encoding) # Rows are built in this process
+        unit_results = pool.imap(_build_unit_rows, unit_chunks()) if pool else map(_build_unit_rows, unit_chunks())
+        for chunk_results in unit_results:
+            for _, rows, error in chunk_results:
+                if error: print(error)
+                elif rows is None: unchanged_count += 1
+                else: units_to_insert.append(rows)
+            if len(units_to_insert) >= batch_size:
+                write_units(units_to_insert)
+                units_to_insert = []
+    # Insert any remaining units
+    if units_to_insert: write_units(units_to_insert)
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {inserted_updated_count} unit rows in {elapsed:.2f}s ({inserted_updated_count / elapsed if elapsed else 0:.0f} rows/sec, "
+          f"{workers} worker process{'es' if workers > 1 else ''}, batches of {batch_size}).")
+
+    removed_paths = [path for path in stored_hashes if path not in seen_paths]
+    if removed_paths and not seen_paths:
+        print(f"No converted units found in {MEKFILES_INPUT_DIR}; keeping the {len(removed_paths)} units in the database.")
+        removed_paths = []
+    if removed_paths:
+        # Foreign keys are off on this connection, so user variants of a removed unit are kept rather than cascaded.
+        orphaned_variants = sum(cur.execute(
+            "SELECT COUNT(*) FROM custom_unit_variants WHERE base_unit_id = (SELECT id FROM units WHERE original_file_path = ?)", (path,)).fetchone()[0]
+            for path in removed_paths)
+        cur.executemany("DELETE FROM units WHERE original_file_path = ?", [(path,) for path in removed_paths])
+        if orphaned_variants: print(f"Warning: {orphaned_variants} custom unit variants refer to removed units and were kept.")
 
     conn.commit() # Commit all unit inserts/replaces
-    return inserted_updated_count
+    return inserted_updated_count, unchanged_count, len(removed_paths)
+
+def end_phase(phase_timings, phase, started):
+    """Records the wall-clock time of a phase that began at started; returns the start time of the next one."""
+    now = time.perf_counter()
+    phase_timings.append((phase, now - started))
+    return now
+
+def print_phase_timings(phase_timings):
+    print("Phase timings:")
+    for phase, seconds in phase_timings: print(f"  {phase:<20} {seconds:8.2f}s")
+    print(f"  {'total':<20} {sum(seconds for _, seconds in phase_timings):8.2f}s")
 
 def main():
     conn = None
+    phase_timings = []
+    if DATA_ENCODING not in DATA_ENCODINGS:
+        print(f"Unknown POPULATE_DB_DATA_ENCODING '{DATA_ENCODING}'; expected one of: {', '.join(DATA_ENCODINGS)}")
+        return
     try:
-        # Remove old DB file if it exists to ensure fresh start
-        if os.path.exists(SQLITE_DB_FILE):
+        # Remove old DB file if it exists to ensure fresh start (sync mode updates it in place instead)
+        bulk_load = BULK_LOAD and not SYNC # The pragmas are only safe for a database that can be rebuilt from scratch
+        if SYNC:
+            print(f"Sync mode: updating {SQLITE_DB_FILE} in place.")
+        elif os.path.exists(SQLITE_DB_FILE):
             print(f"Removing existing SQLite DB file: {SQLITE_DB_FILE}")
             os.remove(SQLITE_DB_FILE)
 
@@ -351,22 +638,41 @@ def main():
         if conn is None:
             return
 
+        started = time.perf_counter()
+        if bulk_load:
+            for pragma in BULK_LOAD_PRAGMAS: conn.execute(pragma)
+            print("Bulk-load mode: indexes are built after the data is inserted.")
+
         if not create_schema(conn):
             print("Halting due to schema creation failure.")
             return
+        deferred_indexes = drop_secondary_indexes(conn) if bulk_load else []
+        started = end_phase(phase_timings, "schema", started)
 
         print("Starting database population...")
 
-        eq_count = populate_equipment(conn)
+        eq_count = populate_equipment(conn, SYNC)
         print(f"Processed {eq_count} equipment items.")
+        started = end_phase(phase_timings, "equipment", started)
 
-        opt_count = populate_unit_validation_options(conn)
+        opt_count = populate_unit_validation_options(conn, SYNC)
         print(f"Processed {opt_count} unit validation options rows.")
+        started = end_phase(phase_timings, "validation options", started)
 
-        unit_count = populate_units(conn)
+        unit_count, unchanged_count, removed_count = populate_units(conn, SYNC)
         print(f"Processed {unit_count} unit files.")
+        if SYNC: print(f"Unchanged units: {unchanged_count}, removed units: {removed_count}.")
+        started = end_phase(phase_timings, "units", started)
+
+        if bulk_load:
+            build_indexes(conn, deferred_indexes)
+            print(f"Built {len(deferred_indexes)} indexes.")
+            started = end_phase(phase_timings, "indexes", started)
+            analyze(conn)
+            started = end_phase(phase_timings, "analyze", started)
 
         print("Database population complete.")
+        print_phase_timings(phase_timings)
 
     except sqlite3.Error as e: # Catch SQLite specific errors in main
         print(f"A SQLite database error occurred during main execution: {e}")
@@ -24,7 +24,8 @@ CREATE TABLE IF NOT EXISTS units (
     config TEXT, -- Unit configuration (Biped, Quad, etc.)
 
     -- Full unit data conforming to its specific JSON schema
-    data TEXT NOT NULL,
+    data TEXT NOT NULL, -- JSON text, or a compressed BLOB with POPULATE_DB_DATA_ENCODING=zlib (see populate_db.py)
+    content_hash TEXT, -- SHA-256 of the converted JSON the row was loaded from; populate_db.py's sync mode skips unchanged units
 
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
@@ -41,7 +42,27 @@ CREATE INDEX IF NOT EXISTS idx_units_role ON units(role);
 CREATE INDEX IF NOT EXISTS idx_units_is_omnimech ON units(is_omnimech);
 CREATE INDEX IF NOT EXISTS idx_units_omnimech_base_chassis ON units(omnimech_base_chassis);
 CREATE INDEX IF NOT EXISTS idx_units_config ON units(config);
-CREATE INDEX IF NOT EXISTS idx_units_data ON units(data);
+-- The full JSON is searched through units_fts; a B-tree over it only grew the file
+DROP INDEX IF EXISTS idx_units_data;
+
+-- =================================================================
+-- units_fts Table
+-- Full-text search over units (FTS5), one row per unit with rowid = units.id.
+-- populate_db.py fills it alongside every units upsert; the trigger below
+-- removes the text of deleted units.
+-- =================================================================
+CREATE VIRTUAL TABLE IF NOT EXISTS units_fts USING fts5(
+    chassis, -- Chassis plus the unit's name and Clan name where they differ
+    model,
+    manufacturers, -- Factories and system (engine, armor, ...) manufacturers
+    equipment, -- Names of the mounted weapons and equipment
+    fluff, -- Overview, capabilities, deployment and history text
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS units_fts_delete AFTER DELETE ON units BEGIN
+    DELETE FROM units_fts WHERE rowid = old.id;
+END;
 
 -- =================================================================
 -- equipment Table
@@ -56,7 +77,7 @@ CREATE TABLE IF NOT EXISTS equipment (
     tech_base TEXT CHECK (tech_base IN ('IS', 'Clan', 'Mixed')) NOT NULL, -- Enforced enum for equipment tech base
 
     -- Full equipment data conforming to equipmentSchema.json
-    data TEXT NOT NULL,
+    data TEXT NOT NULL, -- JSON text, or a compressed BLOB like units.data
 
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
@@ -68,7 +89,7 @@ CREATE INDEX IF NOT EXISTS idx_equipment_name ON equipment(name);
 CREATE INDEX IF NOT EXISTS idx_equipment_type ON equipment(type);
 CREATE INDEX IF NOT EXISTS idx_equipment_category ON equipment(category);
 CREATE INDEX IF NOT EXISTS idx_equipment_tech_base ON equipment(tech_base);
-CREATE INDEX IF NOT EXISTS idx_equipment_data ON equipment(data);
+DROP INDEX IF EXISTS idx_equipment_data;
 
 -- =================================================================
 -- unit_validation_options Table
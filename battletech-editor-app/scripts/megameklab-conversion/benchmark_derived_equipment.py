@@ -0,0 +1,66 @@
+"""
+Benchmark for DerivedEquipmentAggregator.
+
+Builds synthetic equipment tuples shaped like the converter's output (a few hundred distinct
+items, common ones such as "Heat Sink" appearing in almost every unit) and times how long the
+aggregator takes to fold them, for a growing number of units. The time per tuple should stay
+flat (linear total cost). For comparison it also times the old list-based source_files
+membership check, whose cost per tuple grows with the number of units.
+
+Usage: python benchmark_derived_equipment.py [max_units]
+"""
+import random
+import sys
+import time
+
+from data_converter import DerivedEquipmentAggregator
+
+COMMON_ITEMS = ["Heat Sink", "Fusion Engine", "Gyro", "Cockpit", "Life Support", "Sensors",
+                "Shoulder", "Upper Arm Actuator", "Hip", "Medium Laser", "Endo Steel", "Jump Jet"]
+RARE_ITEMS = [f"Equipment Item {i}" for i in range(400)]
+TUPLES_PER_UNIT = 40
+
+def build_tuples(unit_count, seed=42):
+    rng = random.Random(seed)
+    tuples = []
+    for unit_index in range(unit_count):
+        source_file = f"Unit {unit_index}.mtf"
+        tech_base = rng.choice(["Inner Sphere", "Clan"])
+        era = rng.randint(2400, 3150)
+        for slot in range(TUPLES_PER_UNIT):
+            item = COMMON_ITEMS[slot % len(COMMON_ITEMS)] if slot < 24 else rng.choice(RARE_ITEMS)
+            tuples.append((item, "Unknown", tech_base, era, source_file))
+    return tuples
+
+def time_aggregator(tuples):
+    start = time.perf_counter()
+    aggregator = DerivedEquipmentAggregator().add_tuples(tuples)
+    aggregator.to_list()
+    return time.perf_counter() - start
+
+def time_list_membership(tuples):
+    # The pre-aggregator approach: a plain list per item, scanned on every add.
+    start = time.perf_counter()
+    source_files_by_item = {}
+    for item_name, _, _, _, source_file in tuples:
+        source_files = source_files_by_item.setdefault(item_name, [])
+        if source_file not in source_files: source_files.append(source_file)
+    return time.perf_counter() - start
+
+def main():
+    max_units = int(sys.argv[1]) if len(sys.argv) > 1 else 16000
+    unit_counts = []
+    unit_count = 1000
+    while unit_count <= max_units:
+        unit_counts.append(unit_count); unit_count *= 2
+
+    print(f"{'units':>8} {'tuples':>10} {'aggregator s':>13} {'us/tuple':>9} {'list-based s':>13} {'us/tuple':>9}")
+    for unit_count in unit_counts:
+        tuples = build_tuples(unit_count)
+        aggregator_seconds = time_aggregator(tuples)
+        list_seconds = time_list_membership(tuples)
+        print(f"{unit_count:>8} {len(tuples):>10} {aggregator_seconds:>13.3f} {aggregator_seconds / len(tuples) * 1e6:>9.2f}"
+              f" {list_seconds:>13.3f} {list_seconds / len(tuples) * 1e6:>9.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Compares the single-pass (table) MTF parser against the legacy two-pass parser.
+
+Runs both engines over every .mtf file under the given directories (default: MEGAMEKLAB_DATA_DIR),
+reports any file whose JSON or derived equipment tuples differ, and prints the time each engine
+took. Every file is read once up front to warm the OS cache; both engines still open and read each
+file while timed, but from the page cache rather than from disk.
+
+Usage: python compare_mtf_parsers.py [dir_or_file ...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import data_converter
+
+def collect_mtf_files(paths):
+    mtf_files = []
+    for path in paths:
+        if os.path.isfile(path): mtf_files.append(path); continue
+        for dirpath, _, filenames in os.walk(path):
+            mtf_files.extend(os.path.join(dirpath, name) for name in filenames if name.lower().endswith(".mtf"))
+    return sorted(mtf_files)
+
+def time_engine(parse_function, mtf_files, log_dir):
+    results = {}
+    start = time.perf_counter()
+    for filepath in mtf_files: results[filepath] = parse_function(filepath, log_dir)
+    return results, time.perf_counter() - start
+
+def main():
+    paths = sys.argv[1:] or [os.environ.get("MEGAMEKLAB_DATA_DIR", "megameklab/data/mekfiles")]
+    mtf_files = collect_mtf_files(paths)
+    if not mtf_files: print(f"No .mtf files found under: {', '.join(paths)}"); return 1
+    for filepath in mtf_files: # Warm the OS cache so neither engine pays for the first read
+        with open(filepath, 'rb') as f: f.read()
+
+    with tempfile.TemporaryDirectory() as log_dir: # Skip logs from either engine are discarded
+        legacy_results, legacy_seconds = time_engine(data_converter.parse_mtf_file_legacy, mtf_files, log_dir)
+        table_results, table_seconds = time_engine(data_converter.parse_mtf_file_single_pass, mtf_files, log_dir)
+
+    mismatches = [filepath for filepath in mtf_files if legacy_results[filepath] != table_results[filepath]]
+    for filepath in mismatches[:20]: print(f"MISMATCH: {filepath}")
+    if len(mismatches) > 20: print(f"... and {len(mismatches) - 20} more")
+
+    print(f"Files compared: {len(mtf_files)}, mismatches: {len(mismatches)}")
+    print(f"legacy: {legacy_seconds:.3f}s ({len(mtf_files) / legacy_seconds:.0f} files/sec)")
+    print(f"table:  {table_seconds:.3f}s ({len(mtf_files) / table_seconds:.0f} files/sec)")
+    print(f"Speedup: {legacy_seconds / table_seconds:.2f}x")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,10 +5,53 @@ import re
 from pathlib import Path
 import datetime
 import multiprocessing
+import hashlib
+import argparse
+import time
+import functools
+import sys
+import sqlite3
+import shutil
+import tarfile
+import zipfile
+import zlib
+
+from unit_bundle import UnitBundleReader, UnitBundleWriter, encode_record, remove_bundle
+from source_archive import open_source_file, open_source_tree, source_read_position, stat_source_file, walk_source_tree
 
 # --- Globals ---
-DERIVED_EQUIPMENT = {}
 SKIPPED_FILES_LOG = "skipped_files.log"
+MANIFEST_FILE = "conversion_manifest.json"
+SHARD_STATE_FILE = "derived_equipment_shard.json" # Per-file derived equipment states written by a --shard run, read by --merge-shards
+JOURNAL_FILE = "conversion_journal.jsonl" # Files completed by a run still in progress (or killed); read by --resume, removed at the end
+JOURNAL_FORMAT = 1
+JOURNAL_BATCH_SIZE = 256 # Completed files buffered before the journal, bundle index and SQLite transaction are flushed together
+# Parse results are cached across runs in the output directory unless MEGAMEKLAB_PARSE_CACHE names another file (or "off").
+PARSE_CACHE_FILE = "parse_cache.sqlite"
+PARSE_CACHE_MAX_BYTES = int(os.environ.get("MEGAMEKLAB_PARSE_CACHE_MB", "256")) << 20 # Least recently used results are evicted beyond this
+# Bump whenever a parser change alters the JSON it produces, so incremental runs re-parse everything.
+PARSER_VERSION = 3
+MANIFEST_FORMAT = 4 # Bump when the layout of manifest entries changes
+DIGEST_FILE = "conversion_digest.json" # Whole-run content digest; unchanged digest = unchanged outputs, so downstream stages can skip work
+DEFAULT_CHUNKSIZE = 16 # Most files batched into one worker task
+TASKS_PER_WORKER = 8 # Small files are batched until a task holds about 1/(workers * this) of the total bytes
+PROGRESS_INTERVAL = 500 # Print a progress line every N finished files
+WATCH_POLL_INTERVAL = 0.5 # Seconds between scans of the data directory in --watch mode
+# "files": one pretty-printed JSON file per unit; "bundle"/"bundle-zlib": units packed into mekfiles/units.bundle.* (see unit_bundle.py);
+# "none": no JSON output at all (only with --sqlite)
+OUTPUT_LAYOUTS = ("files", "bundle", "bundle-zlib", "none")
+BUNDLE_COMPRESSION_BY_LAYOUT = {"files": None, "bundle": "none", "bundle-zlib": "zlib", "none": None}
+# populate_db.py owns the SQLite schema and the unit/equipment column extraction; --sqlite reuses it.
+POPULATE_DB_DIR = Path(__file__).resolve().parent.parent.parent / "data"
+# Planning: which files under the data directory are dispatched to the pool at all
+PARSEABLE_FILE_EXTENSIONS = (".mtf", ".blk")
+PARSEABLE_FILE_NAMES = ("unitverifieroptions.xml",) # Lowercase
+IGNORED_FILE_EXTENSIONS = ( # Never parsed and never logged as skipped
+    '.png', '.gif', '.jpg', '.jpeg', '.svg', '.txt', '.html', '.xml~',
+    '.psd', '.md', '.pdf', '.doc', '.docx', '.zip', '.log', '.jar',
+    '.xsl', '.css', '.js', '.tif', '.tiff', '.bmp', '.datasheet',
+    '.bk2', '.लक', '.dat', '.mmf')
+FILE_KIND_PARSE, FILE_KIND_IGNORED, FILE_KIND_UNSUPPORTED = "parse", "ignored", "unsupported"
 
 FUNDAMENTAL_IS_COMPONENTS = [ # Lowercase for matching
     "cockpit", "life support", "sensors", "gyro", "engine", "structure", "myomer",
@@ -20,102 +63,169 @@ VEHICLE_ARMOR_LOCATIONS = ["Front", "Left Side", "Right Side", "Rear", "Turret"]
 FIGHTER_ARMOR_LOCATIONS = ["Nose", "Left Wing", "Right Wing", "Aft"]
 VTOL_ARMOR_LOCATIONS = ["Nose", "Left Side", "Right Side", "Rear", "Rotor"]
 
-# Helper to derive a more specific type from an MTF item line
-def get_mtf_item_type_from_line(item_name_line, unit_context):
-    name_lower = item_name_line.lower().strip()
+# --- Equipment type classification ---
+# Item names are classified by ordered keyword rules that are compiled once at import. The same few thousand
+# names come up hundreds of thousands of times, so results are kept in a bounded per-process LRU cache keyed by
+# (name, heat sink type, engine type); classifier_cache_stats() reports how well it is doing.
+EQUIPMENT_TYPE_CACHE_SIZE = 8192
+TYPE_STR = "type_str" # Rule result: the TitleCase form of the name, e.g. "Medium Laser" -> "MediumLaser"
+
+# (match, keyword, result). match: "exact", "prefix" or "contains" on the lowercased name; "contains_no_ammo" also
+# requires "ammo" to be absent; "raw_contains_no_ammo" tests the keyword case-sensitively against the raw name.
+# result: a fixed type, TYPE_STR, ("replace", old, new) applied to TYPE_STR, or ("context", key, default).
+WEAPON_TYPE_RULES = [
+    ("contains", "ppc", TYPE_STR), ("contains", "laser", TYPE_STR),
+    ("contains_no_ammo", "srm", TYPE_STR), ("contains_no_ammo", "lrm", TYPE_STR),
+    ("contains", "machine gun", "MachineGun"),
+    ("contains", "autocannon", ("replace", "/", "")), ("prefix", "ac", ("replace", "/", "")),
+    ("contains", "gauss rifle", "GaussRifle"),
+    ("contains_no_ammo", "flamer", TYPE_STR),
+    ("contains_no_ammo", "lb-x", ("replace", "LB-X", "LBX")),
+    ("contains_no_ammo", "ultra ac", ("replace", "UltraAC", "UAC")),
+    ("contains_no_ammo", "rotary ac", ("replace", "RotaryAC", "RAC")),
+    ("contains_no_ammo", "mrm", TYPE_STR),
+    ("raw_contains_no_ammo", " Streak ", TYPE_STR), # Note: leading/trailing spaces for " Streak "
+]
+AMMO_TYPE_RULES = [("prefix", "is ammo", "Ammo"), ("prefix", "clan ammo", "Ammo")]
+COMPONENT_TYPE_RULES = [
+    ("exact", "gyro", "Gyro"), ("exact", "sensors", "Sensors"), ("exact", "cockpit", "Cockpit"),
+    ("exact", "life support", "LifeSupport"), ("contains", "actuator", TYPE_STR),
+    ("exact", "shoulder", TYPE_STR), ("exact", "hip", TYPE_STR),
+    ("exact", "structure", "Structure"), ("exact", "myomer", "Myomer"), ("contains", "jump jet", TYPE_STR),
+]
+# MTF crit slots: heat sinks and engines take the unit's own types, ammo is recognised before weapon keywords.
+MTF_TYPE_RULES = [
+    ("exact", "heat sink", ("context", "heat_sink_type", "SingleHeatSink")),
+    ("exact", "fusion engine", ("context", "engine_type", "FusionEngine")),
+] + AMMO_TYPE_RULES + WEAPON_TYPE_RULES + COMPONENT_TYPE_RULES
+# BLK equipment tags: no unit context, weapon keywords win over the ammo prefixes.
+BLK_TYPE_RULES = WEAPON_TYPE_RULES + AMMO_TYPE_RULES + [
+    ("exact", "heat sink", "HeatSink"), ("exact", "fusion engine", "FusionEngine"),
+] + COMPONENT_TYPE_RULES + [("exact", "targeting computer", "TargetingComputer")]
+
+def equipment_type_string(item_name):
     # Standardize and clean name for type derivation, make it TitleCase
     # Handles "Medium Laser" -> "MediumLaser", "AC/5" -> "AC5"
-    type_str = ''.join(word.title() for word in item_name_line.replace("(","").replace(")","").replace("-"," ").replace("/"," ").split())
+    return ''.join(word.title() for word in item_name.replace("(","").replace(")","").replace("-"," ").replace("/"," ").split())
+
+def _compile_type_rule(match, keyword, result):
+    if match == "exact": test = lambda name_lower, raw_name: name_lower == keyword
+    elif match == "prefix": test = lambda name_lower, raw_name: name_lower.startswith(keyword)
+    elif match == "contains": test = lambda name_lower, raw_name: keyword in name_lower
+    elif match == "contains_no_ammo": test = lambda name_lower, raw_name: keyword in name_lower and "ammo" not in name_lower
+    elif match == "raw_contains_no_ammo": test = lambda name_lower, raw_name: keyword in raw_name and "ammo" not in name_lower
+    else: raise ValueError(f"Unknown equipment type rule match '{match}'")
+    return test, result
+
+def _compile_type_rules(rules): return tuple(_compile_type_rule(*rule) for rule in rules)
+
+COMPILED_MTF_TYPE_RULES = _compile_type_rules(MTF_TYPE_RULES)
+COMPILED_BLK_TYPE_RULES = _compile_type_rules(BLK_TYPE_RULES)
 
+def _classify_item_name(item_name, compiled_rules, unit_context):
+    type_str = equipment_type_string(item_name)
     if not type_str: # Handle empty or only symbol names
         return "Unknown"
+    name_lower = item_name.lower().strip()
+    for test, result in compiled_rules:
+        if not test(name_lower, item_name): continue
+        if result == TYPE_STR: return type_str
+        if isinstance(result, str): return result
+        if result[0] == "replace": return type_str.replace(result[1], result[2])
+        return unit_context.get(result[1]) or result[2] # "context"
+    return type_str
+
+@functools.lru_cache(maxsize=EQUIPMENT_TYPE_CACHE_SIZE)
+def _classify_mtf_item(item_name, heat_sink_type, engine_type):
+    return _classify_item_name(item_name, COMPILED_MTF_TYPE_RULES, {"heat_sink_type": heat_sink_type, "engine_type": engine_type})
+
+@functools.lru_cache(maxsize=EQUIPMENT_TYPE_CACHE_SIZE)
+def _classify_blk_item(item_name):
+    return _classify_item_name(item_name, COMPILED_BLK_TYPE_RULES, {})
 
-    if name_lower == "heat sink":
-        hs_type = unit_context.get("heat_sink_type", "SingleHeatSink")
-        return hs_type
-    if name_lower == "fusion engine":
-        engine_type = unit_context.get("engine_type", "FusionEngine")
-        return engine_type
-    if name_lower.startswith("is ammo") or name_lower.startswith("clan ammo"):
-        return "Ammo"
-
-    # Specific weapon types (prioritize keywords)
-    if "ppc" in name_lower: return type_str
-    if "laser" in name_lower: return type_str
-    if "srm" in name_lower and "ammo" not in name_lower: return type_str
-    if "lrm" in name_lower and "ammo" not in name_lower: return type_str
-    if "machine gun" in name_lower: return "MachineGun"
-    if "autocannon" in name_lower or name_lower.startswith("ac"):
-        return type_str.replace("/", "")
-    if "gauss rifle" in name_lower : return "GaussRifle"
-    if "flamer" in name_lower and "ammo" not in name_lower: return type_str
-    if "lb-x" in name_lower and "ammo" not in name_lower: return type_str.replace("LB-X", "LBX")
-    if "ultra ac" in name_lower and "ammo" not in name_lower: return type_str.replace("UltraAC", "UAC")
-    if "rotary ac" in name_lower and "ammo" not in name_lower: return type_str.replace("RotaryAC","RAC")
-    if "mrm" in name_lower and "ammo" not in name_lower: return type_str
-    if " Streak " in item_name_line and "ammo" not in name_lower: return type_str # Note: leading/trailing spaces for " Streak "
-
-    # Fundamental components
-    if name_lower == "gyro": return "Gyro"
-    if name_lower == "sensors": return "Sensors"
-    if name_lower == "cockpit": return "Cockpit"
-    if name_lower == "life support": return "LifeSupport"
-    if "actuator" in name_lower: return type_str
-    if name_lower in ["shoulder", "hip"]: return type_str
-    if name_lower == "structure": return "Structure"
-    if name_lower == "myomer": return "Myomer"
-    if "jump jet" in name_lower: return type_str
-
-    return type_str if type_str else "Unknown"
+# Helper to derive a more specific type from an MTF item line
+def get_mtf_item_type_from_line(item_name_line, unit_context):
+    return _classify_mtf_item(item_name_line, unit_context.get("heat_sink_type"), unit_context.get("engine_type"))
 
 # Helper to derive a more specific type from an BLK item name (from equipment tags)
 def get_blk_item_type_from_name(item_name_str): # No unit_context for BLK for now
-    name_lower = item_name_str.lower().strip()
-    type_str = ''.join(word.title() for word in item_name_str.replace("(","").replace(")","").replace("-"," ").replace("/"," ").split())
-
-    if not type_str:
-        return "Unknown"
-
-    # Specific weapon types (prioritize keywords) - similar to MTF helper
-    if "ppc" in name_lower: return type_str
-    if "laser" in name_lower: return type_str
-    if "srm" in name_lower and "ammo" not in name_lower: return type_str
-    if "lrm" in name_lower and "ammo" not in name_lower: return type_str
-    if "machine gun" in name_lower: return "MachineGun"
-    if "autocannon" in name_lower or name_lower.startswith("ac"):
-        return type_str.replace("/", "")
-    if "gauss rifle" in name_lower : return "GaussRifle"
-    if "flamer" in name_lower and "ammo" not in name_lower: return type_str
-    if "lb-x" in name_lower and "ammo" not in name_lower: return type_str.replace("LB-X", "LBX")
-    if "ultra ac" in name_lower and "ammo" not in name_lower: return type_str.replace("UltraAC", "UAC")
-    if "rotary ac" in name_lower and "ammo" not in name_lower: return type_str.replace("RotaryAC","RAC")
-    if "mrm" in name_lower and "ammo" not in name_lower: return type_str
-    if " Streak " in item_name_str and "ammo" not in name_lower: return type_str
-    if name_lower.startswith("is ammo") or name_lower.startswith("clan ammo"): return "Ammo" # Ammo check
-
-    # Fundamental components (less common in BLK equipment tags but possible)
-    if name_lower == "heat sink": return "HeatSink" # Simpler than MTF, no context for single/double easily
-    if name_lower == "fusion engine": return "FusionEngine"
-    if name_lower == "gyro": return "Gyro"
-    if name_lower == "sensors": return "Sensors"
-    if name_lower == "cockpit": return "Cockpit"
-    if name_lower == "life support": return "LifeSupport"
-    if "actuator" in name_lower: return type_str
-    if name_lower in ["shoulder", "hip"]: return type_str
-    if name_lower == "structure": return "Structure"
-    if name_lower == "myomer": return "Myomer"
-    if "jump jet" in name_lower: return type_str
-    if name_lower == "targeting computer": return "TargetingComputer"
-
-    # Default for BLK items, often names are quite descriptive
-    return type_str if type_str else "Unknown"
-
-
-def log_skipped_file(filepath, reason, output_dir_for_log):
-    log_path = os.path.join(output_dir_for_log, SKIPPED_FILES_LOG)
-    os.makedirs(os.path.dirname(log_path), exist_ok=True)
-    with open(log_path, "a", encoding='utf-8') as f:
-        f.write(f"Skipped: {filepath} - Reason: {reason}\n")
+    return _classify_blk_item(item_name_str)
+
+def classifier_cache_stats():
+    # Cumulative hits/misses of this process's classification caches.
+    stats = {}
+    for name, cached_function in (("mtf", _classify_mtf_item), ("mtf_weapon", _classify_mtf_weapon), ("blk", _classify_blk_item)):
+        info = cached_function.cache_info()
+        stats[name] = {"hits": info.hits, "misses": info.misses, "size": info.currsize}
+    return stats
+
+def summarize_classifier_stats(stats_by_process):
+    # Sums the latest per-process stats; returns (hits, misses).
+    hits = sum(entry["hits"] for stats in stats_by_process.values() for entry in stats.values())
+    misses = sum(entry["misses"] for stats in stats_by_process.values() for entry in stats.values())
+    return hits, misses
+
+# --- Skip/diagnostic records ---
+# A record is (path, reason code, line number or None, message). Inside a conversion worker the records are
+# collected per file and travel back with the result; the parent writes them all through one SkipLogWriter.
+SKIP_MTF_ERROR = "mtf_error"
+SKIP_BAD_ARMOR_VALUE = "bad_armor_value"
+SKIP_BLK_ERROR = "blk_error"
+SKIP_XML_ERROR = "xml_error"
+SKIP_JSON_SAVE_ERROR = "json_save_error"
+SKIP_UNSUPPORTED_FILE = "unsupported_file"
+SKIP_SQLITE_ROW_ERROR = "sqlite_row_error"
+SKIP_OTHER = "other"
+
+_collected_skip_records = None # List while a worker is converting a file; None means write to the log directly
+
+def log_skipped_file(filepath, reason, output_dir_for_log, reason_code=SKIP_OTHER, line_number=None):
+    record = (str(filepath), reason_code, line_number, reason)
+    if _collected_skip_records is not None: _collected_skip_records.append(record); return
+    with SkipLogWriter(output_dir_for_log) as skip_log: skip_log.write(record) # Standalone use (no worker collecting)
+
+def start_collecting_skip_records():
+    global _collected_skip_records
+    _collected_skip_records = []
+
+def stop_collecting_skip_records():
+    global _collected_skip_records
+    records, _collected_skip_records = _collected_skip_records or [], None
+    return records
+
+class SkipLogWriter:
+    """Appends skip records to skipped_files.log through one buffered handle and counts them by reason code."""
+
+    def __init__(self, output_dir_for_log):
+        self.log_path = os.path.join(output_dir_for_log, SKIPPED_FILES_LOG)
+        self.log_file = None # Opened on the first record, so clean runs leave no log behind
+        self.counts_by_reason = {}
+
+    def write(self, record):
+        filepath, reason_code, _, reason = record
+        if self.log_file is None:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            self.log_file = open(self.log_path, "a", encoding='utf-8', buffering=1 << 16)
+        self.log_file.write(f"Skipped: {filepath} - Reason: {reason}\n")
+        self.counts_by_reason[reason_code] = self.counts_by_reason.get(reason_code, 0) + 1
+
+    def write_all(self, records):
+        for record in records: self.write(record)
+
+    def summary_lines(self):
+        if not self.counts_by_reason: return []
+        width = max(len("reason"), max(len(reason_code) for reason_code in self.counts_by_reason))
+        lines = [f"{'reason':<{width}}  count"]
+        for reason_code, count in sorted(self.counts_by_reason.items(), key=lambda item: (-item[1], item[0])):
+            lines.append(f"{reason_code:<{width}}  {count:>5}")
+        lines.append(f"{'total':<{width}}  {sum(self.counts_by_reason.values()):>5}")
+        return lines
+
+    def close(self):
+        if self.log_file is not None: self.log_file.close(); self.log_file = None
+
+    def __enter__(self): return self
+    def __exit__(self, exc_type, exc_value, traceback): self.close()
 
 def parse_mtf_engine(engine_str):
     match = re.match(r"(\d+)\s*(.*?)(?:\(([^)]+)\))?$", engine_str)
@@ -146,43 +256,72 @@ def parse_mtf_myomer(myomer_str):
     if match: type_name, manufacturer = match.groups(); return {"type": type_name.strip(), "manufacturer": manufacturer.strip() if manufacturer else None}
     return {"type": myomer_str.strip(), "manufacturer": None}
 
-def get_year_from_path(filepath_str):
-    filepath = Path(filepath_str)
-    year_pattern = re.compile(r"(\d{4})[Uu]?")
-    path_str_lower = str(filepath).lower()
-
-    known_tro_years = {
-        "3025": 3025, "3039": 3039, "3050": 3050, "3055": 3055, "3057": 3057, "3058": 3058,
-        "3060": 3060, "3067": 3067, "3075": 3075, "3085": 3085, "3145": 3145, "3150": 3150,
-        "xtro primitivestest": 2400, "xtro primitives i": 2400, "xtro primitives ii": 2400,
-        "xtro primitives iii": 2400, "xtro primitives iv": 2400, "xtro primitives v": 2400,
-        "xtro clans": 2850, "xtro succession wars": 2900, "xtro boondoggles": 3060,
-        "xtro corporations": 3060, "xtro davion": 3060, "xtro kurita": 3060,
-        "xtro liaosuns": 3060, "xtro marik": 3060, "xtro mercs": 3060, "xtro steiner": 3060,
-        "xtro pirates": 3060, "xtro royal society": 3060, "xtro ilclan": 3150,
-        "prototypes": 3070, "project phoenix": 3070, "golden century": 2800,
-        "recognition guide": 3140, "rg": 3140
-    }
-    for key, year_val in known_tro_years.items():
-        if key in path_str_lower: return year_val
-
-    for part in reversed(filepath.parts):
-        match = year_pattern.search(part)
-        if match: return int(match.group(1))
-    return 2750
-
+# Era keywords in precedence order: when several appear in a path, the earliest entry wins.
+KNOWN_TRO_YEARS = [
+    ("3025", 3025), ("3039", 3039), ("3050", 3050), ("3055", 3055), ("3057", 3057), ("3058", 3058),
+    ("3060", 3060), ("3067", 3067), ("3075", 3075), ("3085", 3085), ("3145", 3145), ("3150", 3150),
+    ("xtro primitivestest", 2400), ("xtro primitives i", 2400), ("xtro primitives ii", 2400),
+    ("xtro primitives iii", 2400), ("xtro primitives iv", 2400), ("xtro primitives v", 2400),
+    ("xtro clans", 2850), ("xtro succession wars", 2900), ("xtro boondoggles", 3060),
+    ("xtro corporations", 3060), ("xtro davion", 3060), ("xtro kurita", 3060),
+    ("xtro liaosuns", 3060), ("xtro marik", 3060), ("xtro mercs", 3060), ("xtro steiner", 3060),
+    ("xtro pirates", 3060), ("xtro royal society", 3060), ("xtro ilclan", 3150),
+    ("prototypes", 3070), ("project phoenix", 3070), ("golden century", 2800),
+    ("recognition guide", 3140), ("rg", 3140)
+]
+# Zero-width lookahead so every position is tried (overlapping matches included); at each position the
+# alternation reports the highest-precedence keyword starting there.
+ERA_KEYWORD_PATTERN = re.compile("(?=(" + "|".join(re.escape(keyword) for keyword, _ in KNOWN_TRO_YEARS) + "))")
+ERA_KEYWORD_RANKS = {keyword: rank for rank, (keyword, _) in enumerate(KNOWN_TRO_YEARS)}
+ERA_YEAR_PATTERN = re.compile(r"(\d{4})[Uu]?")
+DEFAULT_ERA = 2750
+ERA_DIRECTORY_CACHE_SIZE = 4096
+
+def _best_era_keyword_rank(text_lower):
+    # Precedence rank of the best era keyword found in text_lower, or None.
+    ranks = [ERA_KEYWORD_RANKS[match.group(1)] for match in ERA_KEYWORD_PATTERN.finditer(text_lower)]
+    return min(ranks) if ranks else None
+
+@functools.lru_cache(maxsize=ERA_DIRECTORY_CACHE_SIZE)
+def resolve_directory_era(directory_str):
+    # Era evidence shared by every file in a directory: (best keyword rank or None, year from the deepest dated directory name or None).
+    directory = Path(directory_str)
+    keyword_rank = _best_era_keyword_rank(str(directory).lower()) if directory.parts else None
+    for part in reversed(directory.parts):
+        match = ERA_YEAR_PATTERN.search(part)
+        if match: return keyword_rank, int(match.group(1))
+    return keyword_rank, None
 
-def add_to_derived_equipment(item_name, item_type="Unknown", unit_tech_base_for_context="Unknown",
-                             introduction_year="Unknown", source_file="N/A"):
-    if not item_name or item_name == "-Empty-": return
-    clean_item_name = item_name.strip()
-    internal_id_base = re.sub(r'[^a-zA-Z0-9]', '', clean_item_name.upper())
+def get_year_from_path(filepath_str):
+    # Keywords anywhere in the path take precedence over years in directory or file names; the file name is
+    # checked on its own so everything derived from the directory is computed once per directory.
+    directory_str, filename = os.path.split(filepath_str)
+    if not filename or filename == ".": # Trailing separators or dots: let Path normalise them
+        filepath = Path(filepath_str); directory_str, filename = str(filepath.parent), filepath.name
+    directory_rank, directory_year = resolve_directory_era(directory_str) # Normalised with Path inside
+    file_rank = _best_era_keyword_rank(filename.lower())
+    ranks = [rank for rank in (directory_rank, file_rank) if rank is not None]
+    if ranks: return KNOWN_TRO_YEARS[min(ranks)][1]
+
+    match = ERA_YEAR_PATTERN.search(filename)
+    if match: return int(match.group(1))
+    return directory_year if directory_year is not None else DEFAULT_ERA
+
+
+GENERIC_EQUIPMENT_TYPES = frozenset(["unknown", "equipment", "weapon", "ammo", "component"])
+FUNDAMENTAL_IS_COMPONENT_NAMES = frozenset(fundamental.lower() for fundamental in FUNDAMENTAL_IS_COMPONENTS)
+# Aggregator facts are ordered by plan_index * EQUIPMENT_ORDER_STRIDE + position of the tuple within its file.
+EQUIPMENT_ORDER_STRIDE = 1 << 20
+
+def get_derived_equipment_id(clean_item_name):
     # internal_id should be based SOLELY on the item name for consistent merging.
     # Type will be refined later.
-    internal_id = internal_id_base
-    # internal_id = item_type.upper() + "_" + internal_id_base if item_type != "Unknown" else internal_id_base # Old logic
-    internal_id = internal_id.replace(" ","") # Should not be necessary if internal_id_base is already alphanumeric
+    return re.sub(r'[^a-zA-Z0-9]', '', clean_item_name.upper())
 
+def is_fundamental_component_name(item_name):
+    return item_name.lower().split('(')[0].strip() in FUNDAMENTAL_IS_COMPONENT_NAMES
+
+def resolve_item_tech_base(clean_item_name, unit_tech_base_for_context):
     item_specific_tech_base = "Unknown"; name_upper = clean_item_name.upper()
     # Check for explicit Clan/IS markers, including suffixes like " C"
     if "(CL)" in name_upper or "CLAN" in name_upper or name_upper.endswith(" C") or name_upper.startswith("C "): item_specific_tech_base = "Clan"
@@ -190,7 +329,7 @@ def add_to_derived_equipment(item_name, item_type="Unknown", unit_tech_base_for_
 
     final_tech_base = item_specific_tech_base
 
-    is_fundamental = any(fundamental.lower() == clean_item_name.lower().split('(')[0].strip() for fundamental in FUNDAMENTAL_IS_COMPONENTS)
+    is_fundamental = is_fundamental_component_name(clean_item_name)
 
     if final_tech_base == "Unknown": # If item itself doesn't specify tech base
         if is_fundamental and unit_tech_base_for_context == "Inner Sphere":
@@ -201,55 +340,281 @@ def add_to_derived_equipment(item_name, item_type="Unknown", unit_tech_base_for_
         # This is a Clan fundamental component on an IS unit. This is rare and implies mixed tech.
         # For simplicity, let's assume the component dictates its tech base here.
         pass # Keep final_tech_base as Clan
+    return final_tech_base
 
+def normalize_introduction_year(introduction_year):
     current_intro_year = "Unknown"
     if isinstance(introduction_year, int): current_intro_year = introduction_year
     elif isinstance(introduction_year, str) and introduction_year.isdigit(): current_intro_year = int(introduction_year)
     elif isinstance(introduction_year, str): # Keep as string if not purely digits
         current_intro_year = introduction_year.strip() if introduction_year.strip() else "Unknown"
-
-
-    if internal_id not in DERIVED_EQUIPMENT:
-        DERIVED_EQUIPMENT[internal_id] = {
-            "name": clean_item_name, "internal_id": internal_id, "type": item_type,
-            "category": "Unknown", "tech_base": final_tech_base, "rules_level": "Standard",
-            "introduction_year": current_intro_year, "extinction_year": "Unknown",
+    return current_intro_year
+
+class _EquipmentFacts:
+    """Ordered facts about one derived equipment item.
+
+    Rather than the current value of each field, this keeps what the merge rules depend on:
+    the first name/type, the first non-"unknown" and first specific type, the first known tech
+    base plus every tech base seen, the earliest integer year, the first textual year and the
+    first order of each source file. Taking the earliest fact of each kind makes merging
+    associative and commutative.
+    """
+    __slots__ = ("first_order", "name", "type_order", "type", "known_type_order", "known_type",
+                 "specific_type_order", "specific_type", "tech_base_order", "tech_base", "tech_bases",
+                 "intro_int", "intro_str_order", "intro_str", "source_files")
+
+    def __init__(self, order, clean_item_name, item_type):
+        self.first_order = order; self.name = clean_item_name
+        self.type_order = order; self.type = item_type
+        self.known_type_order = None; self.known_type = None
+        self.specific_type_order = None; self.specific_type = None
+        self.tech_base_order = None; self.tech_base = None
+        self.tech_bases = set()
+        self.intro_int = None; self.intro_str_order = None; self.intro_str = None
+        self.source_files = {} # Insertion-ordered set: source file -> first order it was seen at
+
+    def observe(self, order, clean_item_name, item_type, tech_base, intro_year, source_file):
+        if order < self.first_order: self.first_order = order; self.name = clean_item_name
+        if order < self.type_order: self.type_order = order; self.type = item_type
+        item_type_lower = item_type.lower()
+        if item_type_lower != "unknown" and (self.known_type_order is None or order < self.known_type_order):
+            self.known_type_order = order; self.known_type = item_type
+        if item_type_lower not in GENERIC_EQUIPMENT_TYPES and (self.specific_type_order is None or order < self.specific_type_order):
+            self.specific_type_order = order; self.specific_type = item_type
+        if tech_base != "Unknown":
+            self.tech_bases.add(tech_base)
+            if self.tech_base_order is None or order < self.tech_base_order: self.tech_base_order = order; self.tech_base = tech_base
+        if isinstance(intro_year, int):
+            if self.intro_int is None or intro_year < self.intro_int: self.intro_int = intro_year
+        elif intro_year != "Unknown" and (self.intro_str_order is None or order < self.intro_str_order):
+            self.intro_str_order = order; self.intro_str = intro_year
+        known_order = self.source_files.get(source_file)
+        if known_order is None or order < known_order: self.source_files[source_file] = order
+
+    def merge(self, other):
+        if other.first_order < self.first_order: self.first_order = other.first_order; self.name = other.name
+        if other.type_order < self.type_order: self.type_order = other.type_order; self.type = other.type
+        if other.known_type_order is not None and (self.known_type_order is None or other.known_type_order < self.known_type_order):
+            self.known_type_order = other.known_type_order; self.known_type = other.known_type
+        if other.specific_type_order is not None and (self.specific_type_order is None or other.specific_type_order < self.specific_type_order):
+            self.specific_type_order = other.specific_type_order; self.specific_type = other.specific_type
+        if other.tech_base_order is not None and (self.tech_base_order is None or other.tech_base_order < self.tech_base_order):
+            self.tech_base_order = other.tech_base_order; self.tech_base = other.tech_base
+        self.tech_bases |= other.tech_bases
+        if other.intro_int is not None and (self.intro_int is None or other.intro_int < self.intro_int): self.intro_int = other.intro_int
+        if other.intro_str_order is not None and (self.intro_str_order is None or other.intro_str_order < self.intro_str_order):
+            self.intro_str_order = other.intro_str_order; self.intro_str = other.intro_str
+        for source_file, order in other.source_files.items():
+            known_order = self.source_files.get(source_file)
+            if known_order is None or order < known_order: self.source_files[source_file] = order
+
+    def to_state(self, base_order=0):
+        # Orders are stored relative to base_order so a file's state can be cached and re-based later.
+        def rel(order): return None if order is None else order - base_order
+        return [self.first_order - base_order, self.name, self.type_order - base_order, self.type,
+                rel(self.known_type_order), self.known_type, rel(self.specific_type_order), self.specific_type,
+                rel(self.tech_base_order), self.tech_base, sorted(self.tech_bases), self.intro_int,
+                rel(self.intro_str_order), self.intro_str, [[source_file, order - base_order] for source_file, order in self.source_files.items()]]
+
+    @classmethod
+    def from_state(cls, state, base_order=0):
+        def absolute(order): return None if order is None else order + base_order
+        facts = cls(state[0] + base_order, state[1], state[3])
+        facts.type_order = state[2] + base_order
+        facts.known_type_order = absolute(state[4]); facts.known_type = state[5]
+        facts.specific_type_order = absolute(state[6]); facts.specific_type = state[7]
+        facts.tech_base_order = absolute(state[8]); facts.tech_base = state[9]
+        facts.tech_bases = set(state[10]); facts.intro_int = state[11]
+        facts.intro_str_order = absolute(state[12]); facts.intro_str = state[13]
+        facts.source_files = {source_file: order + base_order for source_file, order in state[14]}
+        return facts
+
+    def to_entry(self, internal_id):
+        # Type: the first specific type wins, else the first non-"unknown" one, else whatever came first.
+        item_type = self.specific_type if self.specific_type_order is not None else \
+                    self.known_type if self.known_type_order is not None else self.type
+        # Tech base: the first known one, turned "Mixed" by any conflicting one unless it is a fundamental IS component.
+        tech_base = "Unknown"
+        if self.tech_base_order is not None:
+            tech_base = self.tech_base
+            if tech_base != "Mixed" and len(self.tech_bases) > 1 and \
+               not (tech_base == "Inner Sphere" and is_fundamental_component_name(self.name)):
+                tech_base = "Mixed"
+        # Introduction year: the earliest integer year, else the first textual one.
+        if self.intro_int is not None: introduction_year = self.intro_int
+        elif self.intro_str_order is not None: introduction_year = self.intro_str
+        else: introduction_year = "Unknown"
+        return {
+            "name": self.name, "internal_id": internal_id, "type": item_type,
+            "category": "Unknown", "tech_base": tech_base, "rules_level": "Standard",
+            "introduction_year": introduction_year, "extinction_year": "Unknown",
             "faction_availability": [], "technology_dependencies": [], "critical_slots": 0,
             "tonnage": 0, "cost_cbills": None, "battle_value": None,
-            "source_book": None, "source_files": [source_file]
+            "source_book": None, "source_files": sorted(self.source_files)
         }
-    else:
-        entry = DERIVED_EQUIPMENT[internal_id]
-        if source_file not in entry["source_files"]: entry["source_files"].append(source_file)
-
-        # Type refinement: Update if new type is more specific
-        current_type_is_generic = entry["type"].lower() in ["unknown", "equipment", "weapon", "ammo", "component"]
-        new_type_is_specific = item_type.lower() not in ["unknown", "equipment", "weapon", "ammo", "component"]
-
-        if current_type_is_generic and new_type_is_specific:
-            entry["type"] = item_type
-        elif entry["type"].lower() == "unknown" and item_type.lower() != "unknown": # General fallback if old type was unknown
-            entry["type"] = item_type
-
-
-        # Update tech_base only if new info is more specific or clarifies "Mixed"
-        if entry["tech_base"] == "Unknown" and final_tech_base != "Unknown":
-            entry["tech_base"] = final_tech_base
-        elif entry["tech_base"] != final_tech_base and final_tech_base != "Unknown" and entry["tech_base"] != "Mixed":
-            # If conflicting specific tech bases (e.g. IS vs Clan), mark as Mixed
-            # unless it's a fundamental IS component that should remain IS.
-            is_entry_fundamental_is = any(f.lower() == entry["name"].lower().split('(')[0].strip() for f in FUNDAMENTAL_IS_COMPONENTS) and entry["tech_base"] == "Inner Sphere"
-            if not is_entry_fundamental_is:
-                entry["tech_base"] = "Mixed"
-
-        # Prefer earliest known introduction year
-        if current_intro_year != "Unknown":
-            if entry["introduction_year"] == "Unknown" or \
-               (isinstance(current_intro_year, int) and isinstance(entry["introduction_year"], int) and current_intro_year < entry["introduction_year"]) or \
-               (isinstance(current_intro_year, int) and isinstance(entry["introduction_year"], str)): # If current is int and entry is string (like "Unknown")
-                 entry["introduction_year"] = current_intro_year
 
-def parse_mtf_file(filepath, output_dir_for_log):
+class DerivedEquipmentAggregator:
+    """Collects derived equipment keyed by internal_id.
+
+    Items can be added in any order as long as each carries its order (os.walk position);
+    without one they are numbered in call order, which is the classic serial behaviour.
+    Aggregators merge associatively, so workers build partial ones that are combined later.
+    The list-based derivedEquipment.json entries are only produced by to_list().
+    """
+
+    def __init__(self):
+        self._facts = {}
+        self._next_order = 0
+
+    def __len__(self):
+        return len(self._facts)
+
+    def add(self, item_name, item_type="Unknown", unit_tech_base_for_context="Unknown",
+            introduction_year="Unknown", source_file="N/A", order=None):
+        if not item_name or item_name == "-Empty-": return
+        if order is None: order = self._next_order
+        self._next_order = max(self._next_order, order + 1)
+        clean_item_name = item_name.strip()
+        internal_id = get_derived_equipment_id(clean_item_name)
+        tech_base = resolve_item_tech_base(clean_item_name, unit_tech_base_for_context)
+        intro_year = normalize_introduction_year(introduction_year)
+        facts = self._facts.get(internal_id)
+        if facts is None: facts = self._facts[internal_id] = _EquipmentFacts(order, clean_item_name, item_type)
+        facts.observe(order, clean_item_name, item_type, tech_base, intro_year, source_file)
+
+    def add_tuples(self, equipment_tuples, base_order=0):
+        for position, equip_tuple in enumerate(equipment_tuples):
+            if len(equip_tuple) == 5:
+                self.add(*equip_tuple, order=base_order + position)
+            else:
+                print(f"Warning: Malformed equipment tuple: {equip_tuple}")
+        return self
+
+    def merge(self, other):
+        """Merges `other` into this aggregator and returns it. Order of arguments does not matter."""
+        for internal_id, other_facts in other._facts.items():
+            facts = self._facts.get(internal_id)
+            if facts is None: self._facts[internal_id] = other_facts
+            else: facts.merge(other_facts)
+        self._next_order = max(self._next_order, other._next_order)
+        return self
+
+    def to_state(self, base_order=0):
+        """Compact, JSON-friendly form used for IPC and the manifest."""
+        return [[internal_id] + facts.to_state(base_order) for internal_id, facts in self._facts.items()]
+
+    @classmethod
+    def from_state(cls, state, base_order=0):
+        aggregator = cls()
+        for internal_id, *facts_state in state:
+            facts = _EquipmentFacts.from_state(facts_state, base_order)
+            aggregator._facts[internal_id] = facts
+            aggregator._next_order = max(aggregator._next_order, max(facts.source_files.values()) + 1)
+        return aggregator
+
+    def to_list(self):
+        """derivedEquipment.json entries, sorted by internal_id so the file only changes when its content does."""
+        return [self._facts[internal_id].to_entry(internal_id) for internal_id in sorted(self._facts)]
+
+    def entries_for(self, internal_ids):
+        """derivedEquipment.json entries of the given items (those no longer present are left out)."""
+        return [self._facts[internal_id].to_entry(internal_id) for internal_id in internal_ids if internal_id in self._facts]
+
+DERIVED_EQUIPMENT = DerivedEquipmentAggregator()
+
+def add_to_derived_equipment(item_name, item_type="Unknown", unit_tech_base_for_context="Unknown",
+                             introduction_year="Unknown", source_file="N/A"):
+    DERIVED_EQUIPMENT.add(item_name, item_type, unit_tech_base_for_context, introduction_year, source_file)
+
+def _merge_file_states(indexed_states):
+    # Leaf level of the merge tree: re-base each file's state by its plan index and fold them together.
+    merged = DerivedEquipmentAggregator()
+    for plan_index, state in indexed_states:
+        merged.merge(DerivedEquipmentAggregator.from_state(state, plan_index * EQUIPMENT_ORDER_STRIDE))
+    return merged
+
+def _merge_aggregator_pair(pair):
+    return pair[0] if len(pair) == 1 else pair[0].merge(pair[1])
+
+def merge_file_states_in_parallel(pool, indexed_file_states, num_processes):
+    """Combines per-file aggregator states with a parallel merge tree: contiguous leaf groups first, then pairwise rounds."""
+    if not indexed_file_states: return DerivedEquipmentAggregator()
+    group_count = max(1, min(len(indexed_file_states), num_processes * 4))
+    group_size = -(-len(indexed_file_states) // group_count)
+    groups = [indexed_file_states[i:i + group_size] for i in range(0, len(indexed_file_states), group_size)]
+    aggregators = pool.map(_merge_file_states, groups)
+    while len(aggregators) > 1:
+        aggregators = pool.map(_merge_aggregator_pair, [aggregators[i:i + 2] for i in range(0, len(aggregators), 2)])
+    return aggregators[0]
+
+class LiveEquipmentAggregate:
+    """A DerivedEquipmentAggregator that can swap out one file's contribution (used by --watch).
+
+    Every file's facts are kept per item, re-based to the file's plan index. When a file changes,
+    only the items it mentions (before or after the change) are merged again from their contributing files.
+    """
+
+    def __init__(self, file_states, aggregator=None):
+        # file_states: (relative path, plan index, aggregator state); aggregator: their merge, if already computed
+        self.file_items = {} # relative path -> internal ids the file contributes to
+        self.item_facts = {} # internal id -> {relative path: _EquipmentFacts}
+        for relative_path, plan_index, state in file_states: self._add_file(relative_path, plan_index, state)
+        self.aggregator = aggregator
+        if aggregator is None:
+            self.aggregator = DerivedEquipmentAggregator()
+            for internal_id in self.item_facts: self._merge_item(internal_id)
+
+    def replace_file(self, relative_path, plan_index, state):
+        """Replaces a file's equipment state (None removes the file); returns the internal ids whose entries may have changed."""
+        affected = set(self.file_items.pop(relative_path, ()))
+        for internal_id in affected: del self.item_facts[internal_id][relative_path]
+        if state: affected.update(self._add_file(relative_path, plan_index, state))
+        for internal_id in affected: self._merge_item(internal_id)
+        return affected
+
+    def _add_file(self, relative_path, plan_index, state):
+        internal_ids = self.file_items[relative_path] = []
+        for internal_id, *facts_state in state:
+            self.item_facts.setdefault(internal_id, {})[relative_path] = _EquipmentFacts.from_state(facts_state, plan_index * EQUIPMENT_ORDER_STRIDE)
+            internal_ids.append(internal_id)
+        return internal_ids
+
+    def _merge_item(self, internal_id):
+        merged = None
+        for facts in self.item_facts.get(internal_id, {}).values():
+            if merged is None: merged = _EquipmentFacts.from_state(facts.to_state()) # Copy: merge() updates its left side
+            else: merged.merge(facts)
+        if merged is None:
+            self.item_facts.pop(internal_id, None); self.aggregator._facts.pop(internal_id, None)
+        else: self.aggregator._facts[internal_id] = merged
+
+def finalize_mtf_armor(data, parsed_armor_locations):
+    """Replaces the armor lines collected while parsing an MTF file with the final armor object."""
+    armor_base_info = data.pop("armor_details_temp", parse_mtf_armor_type_line(data.get("armor", "Standard Armor")))
+    final_armor_obj = {"type": armor_base_info["type"], "manufacturer": armor_base_info["manufacturer"], "locations": []}
+
+    if "armor_locations_map" in data: # Mech armor
+        total_armor = 0
+        armor_map = data.pop("armor_locations_map")
+        for loc_key, points_str in armor_map.items():
+            try: points = int(points_str); total_armor += points
+            except ValueError: points = 0
+
+            # Standardize armor locations from map keys
+            if loc_key == "RTC": display_loc = "Center Torso (Rear)"
+            elif loc_key == "RTR": display_loc = "Right Torso (Rear)"
+            elif loc_key == "RTL": display_loc = "Left Torso (Rear)"
+            else: display_loc = loc_key # Keep original if no mapping needed
+
+            final_armor_obj["locations"].append({"location": display_loc, "armor_points": points, "rear_armor_points": None})
+        if total_armor > 0: final_armor_obj["total_armor_points"] = total_armor
+    elif parsed_armor_locations: # Non-mech MTF armor
+        final_armor_obj["locations"] = parsed_armor_locations
+        final_armor_obj["total_armor_points"] = sum(loc.get("armor_points", 0) for loc in parsed_armor_locations if isinstance(loc.get("armor_points"), int))
+    data["armor"] = final_armor_obj
+
+def parse_mtf_file_legacy(filepath, output_dir_for_log):
+    # Original two-pass parser, kept behind --mtf-parser legacy for comparing output against the table engine.
     derived_equipment_accumulator = [] # To store (item_name, item_type, unit_tech_base, intro_year, source_file)
     data = {"quirks": [], "weapons_and_equipment": []}; fluff_text = {} # Initialize lists
     unit_context_for_typing = {} # To store info like heatsink type, engine type
@@ -272,7 +637,7 @@ def parse_mtf_file(filepath, output_dir_for_log):
     line_number = 0
 
     try:
-        with open(filepath, 'r', encoding='latin-1', errors='ignore') as f: lines = f.readlines()
+        with open_source_file(filepath, 'r', encoding='latin-1', errors='ignore') as f: lines = f.readlines()
 
         for line_content in lines:
             line_strip = line_content.strip()
@@ -345,7 +710,7 @@ def parse_mtf_file(filepath, output_dir_for_log):
 
                 if key_norm in non_mech_armor_keys:
                     try: parsed_armor_locations.append({"location": non_mech_armor_keys[key_norm], "armor_points": int(value_stripped)})
-                    except ValueError: log_skipped_file(filepath, f"Non-integer armor value '{value_stripped}' for {key_norm}", output_dir_for_log)
+                    except ValueError: log_skipped_file(filepath, f"Non-integer armor value '{value_stripped}' for {key_norm}", output_dir_for_log, SKIP_BAD_ARMOR_VALUE, line_number)
                     continue
 
                 if key_norm == "mass":
@@ -418,36 +783,310 @@ def parse_mtf_file(filepath, output_dir_for_log):
         if current_fluff_field and fluff_text_buffer: fluff_text[current_fluff_field] = "\n".join(fluff_text_buffer).strip()
         if fluff_text: data["fluff_text"] = fluff_text
 
-        armor_base_info = data.pop("armor_details_temp", parse_mtf_armor_type_line(data.get("armor", "Standard Armor")))
-        final_armor_obj = {"type": armor_base_info["type"], "manufacturer": armor_base_info["manufacturer"], "locations": []}
-
-        if "armor_locations_map" in data: # Mech armor
-            total_armor = 0
-            armor_map = data.pop("armor_locations_map")
-            for loc_key, points_str in armor_map.items():
-                try: points = int(points_str); total_armor += points
-                except ValueError: points = 0
-
-                # Standardize armor locations from map keys
-                if loc_key == "RTC": display_loc = "Center Torso (Rear)"
-                elif loc_key == "RTR": display_loc = "Right Torso (Rear)"
-                elif loc_key == "RTL": display_loc = "Left Torso (Rear)"
-                else: display_loc = loc_key # Keep original if no mapping needed
-
-                final_armor_obj["locations"].append({"location": display_loc, "armor_points": points, "rear_armor_points": None})
-            if total_armor > 0: final_armor_obj["total_armor_points"] = total_armor
-        elif parsed_armor_locations: # Non-mech MTF armor
-            final_armor_obj["locations"] = parsed_armor_locations
-            final_armor_obj["total_armor_points"] = sum(loc.get("armor_points", 0) for loc in parsed_armor_locations if isinstance(loc.get("armor_points"), int))
-        data["armor"] = final_armor_obj
+        finalize_mtf_armor(data, parsed_armor_locations)
         if not data.get("quirks"): data["quirks"] = [] # Ensure quirks list exists
 
     except Exception as e:
-        log_skipped_file(filepath, f"MTF Error: {e} (line {line_number})", output_dir_for_log); return None, []
+        log_skipped_file(filepath, f"MTF Error: {e} (line {line_number})", output_dir_for_log, SKIP_MTF_ERROR, line_number); return None, []
     return data, derived_equipment_accumulator
 
+# --- Single-pass MTF parser ---
+# One pass over the lines with an explicit state machine (header / weapons / criticals / fluff) and
+# a key -> handler table for "Key: value" lines. Produces the same JSON as parse_mtf_file_legacy:
+# techbase/era lines may appear anywhere, so equipment tuples are completed after the pass.
+MTF_PARSER_ENGINES = ("table", "legacy")
+MTF_PARSER_ENGINE = os.environ.get("MEGAMEKLAB_MTF_PARSER", "table")
+
+MTF_FLUFF_FIELDS = frozenset(["overview", "capabilities", "deployment", "history", "variants", "notable_pilots", "additional", "notes"])
+MTF_NON_MECH_ARMOR_KEYS = {
+    "front armor": "Front", "left armor": "Left Side", "right armor": "Right Side", "rear armor": "Rear",
+    "nose armor": "Nose", "left wing armor": "Left Wing", "right wing armor": "Right Wing", "aft armor": "Aft",
+    "turret armor": "Turret", "rotor armor": "Rotor"
+}
+MTF_CRITICAL_LOCATION_ALIASES = {"Rear Right Leg": "Right Leg", "Rear Left Leg": "Left Leg",
+                                 "Rear Center Torso": "Center Torso (Rear)", "RTC": "Center Torso (Rear)"}
+MTF_NOT_SECTION_MARKERS = (" ammo:", "armor:", "manufacturer:", "primaryfactory:", "systemmanufacturer:")
+MTF_WEAPON_KEYWORDS = ("laser", "ppc", "srm", "lrm", "ac", "autocannon", "gauss", "flamer", "lb-x", "ultra", "rotary", " streak ", "gun", "machine gun")
+MTF_TWO_WORD_KEY_PATTERN = re.compile(r"^\w+\s\w+:")
+
+MTF_STATE_HEADER, MTF_STATE_WEAPONS, MTF_STATE_CRITICALS, MTF_STATE_FLUFF = range(4)
+
+@functools.lru_cache(maxsize=EQUIPMENT_TYPE_CACHE_SIZE)
+def _classify_mtf_weapon(item_name, heat_sink_type, engine_type):
+    derived_type = _classify_mtf_item(item_name, heat_sink_type, engine_type)
+    # Items without a specific type and no weapon keyword are classified generically as "Weapon".
+    if (derived_type == "Unknown" or derived_type == equipment_type_string(item_name)) and \
+       not any(kw in item_name.lower() for kw in MTF_WEAPON_KEYWORDS):
+        return "Weapon"
+    return derived_type
+
+def get_mtf_weapon_type(item_name, unit_context):
+    # Type for an entry of the MTF "Weapons:" list.
+    return _classify_mtf_weapon(item_name, unit_context.get("heat_sink_type"), unit_context.get("engine_type"))
+
+class _MtfParse:
+    __slots__ = ("filepath", "output_dir_for_log", "data", "unit_context", "parsed_armor_locations")
+
+    def __init__(self, filepath, output_dir_for_log, data):
+        self.filepath = filepath; self.output_dir_for_log = output_dir_for_log; self.data = data
+        self.unit_context = {}; self.parsed_armor_locations = []
+
+def _mtf_key_mass(parse, key, value):
+    try: parse.data["mass"] = int(value)
+    except ValueError: parse.data["mass"] = value
+
+def _mtf_key_engine(parse, key, value):
+    parsed_engine = parse_mtf_engine(value)
+    parse.data["engine"] = parsed_engine
+    # Clean and store engine type, e.g. "FusionEngine", "XLEngine"
+    cleaned_engine_type = ''.join(word.title() for word in parsed_engine.get("type", "FusionEngine").replace("(IS)","").replace("(Clan)","").split())
+    if cleaned_engine_type and "engine" not in cleaned_engine_type.lower(): # e.g. XL -> XLEngine
+        cleaned_engine_type = f"{cleaned_engine_type}Engine"
+    elif not cleaned_engine_type:
+        cleaned_engine_type = "FusionEngine" # Default if type was empty
+    parse.unit_context["engine_type"] = cleaned_engine_type
+
+def _mtf_key_heat_sinks(parse, key, value):
+    parsed_hs = parse_mtf_heat_sinks(value)
+    parse.data["heat_sinks"] = parsed_hs
+    # Clean and store hs type, e.g. "SingleHeatSink", "DoubleHeatSink"
+    cleaned_hs_type = ''.join(word.title() for word in parsed_hs.get("type", "Single").split())
+    if cleaned_hs_type and "heatsink" not in cleaned_hs_type.lower(): # e.g. Single -> SingleHeatSink
+        cleaned_hs_type = f"{cleaned_hs_type}HeatSink"
+    elif not cleaned_hs_type:
+        cleaned_hs_type = "SingleHeatSink" # Default if type was empty
+    parse.unit_context["heat_sink_type"] = cleaned_hs_type
+
+def _mtf_key_armor(parse, key, value, in_critical_section):
+    if not in_critical_section: parse.data["armor_details_temp"] = parse_mtf_armor_type_line(value)
+
+def _mtf_key_quirk(parse, key, value): parse.data["quirks"].append(value)
+def _mtf_key_structure(parse, key, value): parse.data["structure"] = parse_mtf_structure(value)
+def _mtf_key_myomer(parse, key, value): parse.data["myomer"] = parse_mtf_myomer(value)
+def _mtf_key_mul_id(parse, key, value): parse.data["mul_id"] = value
+def _mtf_key_ignored(parse, key, value): pass
+
+def _mtf_key_manufacturer(parse, key, value):
+    # Manufacturer and PrimaryFactory are consolidated into one list; values may be comma-separated.
+    current_manufacturers = parse.data.setdefault("manufacturers", [])
+    for man_name in value.split(','):
+        man_name_stripped = man_name.strip()
+        if man_name_stripped: current_manufacturers.append({"name": man_name_stripped})
+
+def _mtf_key_system_manufacturer(parse, key, value):
+    sys_type, sys_name = value.split(":", 1) if ":" in value else (key, value)
+    parse.data.setdefault("system_manufacturers", []).append({"type": sys_type.strip(), "name": sys_name.strip()})
+
+MTF_KEY_HANDLERS = {
+    "mass": _mtf_key_mass, "engine": _mtf_key_engine, "heat_sinks": _mtf_key_heat_sinks,
+    "quirk": _mtf_key_quirk, "structure": _mtf_key_structure, "myomer": _mtf_key_myomer,
+    "manufacturer": _mtf_key_manufacturer, "primaryfactory": _mtf_key_manufacturer,
+    "systemmanufacturer": _mtf_key_system_manufacturer, "mul_id": _mtf_key_mul_id,
+    # Read elsewhere (techbase/era) or never stored on their own
+    "techbase": _mtf_key_ignored, "era": _mtf_key_ignored, "weapons": _mtf_key_ignored, "conversion_notes": _mtf_key_ignored,
+}
+
+def _dispatch_mtf_key(parse, key, value, in_critical_section, line_number):
+    key_norm = key.strip().lower().replace(" ", "_").replace("(", "").replace(")", "")
+    if key_norm in MTF_NON_MECH_ARMOR_KEYS:
+        try: parse.parsed_armor_locations.append({"location": MTF_NON_MECH_ARMOR_KEYS[key_norm], "armor_points": int(value)})
+        except ValueError: log_skipped_file(parse.filepath, f"Non-integer armor value '{value}' for {key_norm}", parse.output_dir_for_log, SKIP_BAD_ARMOR_VALUE, line_number)
+        return
+    handler = MTF_KEY_HANDLERS.get(key_norm)
+    if handler is not None: handler(parse, key, value)
+    elif key_norm == "armor": _mtf_key_armor(parse, key, value, in_critical_section)
+    elif key_norm.endswith("_armor"):
+        loc_name = key_norm.upper().replace("_ARMOR",""); parse.data.setdefault("armor_locations_map", {})[loc_name] = value
+    else: parse.data[key_norm] = value
+
+def parse_mtf_file_single_pass(filepath, output_dir_for_log):
+    data = {"quirks": [], "weapons_and_equipment": []}; fluff_text = {}
+    base_filename = os.path.basename(filepath)
+    data["era"] = get_year_from_path(filepath)
+    data["tech_base"] = "Clan" if "clan" in filepath.lower() else "Inner Sphere" # Set default, can be overridden
+    parse = _MtfParse(filepath, output_dir_for_log, data)
+    equipment_names_and_types = [] # (item_name, item_type); tech base and era are added once the file is read
+    state = MTF_STATE_HEADER
+    current_section_name = None; current_section_items = []
+    current_fluff_field = None; fluff_text_buffer = []
+    line_number = 0
+
+    try:
+        with open_source_file(filepath, 'r', encoding='latin-1', errors='ignore') as f: lines = f.readlines()
+
+        for line_number, line_content in enumerate(lines, 1):
+            line = line_content.strip()
+            if not line:
+                if state == MTF_STATE_FLUFF:
+                    fluff_text[current_fluff_field] = "\n".join(fluff_text_buffer).strip(); fluff_text_buffer = []; current_fluff_field = None
+                    state = MTF_STATE_HEADER
+                elif state == MTF_STATE_WEAPONS: state = MTF_STATE_HEADER
+                continue
+
+            line_lower = line.lower()
+            colon_index = line.find(":")
+            if colon_index >= 0:
+                key_lower = line_lower[:colon_index]
+                # TechBase/Era apply to the whole file wherever they appear (even inside fluff or weapon lists).
+                key_norm = key_lower.strip().replace(" ", "_")
+                if key_norm == "techbase": data["tech_base"] = line[colon_index + 1:].strip()
+                elif key_norm == "era":
+                    value_clean = line[colon_index + 1:].strip()
+                    try: data["era"] = int(value_clean)
+                    except ValueError: data["era"] = value_clean
+
+                if key_lower in MTF_FLUFF_FIELDS:
+                    if state == MTF_STATE_FLUFF: fluff_text[current_fluff_field] = "\n".join(fluff_text_buffer).strip()
+                    elif state == MTF_STATE_CRITICALS:
+                        data.setdefault("criticals", []).append({"location": current_section_name, "slots": current_section_items})
+                        current_section_name = None; current_section_items = []
+                    current_fluff_field = key_lower; fluff_text_buffer = [line[len(key_lower)+1:].strip()]
+                    state = MTF_STATE_FLUFF
+                    continue
+
+            if state == MTF_STATE_FLUFF: fluff_text_buffer.append(line); continue
+
+            if line_lower.startswith("weapons:"):
+                # Clear critical section context
+                state = MTF_STATE_WEAPONS; current_section_name = None; current_section_items = []
+                continue
+
+            if state == MTF_STATE_WEAPONS:
+                line_parts = line.split(',')
+                item_name_on_weapon_line = line_parts[0].strip()
+                location = line_parts[1].strip() if len(line_parts) > 1 else "Unknown"
+                if item_name_on_weapon_line:
+                    derived_type_for_weapon = get_mtf_weapon_type(item_name_on_weapon_line, parse.unit_context)
+                    data["weapons_and_equipment"].append({"item_name": item_name_on_weapon_line, "location": location, "item_type": derived_type_for_weapon})
+                    equipment_names_and_types.append((item_name_on_weapon_line, derived_type_for_weapon))
+                continue
+
+            if line[-1] == ':' and not any(marker in line_lower for marker in MTF_NOT_SECTION_MARKERS) and not MTF_TWO_WORD_KEY_PATTERN.match(line):
+                if current_section_name and current_section_items:
+                    data.setdefault("criticals", []).append({"location": current_section_name, "slots": current_section_items})
+                # Standardize critical hit locations
+                current_section_name = MTF_CRITICAL_LOCATION_ALIASES.get(line[:-1], line[:-1])
+                current_section_items = []
+                state = MTF_STATE_CRITICALS if current_section_name else MTF_STATE_HEADER # A bare ":" line names no section
+                continue
+
+            if colon_index >= 0:
+                _dispatch_mtf_key(parse, line[:colon_index], line[colon_index + 1:].strip(), state == MTF_STATE_CRITICALS, line_number)
+            elif state == MTF_STATE_CRITICALS:
+                if line == data.get('model', ""): pass # Skip the model name appearing as a critical item
+                elif line == "-Empty-": current_section_items.append("-Empty-")
+                else:
+                    current_section_items.append(line)
+                    equipment_names_and_types.append((line, get_mtf_item_type_from_line(line, parse.unit_context)))
+
+        if current_section_name and current_section_items: # Add the last section
+            data.setdefault("criticals", []).append({"location": current_section_name, "slots": current_section_items})
+        if state == MTF_STATE_FLUFF: fluff_text[current_fluff_field] = "\n".join(fluff_text_buffer).strip()
+        if fluff_text: data["fluff_text"] = fluff_text
+
+        finalize_mtf_armor(data, parse.parsed_armor_locations)
+        if not data.get("quirks"): data["quirks"] = [] # Ensure quirks list exists
+
+    except Exception as e:
+        log_skipped_file(filepath, f"MTF Error: {e} (line {line_number})", output_dir_for_log, SKIP_MTF_ERROR, line_number); return None, []
+    file_tech_base = data["tech_base"]; file_era = data["era"]
+    return data, [(item_name, item_type, file_tech_base, file_era, base_filename) for item_name, item_type in equipment_names_and_types]
+
+def parse_mtf_file(filepath, output_dir_for_log):
+    if MTF_PARSER_ENGINE == "legacy": return parse_mtf_file_legacy(filepath, output_dir_for_log)
+    return parse_mtf_file_single_pass(filepath, output_dir_for_log)
+
+# --- BLK lexer ---
+# BLK files are flat "<tag>\nvalue lines\n</tag>" blocks. The helpers below scan the text with str.find
+# instead of regular expressions: comments are stripped with one forward scan per comment kind and
+# tags are read in a single pass, so cost stays linear even for large DropShip/WarShip equipment blocks.
+BLK_TAG_NAME_CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_ :.-"
+BLK_INT_PATTERN = re.compile(r"-?\d+")
+BLK_FLOAT_PATTERN = re.compile(r"-?\d+\.\d+")
+
+def strip_blk_comments(content):
+    # Applied in this order: <!-- ... --> blocks, #if ... #endif blocks, then '#' up to and including the newline.
+    content = _remove_delimited(content, content, "<!--", "-->", 4)
+    content = _remove_delimited(content, content.lower(), "#if", "#endif", 3, optional_suffix="s")
+    pieces = []; position = 0
+    while True:
+        hash_index = content.find("#", position)
+        if hash_index < 0: break
+        pieces.append(content[position:hash_index])
+        newline_index = content.find("\n", hash_index + 1)
+        position = len(content) if newline_index < 0 else newline_index + 1
+    pieces.append(content[position:])
+    return "".join(pieces)
+
+def _remove_delimited(content, search_text, start_marker, end_marker, body_offset, optional_suffix=""):
+    # search_text is content or content.lower() (same length) so the markers can match case-insensitively.
+    pieces = []; position = 0
+    while True:
+        start_index = search_text.find(start_marker, position)
+        if start_index < 0: break
+        end_index = search_text.find(end_marker, start_index + body_offset)
+        if end_index < 0: break # No later start marker can be closed either
+        end_index += len(end_marker)
+        if optional_suffix and search_text.startswith(optional_suffix, end_index): end_index += len(optional_suffix)
+        pieces.append(content[position:start_index]); position = end_index
+    pieces.append(content[position:])
+    return "".join(pieces)
+
+def find_blk_simple_tag(content, lowered, tag):
+    # Value of the first <tag>value</tag> whose value is non-empty and holds no '<' (case-insensitive tag).
+    open_marker = f"<{tag}>"; close_marker = f"</{tag}>"
+    position = 0
+    while True:
+        open_index = lowered.find(open_marker, position)
+        if open_index < 0: return None
+        value_start = open_index + len(open_marker)
+        value_end = lowered.find("<", value_start)
+        if value_end > value_start and lowered.startswith(close_marker, value_end): return content[value_start:value_end]
+        position = open_index + 1
+
+def _find_blk_closing_tag(lowered, tag_lower, position):
+    # Finds "</ tag >" (whitespace allowed around the name) at or after position; returns (start, end) or None.
+    while True:
+        close_index = lowered.find("</", position)
+        if close_index < 0: return None
+        name_index = close_index + 2
+        whitespace_end = name_index
+        while whitespace_end < len(lowered) and lowered[whitespace_end].isspace(): whitespace_end += 1
+        for candidate in range(name_index, whitespace_end + 1): # The tag name itself may start with a space
+            if lowered.startswith(tag_lower, candidate):
+                end_index = candidate + len(tag_lower)
+                while end_index < len(lowered) and lowered[end_index].isspace(): end_index += 1
+                if end_index < len(lowered) and lowered[end_index] == ">": return close_index, end_index + 1
+        position = close_index + 2
+
+def iter_blk_tags(content):
+    # Yields (tag, lines) for every <tag>...</tag> block in comment-stripped BLK text, lines being the stripped non-empty value lines.
+    lowered = content.lower()
+    unclosed_after = {} # tag -> open position with no closing tag after it; later opens of that tag cannot close either
+    position = 0
+    while True:
+        open_index = content.find("<", position)
+        if open_index < 0: return
+        name_end = content.find(">", open_index + 1)
+        if name_end < 0: return
+        tag = content[open_index + 1:name_end]
+        position = open_index + 1
+        if not tag or tag.strip(BLK_TAG_NAME_CHARS): continue
+        tag_lower = tag.lower()
+        if tag_lower in unclosed_after and unclosed_after[tag_lower] < open_index: continue
+        close_index = lowered.find("</", name_end + 1)
+        close_marker = f"</{tag_lower}>"
+        if close_index >= 0 and lowered.startswith(close_marker, close_index): position = close_index + len(close_marker) # The usual case: the next closing tag is ours, written plainly
+        else:
+            closing = _find_blk_closing_tag(lowered, tag_lower, max(close_index, name_end + 1))
+            if closing is None: unclosed_after[tag_lower] = open_index; continue
+            close_index, position = closing
+        yield tag, [line for line in map(str.strip, content[name_end + 1:close_index].split("\n")) if line]
+
 def parse_blk_tag_content(content_str, key_hint=""):
-    items = [item.strip() for item in content_str.strip().split('\n') if item.strip()]
+    return parse_blk_tag_lines([item.strip() for item in content_str.strip().split('\n') if item.strip()], key_hint)
+
+def parse_blk_tag_lines(items, key_hint=""):
     if not items: return None
 
     if key_hint in ["model", "source", "name", "chassis", "variant"] or "manufacturer" in key_hint: # Ensure these are strings
@@ -458,9 +1097,9 @@ def parse_blk_tag_content(content_str, key_hint=""):
         if item.lower() == "true": processed_items.append(True)
         elif item.lower() == "false": processed_items.append(False)
         # Avoid converting MUL IDs or version strings like "2.0" to int/float unless contextually appropriate
-        elif re.fullmatch(r"-?\d+", item) and key_hint not in ["id", "mulid", "version", "source", "model"]:
+        elif BLK_INT_PATTERN.fullmatch(item) and key_hint not in ["id", "mulid", "version", "source", "model"]:
              processed_items.append(int(item))
-        elif re.fullmatch(r"-?\d+\.\d+", item) and key_hint not in ["version", "source", "model"]:
+        elif BLK_FLOAT_PATTERN.fullmatch(item) and key_hint not in ["version", "source", "model"]:
             try: processed_items.append(float(item))
             except ValueError: processed_items.append(item)
         else: processed_items.append(item)
@@ -490,14 +1129,12 @@ def parse_blk_file(filepath, output_dir_for_log):
     if "clan" in path_lower: file_tech_base = "Clan"
 
     try:
-        with open(filepath, 'r', encoding='latin-1', errors='ignore') as f: content = f.read()
-        content = re.sub(r"<!--.*?-->", "", content, flags=re.DOTALL)
-        content = re.sub(r"#ifs?.*?#endifs?", "", content, flags=re.DOTALL | re.IGNORECASE)
-        content = re.sub(r"#.*?(\r?\n|$)", "", content) # More careful comment removal
-
-        type_tag_match = re.search(r"<type>([^<]+)</type>", content, flags=re.IGNORECASE)
-        if type_tag_match:
-            type_val_str = type_tag_match.group(1).strip().lower()
+        with open_source_file(filepath, 'r', encoding='latin-1', errors='ignore') as f: content = f.read()
+        content = strip_blk_comments(content); lowered = content.lower()
+
+        type_val = find_blk_simple_tag(content, lowered, "type")
+        if type_val is not None:
+            type_val_str = type_val.strip().lower()
             # More specific type inference from <type> tag
             if "vehicle" in type_val_str: unit_type_from_file = "vehicle"
             elif "battlemech" in type_val_str or " biped" in type_val_str : unit_type_from_file = "battlemech"
@@ -514,23 +1151,16 @@ def parse_blk_file(filepath, output_dir_for_log):
             elif "inner sphere" in type_val_str or "is " in type_val_str : file_tech_base = "Inner Sphere"
             elif "mixed" in type_val_str: file_tech_base = "Mixed"
 
-        year_tag_match = re.search(r"<year>([^<]+)</year>", content, flags=re.IGNORECASE)
-        if year_tag_match:
-            year_val = year_tag_match.group(1).strip()
+        year_val = find_blk_simple_tag(content, lowered, "year")
+        if year_val is None: year_val = find_blk_simple_tag(content, lowered, "originalbuildyear")
+        if year_val is not None:
+            year_val = year_val.strip()
             try: file_era = int(year_val)
             except ValueError: file_era = year_val
-        else:
-            orig_year_match = re.search(r"<originalBuildYear>([^<]+)</originalBuildYear>", content, flags=re.IGNORECASE)
-            if orig_year_match:
-                year_val = orig_year_match.group(1).strip()
-                try: file_era = int(year_val)
-                except ValueError: file_era = year_val
-
-        pattern = re.compile(r"<([a-zA-Z0-9_ :.-]+?)>([\s\S]*?)</\s*\s*>", flags=re.IGNORECASE) # Allow . and - in tag names
-        for match in pattern.finditer(content):
-            tag, value_str = match.groups()
+
+        for tag, value_lines in iter_blk_tags(content):
             key = tag.strip().lower().replace(" ", "_").replace(":", "").replace(".","").replace("-","") # Normalize key
-            parsed_value = parse_blk_tag_content(value_str, key)
+            parsed_value = parse_blk_tag_lines(value_lines, key)
 
             if key == "mass" and isinstance(parsed_value, str):
                 try: parsed_value = int(parsed_value)
@@ -616,6 +1246,11 @@ def parse_blk_file(filepath, output_dir_for_log):
                     seen_names.add(man_obj["name"])
             data["manufacturers"] = unique_manufacturers
 
+        # Battle armor <chassis> holds the body type (biped/quad), not a name; the name is in <name>
+        if "chassis" in data:
+            body_type = data.pop("chassis")
+            if "config" not in data: data["config"] = body_type
+
         # Process 'config' field (improved logic)
         if "config" in data:
             parsed_value = data["config"]
@@ -670,7 +1305,7 @@ def parse_blk_file(filepath, output_dir_for_log):
                         else:
                             all_items_for_derived.append(item_name_candidate)
 
-        for item_name_on_unit in set(all_items_for_derived): # Use set to get unique names
+        for item_name_on_unit in dict.fromkeys(all_items_for_derived): # Unique names, in first-seen order (a set's order varies with PYTHONHASHSEED)
             item_type_for_blk = get_blk_item_type_from_name(item_name_on_unit)
             derived_equipment_accumulator.append((item_name_on_unit, item_type_for_blk, file_tech_base, file_era, base_filename))
 
@@ -705,7 +1340,7 @@ def parse_blk_file(filepath, output_dir_for_log):
 
 
     except Exception as e:
-        log_skipped_file(filepath, f"BLK Parsing Error: {e}", output_dir_for_log); return None, []
+        log_skipped_file(filepath, f"BLK Parsing Error: {e}", output_dir_for_log, SKIP_BLK_ERROR); return None, []
     return data, derived_equipment_accumulator
 
 def parse_xml_file(filepath, output_dir_for_log):
@@ -722,20 +1357,31 @@ def parse_xml_file(filepath, output_dir_for_log):
     ]
 
     try:
-        tree = ET.parse(filepath)
-        root = tree.getroot()
-        data_for_json[root.tag] = {} # Initialize for the main XML structure conversion
-
-        for category_element in root: # Iterates over <ammos>, <weapons>, etc.
-            category_tag_name = category_element.tag
-            data_for_json[root.tag][category_tag_name] = {} # For direct JSON conversion
-
-            # This part handles the direct conversion for UnitVerifierOptions.json
-            # Needs to be adapted if category_element contains non-item children or just text
-            if not list(category_element): # If it's a simple tag like <foo>text</foo>
-                 data_for_json[root.tag][category_tag_name] = category_element.text.strip() if category_element.text else ""
-
-            for item_element in category_element: # Iterates over <ammo>, <weapon> in <ammos>, <weapons>
+        # Streamed with iterparse: an item (e.g. <weapon> in <weapons>, or <ceilWeight> in <mek>) is converted as soon as
+        # its end tag is read and then cleared, so only one item's subtree is held in memory at a time.
+        depth = 0 # Of the element the next event is about: 0 root, 1 category, 2 item, 3+ options and their children
+        root = root_data = category_element = None
+        category_has_items = False
+        with open_source_file(filepath, 'rb') as f:
+            for event, element in ET.iterparse(f, events=("start", "end")):
+                if event == "start":
+                    if depth == 0: root = element; root_data = data_for_json[root.tag] = {} # The main XML structure conversion
+                    elif depth == 1: # <ammos>, <weapons>, etc.
+                        category_element = element; category_has_items = False
+                        root_data[element.tag] = {} # For direct JSON conversion
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth == 1:
+                    # This part handles the direct conversion for UnitVerifierOptions.json
+                    if not category_has_items: # If it's a simple tag like <foo>text</foo>
+                        root_data[element.tag] = element.text.strip() if element.text else ""
+                    root.clear() # Drop the finished category
+                    continue
+                if depth != 2: continue # Options are read with their item
+                category_has_items = True
+                category_tag_name = category_element.tag
+                item_element = element # <ammo>, <weapon> in <ammos>, <weapons>
                 item_tag_name = item_element.tag # e.g. "ammo", "weapon"
                 entity_data = {} # For direct JSON conversion of this item
 
@@ -781,9 +1427,9 @@ def parse_xml_file(filepath, output_dir_for_log):
                 # This part might need adjustment based on how item_elements are structured
                 # Assuming item_name_text is unique enough to be a key
                 if item_name_text != "Unknown Name" and item_name_text :
-                    data_for_json[root.tag][category_tag_name][item_name_text] = entity_data
+                    root_data[category_tag_name][item_name_text] = entity_data
                 else: # Fallback if name is not suitable as key
-                    data_for_json[root.tag][category_tag_name].setdefault(item_tag_name, []).append(entity_data)
+                    root_data[category_tag_name].setdefault(item_tag_name, []).append(entity_data)
 
                 # Add to derived_equipment_accumulator if it's an equipment category
                 if category_tag_name in equipment_categories_tags:
@@ -799,18 +1445,24 @@ def parse_xml_file(filepath, output_dir_for_log):
                             intro_year_val,
                             source_file_basename
                         ))
+                category_element.clear() # The item is converted; free it
         return data_for_json, derived_equipment_accumulator
     except Exception as e:
-        log_skipped_file(filepath, f"XML Processing Error: {e}", output_dir_for_log)
+        log_skipped_file(filepath, f"XML Processing Error: {e}", output_dir_for_log, SKIP_XML_ERROR)
         return None, []
 
 # Worker function for multiprocessing
 def _process_file_worker(args_tuple):
-    filepath, base_output_dir, mekfiles_output_dir, root_dir_for_relative_path = args_tuple
+    filepath, base_output_dir, mekfiles_output_dir, root_dir_for_relative_path, bundle_compression, write_json, build_sqlite_rows, parse_cache_path = args_tuple
 
     processed_count = 0
+    parse_cache = open_parse_cache(parse_cache_path) if parse_cache_path else None
+    parse_cache_entry = None # (key, encoded result or None on a hit) for the main process to store or mark as used
+    bundle_record = None # Encoded here so serialisation and compression run in the workers
+    sqlite_row = None # (table, row) for the direct-to-SQLite writer; extracted here for the same reason
     derived_equipment_for_worker = []
-    skipped_file_info = None # Tuple: (filepath, reason, output_dir_for_log)
+    unsupported_file = False
+    start_collecting_skip_records() # Parsers' skip logs come back with the result instead of being written here
 
     filename = os.path.basename(filepath)
 
@@ -834,15 +1486,19 @@ def _process_file_worker(args_tuple):
     parsed_data = None
     # parse_error_occurred is used to avoid double-logging skips if the parser itself logs it.
     parse_error_occurred = False
+    # Taken before parsing: its content hash is also the parse cache key.
+    try: fingerprint = get_file_fingerprint(filepath)
+    except OSError: fingerprint = None
+    source_sha256 = fingerprint["sha256"] if fingerprint else None
 
     if filename.lower().endswith(".mtf"):
-        parsed_data, derived_eq = parse_mtf_file(filepath, base_output_dir)
+        parsed_data, derived_eq, parse_cache_entry = parse_with_cache(parse_mtf_file, filepath, base_output_dir, parse_cache, source_sha256)
         if parsed_data:
             derived_equipment_for_worker.extend(derived_eq)
         else: # Error in parsing, assumed to be logged by parse_mtf_file
             parse_error_occurred = True
     elif filename.lower().endswith(".blk"):
-        parsed_data, derived_eq = parse_blk_file(filepath, base_output_dir)
+        parsed_data, derived_eq, parse_cache_entry = parse_with_cache(parse_blk_file, filepath, base_output_dir, parse_cache, source_sha256)
         if parsed_data:
             derived_equipment_for_worker.extend(derived_eq)
         else: # Error in parsing, assumed to be logged by parse_blk_file
@@ -850,7 +1506,7 @@ def _process_file_worker(args_tuple):
     elif filename.lower() == "unitverifieroptions.xml":
         # For this specific file, the output path is fixed relative to mekfiles_output_dir
         output_filepath_json = os.path.join(mekfiles_output_dir, "UnitVerifierOptions.json")
-        parsed_data, derived_eq = parse_xml_file(filepath, base_output_dir) # Expects two values now
+        parsed_data, derived_eq, parse_cache_entry = parse_with_cache(parse_xml_file, filepath, base_output_dir, parse_cache, source_sha256)
         if parsed_data:
             derived_equipment_for_worker.extend(derived_eq)
         else: # Error in parsing, assumed to be logged by parse_xml_file
@@ -860,44 +1516,477 @@ def _process_file_worker(args_tuple):
     # For now, only unitverifieroptions.xml is handled by parse_xml_file explicitly for derived_equipment.
 
 
+    output_relative_path = None
+    output_sha256 = None # Of the canonical JSON of the converted data, whatever the layout; feeds the run digest
     if parsed_data:
-        # Ensure the specific directory for this JSON exists before saving
-        # This is important if relative_path contains subdirectories
-        os.makedirs(os.path.dirname(output_filepath_json), exist_ok=True)
-        save_to_json(parsed_data, output_filepath_json, base_output_dir)
+        output_relative_path = os.path.relpath(output_filepath_json, mekfiles_output_dir)
+        output_sha256 = canonical_json_sha256(parsed_data)
+        is_unit = filename.lower() != "unitverifieroptions.xml"
+        stored_unit = None # The bytes written for this file; None when nothing was written
+        if not write_json: pass
+        elif bundle_compression is not None and is_unit: # Only units go into the bundle
+            bundle_record = stored_unit = encode_record(output_relative_path, parsed_data, bundle_compression)
+        else:
+            # Ensure the specific directory for this JSON exists before saving
+            # This is important if relative_path contains subdirectories
+            os.makedirs(os.path.dirname(output_filepath_json), exist_ok=True)
+            stored_unit = save_to_json(parsed_data, output_filepath_json, base_output_dir)
+        if build_sqlite_rows:
+            sqlite_row = build_sqlite_row(output_relative_path, parsed_data, is_unit, filepath, base_output_dir, stored_unit)
+            if sqlite_row is None: parse_error_occurred = True # Kept out of the manifest so it is retried next run
         processed_count = 1
-    elif not parse_error_occurred and not filename.lower().endswith(
-        ('.png', '.gif', '.jpg', '.jpeg', '.svg', '.txt', '.html', '.xml~',
-         '.psd', '.md', '.pdf', '.doc', '.docx', '.zip', '.log', '.jar',
-         '.xsl', '.css', '.js', '.tif', '.tiff', '.bmp', '.datasheet',
-         '.bk2', '.लक', '.dat', '.mmf')
-        ):
+    elif not parse_error_occurred and not filename.lower().endswith(IGNORED_FILE_EXTENSIONS):
         # This file wasn't processed by any specific parser, no error was logged by them,
         # and it's not in the general skip list.
         # We need to record this skip to be logged by the main process.
         # Exception: unitverifieroptions.xml, if it failed parsing, parse_error_occurred would be true.
         # If it's some other XML, it would fall here.
         if not (filename.lower() == "unitverifieroptions.xml" and parse_error_occurred) :
-             skipped_file_info = (filepath, "Unsupported file type or error during processing.", base_output_dir)
-
-    return {
-        "processed_count": processed_count,
-        "derived_equipment": derived_equipment_for_worker,
-        "skipped_file_info": skipped_file_info
-    }
+             log_skipped_file(filepath, "Unsupported file type or error during processing.", base_output_dir, SKIP_UNSUPPORTED_FILE)
+             unsupported_file = True
+
+    # Compact result, unpacked in process_files:
+    # (processed_count, derived_equipment state, skip_records, unsupported_file, output_relative_path, parse_error, fingerprint, bundle_record, sqlite_row,
+    #  parse_cache_entry, output_sha256)
+    return (processed_count,
+            # Pre-merged per file: a unit lists the same heat sinks, actuators and ammo many times over.
+            _intern_strings(DerivedEquipmentAggregator().add_tuples(derived_equipment_for_worker).to_state()),
+            stop_collecting_skip_records(), unsupported_file, output_relative_path, parse_error_occurred, fingerprint, bundle_record, sqlite_row,
+            parse_cache_entry, output_sha256)
+
+def _intern_strings(value):
+    # Equal strings become one object, which pickle then sends once per batch (names, types and tech bases repeat across units).
+    if isinstance(value, str): return sys.intern(value)
+    if isinstance(value, list): return [_intern_strings(item) for item in value]
+    return value
+
+def get_file_fingerprint(filepath, with_hash=True):
+    """Returns the manifest fingerprint (size, mtime, content hash) of a source file."""
+    stat = stat_source_file(filepath)
+    fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": None, "parser_version": PARSER_VERSION}
+    if with_hash:
+        with open_source_file(filepath, 'rb') as f: fingerprint["sha256"] = hashlib.sha256(f.read()).hexdigest()
+    return fingerprint
+
+def load_manifest(base_output_dir):
+    """Loads the manifest of the previous run, or an empty one if missing or unreadable."""
+    manifest_path = os.path.join(base_output_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path): return {}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f: manifest = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Warning: Could not read manifest {manifest_path}, doing a full conversion: {e}")
+        return {}
+    if not isinstance(manifest, dict) or manifest.get("format") != MANIFEST_FORMAT: return {}
+    return manifest.get("files", {})
+
+def load_manifest_setting(base_output_dir, key, default=None):
+    """A top-level setting recorded by the previous run (default if the manifest predates it), or None without a manifest."""
+    try:
+        with open(os.path.join(base_output_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f: return json.load(f).get(key, default)
+    except (OSError, json.JSONDecodeError, AttributeError): return None
+
+def load_manifest_layout(base_output_dir):
+    """Output layout recorded by the previous run ("files" for manifests written before layouts existed)."""
+    return load_manifest_setting(base_output_dir, "layout", "files")
+
+def save_manifest(manifest_files, base_output_dir, layout="files", sqlite_db=None, shard=None):
+    manifest_path = os.path.join(base_output_dir, MANIFEST_FILE)
+    # json.dumps runs the C encoder; json.dump would stream the (large) manifest through the pure-Python one
+    manifest_json = json.dumps({"format": MANIFEST_FORMAT, "parser_version": PARSER_VERSION, "layout": layout, "sqlite_db": sqlite_db,
+                                "shard": shard, "files": dict(sorted(manifest_files.items()))}, ensure_ascii=False)
+    write_text_atomically(manifest_path, manifest_json)
+
+def canonical_json_sha256(data):
+    """sha256 of data as compact JSON with sorted keys: equal for equal data, whatever the key order or output layout."""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+def compute_run_digest(manifest_files, derived_equipment_list):
+    """Digest of a run's outputs: every converted file's (source path, output hash) in path order, then the derived equipment."""
+    digest = hashlib.sha256()
+    for relative_path in sorted(manifest_files, key=lambda path: path.replace(os.sep, "/")):
+        digest.update(f"{relative_path.replace(os.sep, '/')}\t{manifest_files[relative_path].get('output_sha256')}\n".encode("utf-8"))
+    digest.update(canonical_json_sha256(derived_equipment_list).encode("ascii"))
+    return digest.hexdigest()
+
+def save_run_digest(manifest_files, derived_equipment_list, base_output_dir):
+    """Writes DIGEST_FILE and returns the digest. It does not depend on the layout, worker scheduling or file mtimes."""
+    digest = compute_run_digest(manifest_files, derived_equipment_list)
+    write_text_atomically(os.path.join(base_output_dir, DIGEST_FILE), json.dumps(
+        {"digest": digest, "parser_version": PARSER_VERSION, "files": len(manifest_files), "equipment": len(derived_equipment_list)}, indent=2) + "\n")
+    return digest
+
+def write_text_atomically(path, text):
+    """Writes path through a temporary file and a rename, so an interrupted run never leaves it half-written."""
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f: f.write(text)
+    os.replace(temp_path, path)
+
+def is_manifest_entry_current(entry, filepath, mekfiles_output_dir, bundled_outputs=None):
+    """True if the source file still matches its manifest entry and the recorded output exists
+    (as a file, or in bundled_outputs for entries written to the unit bundle).
+
+    Size and mtime are checked first; the content hash is only computed when they differ
+    (e.g. after a fresh checkout), in which case the entry's mtime is refreshed in place.
+    """
+    if not entry or entry.get("parser_version") != PARSER_VERSION: return False
+    if entry.get("output"):
+        if entry.get("bundled"):
+            if bundled_outputs is None or entry["output"] not in bundled_outputs: return False
+        elif not os.path.exists(os.path.join(mekfiles_output_dir, entry["output"])): return False
+    try: current = get_file_fingerprint(filepath, with_hash=False)
+    except OSError: return False
+    if current["size"] != entry.get("size"): return False
+    if current["mtime_ns"] == entry.get("mtime_ns"): return True
+    if get_file_fingerprint(filepath)["sha256"] != entry.get("sha256"): return False
+    entry["mtime_ns"] = current["mtime_ns"]
+    return True
+
+def remove_stale_outputs(previous_manifest, current_relative_paths, mekfiles_output_dir, bundle_writer=None):
+    """Deletes JSON outputs (or bundle records) whose source files are no longer present in the data directory."""
+    removed_count = 0
+    for relative_path, entry in previous_manifest.items():
+        if relative_path in current_relative_paths or not entry.get("output"): continue
+        if entry.get("bundled"):
+            if bundle_writer is not None and bundle_writer.discard(entry["output"]): removed_count += 1
+            continue
+        output_path = os.path.join(mekfiles_output_dir, entry["output"])
+        if os.path.exists(output_path):
+            try: os.remove(output_path); removed_count += 1
+            except OSError as e: print(f"Warning: Could not remove stale output {output_path}: {e}")
+    return removed_count
+
+# --- Checkpoint journal (--resume) ---
+class ConversionJournal:
+    """Append-only record of the files a run has completed, so a killed run can be resumed with --resume.
+
+    The first line is a header with the run's settings; each further line is [relative path, manifest
+    entry, skip records] for one converted file. Lines are buffered and written in batches; the caller
+    makes the matching outputs durable first (bundle index, SQLite commit), so every journalled file's
+    output survives the crash. The journal is removed once the manifest of a finished run is saved.
+    """
+
+    def __init__(self, base_output_dir, header, append=False):
+        self.path = os.path.join(base_output_dir, JOURNAL_FILE)
+        self.journal_file = open(self.path, 'a' if append else 'w', encoding='utf-8')
+        self.pending_lines = []
+        if not append: self.pending_lines.append(json.dumps(header, ensure_ascii=False) + "\n"); self.flush()
+
+    def add(self, relative_path, manifest_entry, skip_records):
+        self.pending_lines.append(json.dumps([relative_path, manifest_entry, skip_records], ensure_ascii=False) + "\n")
+
+    def flush(self):
+        if not self.pending_lines: return
+        self.journal_file.writelines(self.pending_lines); self.pending_lines = []
+        self.journal_file.flush(); os.fsync(self.journal_file.fileno())
+
+    def remove(self):
+        self.journal_file.close()
+        if os.path.exists(self.path): os.remove(self.path)
+
+def journal_header(layout, sqlite_db, shard, incremental):
+    return {"journal": JOURNAL_FORMAT, "parser_version": PARSER_VERSION, "layout": layout, "sqlite_db": sqlite_db,
+            "shard": format_shard(shard), "incremental": incremental}
+
+def load_journal(base_output_dir, header):
+    """(header, {relative path: manifest entry}, {relative path: skip records}) from the journal of an interrupted run.
+
+    Returns None if there is no journal or it was written with other settings (layout, SQLite database, shard)
+    or another parser version. Only the interrupted run's incremental flag may differ from header. A line
+    cut short by the crash ends the journal.
+    """
+    journal_path = os.path.join(base_output_dir, JOURNAL_FILE)
+    if not os.path.exists(journal_path): return None
+    entries = {}; skip_records = {}
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        try: journal_header_line = json.loads(f.readline())
+        except json.JSONDecodeError: return None
+        if not isinstance(journal_header_line, dict) or dict(journal_header_line, incremental=None) != dict(header, incremental=None): return None
+        for line in f:
+            try: relative_path, manifest_entry, file_skip_records = json.loads(line)
+            except (json.JSONDecodeError, ValueError): break
+            entries[relative_path] = manifest_entry
+            skip_records[relative_path] = [tuple(record) for record in file_skip_records]
+    return journal_header_line, entries, skip_records
+
+# --- Parse cache ---
+class ParseCache:
+    """On-disk cache of parse results: (source sha256, source path, parser) -> (parsed data, equipment tuples, skip records).
+
+    The path is part of the key because the parsers take era, tech base and unit type from it. Conversion
+    workers only look results up; the main process records what they send back (new results to store,
+    hits to mark as used) and, on close(), evicts the least recently used results beyond max_bytes.
+    The database is in WAL mode, so the workers keep reading while the main process writes.
+    """
+
+    def __init__(self, db_path, max_bytes=PARSE_CACHE_MAX_BYTES):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._conn = None; self._conn_pid = None
+        self.used_keys = [] # Keys hit this run, marked as used on close()
+        self.stored_count = 0
+        self._connection() # Creates the database before any worker opens it
+
+    def _connection(self):
+        # One connection per process, opened on first use in each (a connection must not cross a fork).
+        if self._conn is None or self._conn_pid != os.getpid():
+            self._conn = sqlite3.connect(self.db_path, timeout=30)
+            self._conn_pid = os.getpid()
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS parse_cache (
+                source_sha256 TEXT NOT NULL, source_path TEXT NOT NULL, parser TEXT NOT NULL,
+                result BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL,
+                PRIMARY KEY (source_sha256, source_path, parser))""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS parse_cache_last_used ON parse_cache (last_used)")
+            self._conn.commit()
+        return self._conn
+
+    def lookup(self, key):
+        """(parsed data, equipment tuples, skip records) cached under key, or None."""
+        row = self._connection().execute("SELECT result FROM parse_cache WHERE source_sha256 = ? AND source_path = ? AND parser = ?", key).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else None
+
+    @staticmethod
+    def encode(parsed_data, equipment_tuples, skip_records):
+        return zlib.compress(json.dumps([parsed_data, equipment_tuples, skip_records], ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 1)
+
+    def record(self, key, encoded_result):
+        """Stores a worker's new result, or marks a hit (encoded_result None) as used."""
+        if encoded_result is None: self.used_keys.append(key); return
+        self._connection().execute("INSERT OR REPLACE INTO parse_cache VALUES (?, ?, ?, ?, ?, ?)", key + (encoded_result, len(encoded_result), time.time()))
+        self.stored_count += 1
+
+    def commit(self):
+        self._connection().commit()
+
+    def close(self):
+        """Marks this run's hits as used, evicts down to max_bytes and commits; returns (hits, stored, evicted)."""
+        conn = self._connection()
+        conn.executemany("UPDATE parse_cache SET last_used = ? WHERE source_sha256 = ? AND source_path = ? AND parser = ?",
+                         [(time.time(),) + key for key in self.used_keys])
+        excess = conn.execute("SELECT COALESCE(SUM(size), 0) FROM parse_cache").fetchone()[0] - self.max_bytes
+        evicted = []
+        if excess > 0:
+            for rowid, size in conn.execute("SELECT rowid, size FROM parse_cache ORDER BY last_used, rowid"):
+                if excess <= 0: break
+                evicted.append((rowid,)); excess -= size
+            conn.executemany("DELETE FROM parse_cache WHERE rowid = ?", evicted)
+        conn.commit(); conn.close()
+        summary = (len(self.used_keys), self.stored_count, len(evicted))
+        self._conn = None; self.used_keys = []; self.stored_count = 0
+        return summary
+
+@functools.lru_cache(maxsize=None)
+def open_parse_cache(db_path):
+    """The ParseCache for db_path, one object per process (workers inherit the main process's through fork)."""
+    return ParseCache(db_path)
+
+def parse_cache_parser_tag(parse_function):
+    # The two MTF engines are cached apart, so switching --mtf-parser never reads the other engine's results.
+    engine = f"-{MTF_PARSER_ENGINE}" if parse_function is parse_mtf_file else ""
+    return f"{parse_function.__name__}{engine}@{PARSER_VERSION}"
+
+def parse_with_cache(parse_function, filepath, output_dir_for_log, parse_cache, source_sha256):
+    """parse_function(filepath, output_dir_for_log) through parse_cache; returns (parsed data, equipment tuples, cache entry).
+
+    The cache entry is (key, encoded result) for a new result, (key, None) for a hit, or None when nothing
+    is cached (no cache, unreadable source, or a failed parse, which is retried and logged again next run).
+    A hit replays the skip records the parser logged when the result was cached.
+    """
+    if parse_cache is None or source_sha256 is None:
+        parsed_data, equipment_tuples = parse_function(filepath, output_dir_for_log)
+        return parsed_data, equipment_tuples, None
+    key = (source_sha256, str(filepath), parse_cache_parser_tag(parse_function))
+    cached = parse_cache.lookup(key)
+    if cached is not None:
+        parsed_data, equipment_tuples, skip_records = cached
+        for path, reason_code, line_number, reason in skip_records: log_skipped_file(path, reason, output_dir_for_log, reason_code, line_number)
+        return parsed_data, equipment_tuples, (key, None)
+    first_record = len(_collected_skip_records) if _collected_skip_records is not None else 0
+    parsed_data, equipment_tuples = parse_function(filepath, output_dir_for_log)
+    if not parsed_data: return parsed_data, equipment_tuples, None
+    skip_records = _collected_skip_records[first_record:] if _collected_skip_records is not None else []
+    return parsed_data, equipment_tuples, (key, ParseCache.encode(parsed_data, equipment_tuples, skip_records))
+
+# --- Direct-to-SQLite output (--sqlite) ---
+@functools.lru_cache(maxsize=None)
+def load_populate_db():
+    """Imports battletech-editor-app/data/populate_db.py, which is only needed when --sqlite is used."""
+    if str(POPULATE_DB_DIR) not in sys.path: sys.path.append(str(POPULATE_DB_DIR))
+    import populate_db
+    return populate_db
+
+def build_sqlite_row(output_relative_path, parsed_data, is_unit, filepath, output_dir_for_log, stored_unit=None):
+    """(table, row) for SqliteUnitWriter.add, using populate_db's column extraction; None (logged) on failure.
+
+    A unit's row is the pair (units row, units_fts row). stored_unit is the unit as written to the output (JSON file
+    bytes or bundle record); its hash becomes the row's content_hash, so a later populate_db sync skips the unit.
+    """
+    try:
+        populate_db = load_populate_db()
+        if is_unit:
+            content_hash = populate_db.unit_content_hash(stored_unit) if stored_unit is not None else None
+            unit_row = populate_db.build_unit_row(output_relative_path, parsed_data, content_hash)
+            return "units", (unit_row, populate_db.build_unit_search_row(unit_row, parsed_data))
+        row = populate_db.build_unit_validation_options_row(parsed_data, filepath)
+        if row is None: raise ValueError("no 'entityverifier' options")
+        return "unit_validation_options", row
+    except Exception as e:
+        log_skipped_file(filepath, f"SQLite Row Error: {e}", output_dir_for_log, SKIP_SQLITE_ROW_ERROR)
+        return None
+
+class SqliteUnitWriter:
+    """The single writer of the direct-to-SQLite mode: batched executemany into populate_db's tables, one transaction per run.
+
+    With fresh=True the database file is recreated (as populate_db does); otherwise rows are upserted into it.
+    """
+
+    def __init__(self, db_path, fresh=True):
+        self.populate_db = load_populate_db()
+        if fresh and os.path.exists(db_path): os.remove(db_path)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        if not self.populate_db.create_schema(self.conn):
+            self.conn.close()
+            raise RuntimeError(f"Could not create the SQLite schema in {db_path}")
+        self.pending_units = []
+        self.unit_count = 0
+
+    def add(self, table, row):
+        if table == "unit_validation_options": self.conn.execute(self.populate_db.UNIT_VALIDATION_OPTIONS_UPSERT_SQL, row); return
+        self.pending_units.append(row)
+        if len(self.pending_units) >= self.populate_db.UNITS_BATCH_SIZE: self.flush()
+
+    def flush(self):
+        if not self.pending_units: return
+        self.populate_db.upsert_units(self.conn, self.pending_units)
+        self.unit_count += len(self.pending_units); self.pending_units = []
+
+    def delete_units(self, original_file_paths):
+        """Removes the rows of units whose sources were deleted or no longer convert."""
+        self.flush()
+        return self.conn.executemany("DELETE FROM units WHERE original_file_path = ?", [(path,) for path in original_file_paths]).rowcount
+
+    def replace_equipment(self, equipment_list):
+        # The aggregate is rebuilt every run, so the table is replaced rather than upserted.
+        self.conn.execute("DELETE FROM equipment")
+        return self.upsert_equipment(equipment_list)
+
+    def upsert_equipment(self, equipment_list):
+        rows = self.populate_db.build_equipment_rows(equipment_list)
+        self.conn.executemany(self.populate_db.EQUIPMENT_UPSERT_SQL, rows)
+        return len(rows)
+
+    def delete_equipment(self, internal_ids):
+        self.conn.executemany("DELETE FROM equipment WHERE internal_id = ?", [(internal_id,) for internal_id in internal_ids])
+
+    def commit(self):
+        self.flush()
+        self.conn.commit()
+
+    def close(self):
+        try: self.commit()
+        finally: self.conn.close()
 
 def save_to_json(data, output_filepath, output_dir_for_log):
+    # Written to a temporary file and renamed into place, so a killed run never leaves a truncated JSON file.
+    # Returns the bytes written (None on failure).
+    temp_filepath = output_filepath + ".tmp"
     try:
+        raw_json = json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
         os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
-        with open(output_filepath, 'w', encoding='utf-8') as f: json.dump(data, f, indent=2, ensure_ascii=False)
+        with open(temp_filepath, 'wb') as f: f.write(raw_json)
+        os.replace(temp_filepath, output_filepath)
+        return raw_json
     except Exception as e:
+        if os.path.exists(temp_filepath):
+            try: os.remove(temp_filepath)
+            except OSError: pass
         print(f"Error saving JSON to {output_filepath}: {e}")
-        log_skipped_file(output_filepath, f"JSON Save Error: {e}", output_dir_for_log)
-
-def process_files(root_dir, base_output_dir):
+        log_skipped_file(output_filepath, f"JSON Save Error: {e}", output_dir_for_log, SKIP_JSON_SAVE_ERROR)
+
+_worker_config = None # (root_dir, base_output_dir, mekfiles_output_dir, bundle_compression, write_json, build_sqlite_rows, parse_cache_path), set once per worker process
+
+def _init_conversion_worker(mtf_parser_engine, *worker_config):
+    # Pool initializer: the settings shared by every file are sent once per worker rather than with each task.
+    # The MTF engine is passed too, since spawned workers re-import the module and would see only the default.
+    global _worker_config, MTF_PARSER_ENGINE
+    _worker_config = worker_config
+    MTF_PARSER_ENGINE = mtf_parser_engine
+    open_source_tree(worker_config[0]) # Already registered when forked; this process opens its own handle on first read
+
+def _process_batch_worker(batch):
+    """Converts a batch of (plan index, relative path) tasks.
+
+    Returns (worker pid, classifier cache stats, batch seconds, [(plan index, *file result), ...]).
+    imap_unordered returns batches out of order; the plan index ties each file back to its os.walk position.
+    """
+    start = time.perf_counter()
+    root_dir, base_output_dir, mekfiles_output_dir = _worker_config[:3]
+    file_results = [(index,) + _process_file_worker((os.path.join(root_dir, relative_path), base_output_dir, mekfiles_output_dir, root_dir) + _worker_config[3:])
+                    for index, relative_path in batch]
+    return os.getpid(), classifier_cache_stats(), time.perf_counter() - start, file_results
+
+def classify_source_file(filename):
+    """FILE_KIND_PARSE for unit files, FILE_KIND_IGNORED for known non-unit files, else FILE_KIND_UNSUPPORTED."""
+    filename_lower = filename.lower()
+    if filename_lower.endswith(PARSEABLE_FILE_EXTENSIONS) or filename_lower in PARSEABLE_FILE_NAMES: return FILE_KIND_PARSE
+    if filename_lower.endswith(IGNORED_FILE_EXTENSIONS): return FILE_KIND_IGNORED
+    return FILE_KIND_UNSUPPORTED
+
+def snapshot_source_files(root_dir):
+    """{relative path: (mtime_ns, size)} for the parseable files under root_dir, in os.walk (plan) order."""
+    snapshot = {}
+    for dirpath, filenames in walk_source_tree(root_dir):
+        relative_dir = os.path.relpath(dirpath, root_dir) # Once per directory; relpath is slow enough to matter per file
+        for filename in filenames:
+            if classify_source_file(filename) != FILE_KIND_PARSE: continue
+            try: stat = stat_source_file(os.path.join(dirpath, filename))
+            except OSError: continue # Deleted between listing and stat; picked up as removed next poll
+            snapshot[filename if relative_dir == os.curdir else os.path.join(relative_dir, filename)] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+def summarize_batch_timings(batch_timings):
+    """Summary lines for the (files, seconds) timing of each worker batch, for tuning --chunksize."""
+    if not batch_timings: return []
+    seconds = sorted(batch_seconds for _, batch_seconds in batch_timings)
+    file_count = sum(files for files, _ in batch_timings)
+    return [f"Worker batches: {len(batch_timings)} ({file_count / len(batch_timings):.1f} files each on average), "
+            f"batch time median {seconds[len(seconds) // 2] * 1000:.1f} ms, p95 {seconds[min(len(seconds) - 1, len(seconds) * 95 // 100)] * 1000:.1f} ms, "
+            f"max {seconds[-1] * 1000:.1f} ms, {sum(seconds) / file_count * 1000:.2f} ms per file"]
+
+def schedule_conversion_tasks(sized_tasks, num_processes, max_files_per_task=DEFAULT_CHUNKSIZE, task_order=None):
+    """Groups (size, task) pairs into batches, largest files first.
+
+    Dispatching the biggest files first (longest-processing-time scheduling) keeps a large WarShip
+    from starting last and stretching the tail of the run. A file of at least the target task size
+    becomes a task of its own; smaller files are batched up to that size or max_files_per_task files,
+    so the many small units cost one round trip per batch instead of one per file.
+    task_order, if given, is a sort key on the task used instead of largest first.
+    """
+    if task_order is not None: sized_tasks = sorted(sized_tasks, key=lambda sized_task: task_order(sized_task[1]))
+    else: sized_tasks = sorted(sized_tasks, key=lambda sized_task: -sized_task[0]) # Stable: ties keep os.walk order
+    target_task_bytes = max(1, sum(size for size, _ in sized_tasks) // max(1, num_processes * TASKS_PER_WORKER))
+    batches = []; batch = []; batch_bytes = 0
+    for size, task in sized_tasks:
+        batch.append(task); batch_bytes += size
+        if batch_bytes >= target_task_bytes or len(batch) >= max_files_per_task:
+            batches.append(batch); batch = []; batch_bytes = 0
+    if batch: batches.append(batch)
+    return batches
+
+def process_files(root_dir, base_output_dir, incremental=False, chunksize=DEFAULT_CHUNKSIZE, layout="files", sqlite_db=None, shard=None, resume=False,
+                  parse_cache_path=None):
+    global DERIVED_EQUIPMENT
     total_processed_count = 0
-    all_derived_equipment_tuples = []
-    files_to_process_args_list = []
+    bundle_compression = BUNDLE_COMPRESSION_BY_LAYOUT[layout]
+    write_json = layout != "none"
+    if not write_json and sqlite_db is None: raise ValueError("Output layout 'none' needs a SQLite database to write to")
+    # A shard only holds part of the units, so its outputs are combined by merge_shard_outputs before anything is loaded into SQLite.
+    if shard is not None and not write_json: raise ValueError("A shard run needs JSON output (layout files, bundle or bundle-zlib)")
+    if shard is not None and sqlite_db is not None: raise ValueError("A shard run cannot write to SQLite; merge the shards first")
+    sqlite_db = os.path.abspath(sqlite_db) if sqlite_db else None
+    source_archive = open_source_tree(root_dir) # None unless the data directory is a .zip/.tar(.gz) (see source_archive.py)
 
     mekfiles_output_dir = os.path.join(base_output_dir, "mekfiles")
     # No need to os.makedirs for mekfiles_output_dir here,
@@ -905,66 +1994,463 @@ def process_files(root_dir, base_output_dir):
     # However, the main mekfiles_output_dir itself should exist.
     os.makedirs(mekfiles_output_dir, exist_ok=True)
 
-    # Collect all filepaths and arguments for the worker
-    for dirpath, _, filenames in os.walk(root_dir):
+    previous_manifest = load_manifest(base_output_dir)
+    previous_layout = load_manifest_layout(base_output_dir)
+    dropped_manifest = {} # Entries not trusted to skip files, still used to remove the outputs of deleted sources
+    if previous_manifest and previous_layout != layout:
+        # Outputs of the other layout are removed and everything is converted again.
+        print(f"Output layout changed from '{previous_layout}' to '{layout}'; converting all files.")
+        remove_stale_outputs(previous_manifest, set(), mekfiles_output_dir)
+        previous_manifest = {}
+    if sqlite_db and previous_manifest and (load_manifest_setting(base_output_dir, "sqlite_db") != sqlite_db or not os.path.exists(sqlite_db)):
+        # Unchanged units are only skipped when their rows are already in this database.
+        print(f"SQLite database {sqlite_db} was not written by the previous run; converting all files.")
+        dropped_manifest, previous_manifest = previous_manifest, {}
+    header = journal_header(layout, sqlite_db, shard, incremental)
+    interrupted_journal = load_journal(base_output_dir, header) if resume else None
+    resumed_skip_records = {} # relative path -> skip records of files completed by the interrupted run
+    if resume and (interrupted_journal is None or (sqlite_db and not os.path.exists(sqlite_db))):
+        print(f"No journal of an interrupted run with these settings in {base_output_dir}; starting over.")
+        interrupted_journal = None
+    elif resume:
+        # Files the interrupted run completed are treated like unchanged files of an incremental run.
+        header, journal_entries, resumed_skip_records = interrupted_journal
+        # A full run recreates the bundle and the database, so the older manifest no longer describes them.
+        if not header["incremental"]: dropped_manifest, previous_manifest = dict(dropped_manifest, **previous_manifest), {}
+        previous_manifest = dict(previous_manifest, **journal_entries)
+        incremental = True
+        print(f"Resuming an interrupted run: {len(journal_entries)} files were already completed.")
+    if bundle_compression is None:
+        # A leftover bundle would shadow the JSON files for the downstream readers.
+        if remove_bundle(mekfiles_output_dir): print(f"Removed unit bundle from {mekfiles_output_dir} (layout '{layout}').")
+        bundle_writer = None
+    else:
+        # Kept in path order even when appending, so incremental and resumed runs leave the bundle a fresh run would write.
+        bundle_writer = UnitBundleWriter(mekfiles_output_dir, bundle_compression, append=incremental, keep_path_order=True)
+    bundled_outputs = bundle_writer.entries if bundle_writer is not None else None
+    # Parsed units stream from the workers straight into SQLite; an incremental run upserts into the existing database.
+    database_writer = SqliteUnitWriter(sqlite_db, fresh=not (incremental and previous_manifest)) if sqlite_db else None
+    current_manifest = {}
+    # One (relative_path, cached manifest entry or None) per file in os.walk order.
+    # Equipment facts are ordered by this position so the output does not depend on worker scheduling.
+    conversion_plan = []
+    sized_tasks = [] # (source size in bytes, (plan index, relative path)) for every file to convert
+    ignored_count = 0
+    skip_log = SkipLogWriter(base_output_dir) # The only writer of the skip log while the pool runs
+
+    # Planning: classify by name, then collect the parseable files with their sizes for scheduling
+    for dirpath, filenames in walk_source_tree(root_dir):
         for filename in filenames:
             filepath = os.path.join(dirpath, filename)
-            # The worker needs: filepath, base_output_dir, mekfiles_output_dir, root_dir (for relpath calc)
-            files_to_process_args_list.append((filepath, base_output_dir, mekfiles_output_dir, root_dir))
+            if shard is not None and shard_of(os.path.relpath(filepath, root_dir), shard[1]) != shard[0]: continue # Another shard's file
+            file_kind = classify_source_file(filename)
+            if file_kind == FILE_KIND_IGNORED: ignored_count += 1; continue
+            if file_kind == FILE_KIND_UNSUPPORTED:
+                skip_log.write((filepath, SKIP_UNSUPPORTED_FILE, None, "Unsupported file type or error during processing.")); continue
+            relative_path = os.path.relpath(filepath, root_dir)
+            # In incremental mode, files matching their manifest entry are not dispatched at all;
+            # their equipment state is taken from the manifest instead.
+            if incremental and is_manifest_entry_current(previous_manifest.get(relative_path), filepath, mekfiles_output_dir, bundled_outputs):
+                current_manifest[relative_path] = previous_manifest[relative_path]
+                skip_log.write_all(resumed_skip_records.get(relative_path, ()))
+                conversion_plan.append((relative_path, current_manifest[relative_path]))
+                continue
+            conversion_plan.append((relative_path, None))
+            try: size = stat_source_file(filepath).st_size
+            except OSError: size = 0
+            sized_tasks.append((size, (len(conversion_plan) - 1, relative_path)))
+
+    removed_count = remove_stale_outputs(dict(dropped_manifest, **previous_manifest), {relative_path for relative_path, _ in conversion_plan},
+                                         mekfiles_output_dir, bundle_writer)
+    if incremental:
+        print(f"Incremental mode: {len(conversion_plan) - len(sized_tasks)} unchanged, {len(sized_tasks)} new or changed, {removed_count} removed.")
 
     # Use multiprocessing Pool
     # num_processes = multiprocessing.cpu_count() # Use all available CPUs
     # Using a fixed number for now for stability, can be tuned. e.g. max(1, num_processes -1 )
     num_processes = multiprocessing.cpu_count()
-
-    print(f"Starting processing with {num_processes} workers...")
-
-    results = []
-    # Consider using imap_unordered for large number of files for better memory usage and progress feedback
-    # For simplicity, using map for now.
-    with multiprocessing.Pool(processes=num_processes) as pool:
-        results = pool.map(_process_file_worker, files_to_process_args_list)
-
-    # Process results from workers
-    for result in results:
-        if result: # Ensure result is not None, though workers should always return a dict
-            total_processed_count += result["processed_count"]
-            all_derived_equipment_tuples.extend(result["derived_equipment"])
-            if result["skipped_file_info"]:
-                # skipped_file_info is (filepath, reason, output_dir_for_log)
-                log_skipped_file(result["skipped_file_info"][0], result["skipped_file_info"][1], result["skipped_file_info"][2])
-
-    # Populate DERIVED_EQUIPMENT from all collected tuples
-    # This must be done in the main process after all workers are done.
-    for equip_tuple in all_derived_equipment_tuples:
-        # Ensure the tuple has the correct number of arguments for add_to_derived_equipment
-        if len(equip_tuple) == 5:
-            add_to_derived_equipment(equip_tuple[0], equip_tuple[1], equip_tuple[2], equip_tuple[3], equip_tuple[4])
-        else:
-            # Log an error or handle malformed tuples if necessary
-            print(f"Warning: Malformed equipment tuple: {equip_tuple}")
-
+    task_order = None
+    if source_archive is not None and source_archive.sequential:
+        # A compressed tar is only cheap to read front to back: the batches follow the archive order, and as the
+        # pool hands them out in that order, each worker's reads only ever seek forward in its own handle.
+        task_order = lambda task: source_read_position(os.path.join(root_dir, task[1]))
+    task_batches = schedule_conversion_tasks(sized_tasks, num_processes, max(1, chunksize), task_order)
+    task_count = len(sized_tasks)
+
+    print(f"Planned {task_count} files in {len(task_batches)} tasks, {'in archive order' if task_order else 'largest first'} "
+          f"({ignored_count} ignored, {skip_log.counts_by_reason.get(SKIP_UNSUPPORTED_FILE, 0)} unsupported).")
+    print(f"Starting processing with {num_processes} workers (up to {max(1, chunksize)} files per task)...")
+
+    fresh_states = {} # plan index -> file-local DerivedEquipmentAggregator state
+    classifier_stats_by_process = {} # worker pid -> latest cumulative classifier cache stats
+    batch_timings = [] # (files in batch, seconds spent in the worker)
+    finished_count = 0
+    start_time = time.monotonic()
+    parse_cache = open_parse_cache(parse_cache_path) if parse_cache_path else None
+    worker_config = (root_dir, base_output_dir, mekfiles_output_dir, bundle_compression, write_json, database_writer is not None, parse_cache_path)
+    journal = ConversionJournal(base_output_dir, header, append=interrupted_journal is not None)
+    with multiprocessing.Pool(processes=num_processes, initializer=_init_conversion_worker, initargs=(MTF_PARSER_ENGINE,) + worker_config) as pool:
+        # Results are folded as they arrive instead of being collected with pool.map.
+        # Batches are already sized by schedule_conversion_tasks, so imap_unordered hands them out one at a time.
+        for worker_pid, worker_classifier_stats, batch_seconds, file_results in pool.imap_unordered(_process_batch_worker, task_batches):
+            classifier_stats_by_process[worker_pid] = worker_classifier_stats
+            batch_timings.append((len(file_results), batch_seconds))
+            for (index, processed_count, derived_state, skip_records, unsupported_file, output_relative_path, parse_error, fingerprint, bundle_record, sqlite_row,
+                 parse_cache_entry, output_sha256) in file_results:
+                total_processed_count += processed_count
+                if parse_cache_entry is not None: parse_cache.record(*parse_cache_entry)
+                skip_log.write_all(skip_records)
+                # Files that failed or were unsupported stay out of the manifest so they are retried (and logged) next run.
+                if bundle_record is not None: bundle_writer.add_record(output_relative_path, bundle_record)
+                if sqlite_row is not None: database_writer.add(*sqlite_row)
+                if fingerprint and not parse_error and not unsupported_file:
+                    manifest_entry = current_manifest[conversion_plan[index][0]] = dict(
+                        fingerprint, output=output_relative_path if write_json else None, output_sha256=output_sha256, derived_equipment=derived_state)
+                    if bundle_record is not None: manifest_entry["bundled"] = True
+                    journal.add(conversion_plan[index][0], manifest_entry, skip_records)
+                if derived_state: fresh_states[index] = derived_state
+            if len(journal.pending_lines) >= JOURNAL_BATCH_SIZE:
+                # Outputs first, so the journal never lists a file whose output a crash could still lose.
+                if bundle_writer is not None: bundle_writer.checkpoint()
+                if database_writer is not None: database_writer.commit()
+                if parse_cache is not None: parse_cache.commit()
+                journal.flush()
+
+            previous_count, finished_count = finished_count, finished_count + len(file_results)
+            if finished_count // PROGRESS_INTERVAL != previous_count // PROGRESS_INTERVAL or finished_count == task_count:
+                elapsed = time.monotonic() - start_time
+                rate = finished_count / elapsed if elapsed > 0 else 0.0
+                print(f"Processed {finished_count}/{task_count} files ({rate:.1f} files/sec)...")
+
+        # Combine fresh and cached per-file states with a parallel merge tree.
+        indexed_file_states = []
+        for plan_index, (_, cached_entry) in enumerate(conversion_plan):
+            state = cached_entry.get("derived_equipment") if cached_entry is not None else fresh_states.get(plan_index)
+            if state: indexed_file_states.append((plan_index, state))
+        DERIVED_EQUIPMENT = merge_file_states_in_parallel(pool, indexed_file_states, num_processes)
+    skip_log.close()
+    if parse_cache is not None:
+        cache_hits, cache_stored, cache_evicted = parse_cache.close()
+        print(f"Parse cache {parse_cache.db_path}: {cache_hits} hits, {cache_stored} new results, {cache_evicted} evicted.")
+
+    for line in summarize_batch_timings(batch_timings): print(line)
+    classifier_hits, classifier_misses = summarize_classifier_stats(classifier_stats_by_process)
+    if classifier_hits + classifier_misses:
+        print(f"Equipment type cache: {classifier_hits} hits, {classifier_misses} misses "
+              f"({classifier_hits / (classifier_hits + classifier_misses):.1%} hit rate across {len(classifier_stats_by_process)} workers)")
 
     # Save the aggregated DERIVED_EQUIPMENT to JSON
+    derived_equipment_list = DERIVED_EQUIPMENT.to_list()
     derived_equipment_path = os.path.join(mekfiles_output_dir, "derivedEquipment.json")
-    # Ensure DERIVED_EQUIPMENT is not empty before trying to get values, though list() on empty dict is fine.
-    save_to_json(list(DERIVED_EQUIPMENT.values()), derived_equipment_path, base_output_dir)
-    print(f"Derived equipment data saved to {derived_equipment_path}")
+    if shard is not None:
+        # Only the merge sees every file, so a shard leaves its per-file states instead of a partial derivedEquipment.json.
+        if os.path.exists(derived_equipment_path): os.remove(derived_equipment_path)
+        save_shard_state([(conversion_plan[plan_index][0], state) for plan_index, state in indexed_file_states], base_output_dir, shard)
+        print(f"Shard {shard[0]}/{shard[1]}: derived equipment states of {len(indexed_file_states)} files saved to {os.path.join(base_output_dir, SHARD_STATE_FILE)}")
+    elif write_json:
+        save_to_json(derived_equipment_list, derived_equipment_path, base_output_dir)
+        print(f"Derived equipment data saved to {derived_equipment_path}")
+    elif os.path.exists(derived_equipment_path): os.remove(derived_equipment_path) # Would be stale; the database has the current list
+
+    if database_writer is not None:
+        # Rows of removed sources and of units that no longer convert (unit rows are keyed by their .json path).
+        stale_unit_paths = [str(Path(relative_path).with_suffix('.json')) for relative_path in previous_manifest if relative_path not in current_manifest]
+        removed_rows = database_writer.delete_units(stale_unit_paths) if stale_unit_paths else 0
+        equipment_count = database_writer.replace_equipment(derived_equipment_list)
+        database_writer.close()
+        print(f"SQLite database {database_writer.db_path} updated: {database_writer.unit_count} units written, "
+              f"{removed_rows} removed, {equipment_count} equipment items.")
+
+    if bundle_writer is not None:
+        # Keep only records of units that are still current (drops removed and now-failing sources).
+        live_outputs = {entry["output"] for entry in current_manifest.values() if entry.get("bundled")}
+        for output_relative_path in [path for path in bundle_writer.entries if path not in live_outputs]: bundle_writer.discard(output_relative_path)
+        bundle_writer.close()
+        print(f"Unit bundle saved to {bundle_writer.data_path} ({len(bundle_writer)} units)")
+
+    save_manifest(current_manifest, base_output_dir, layout, sqlite_db, format_shard(shard))
+    digest_path = os.path.join(base_output_dir, DIGEST_FILE)
+    if shard is not None:
+        if os.path.exists(digest_path): os.remove(digest_path) # Only the merged outputs get a digest
+    else: print(f"Run digest {save_run_digest(current_manifest, derived_equipment_list, base_output_dir)} saved to {digest_path}")
+    journal.remove() # The run is complete; the manifest now covers everything the journal did
+
+    skip_summary = skip_log.summary_lines()
+    if skip_summary:
+        print(f"Skipped or flagged files by reason (details in {skip_log.log_path}):")
+        for line in skip_summary: print(f"  {line}")
 
     return total_processed_count
 
-if __name__ == "__main__":
+# --- Sharded runs (--shard i/N) and merging them (--merge-shards) ---
+def parse_shard(shard_spec):
+    """"i/N" -> (i, N), with 0 <= i < N."""
+    try:
+        index, count = (int(part) for part in shard_spec.split("/"))
+    except ValueError: raise ValueError(f"Shard must look like i/N (e.g. 0/4), got '{shard_spec}'")
+    if count < 1 or not 0 <= index < count: raise ValueError(f"Shard index must be in 0..N-1, got '{shard_spec}'")
+    return index, count
+
+def format_shard(shard):
+    return None if shard is None else f"{shard[0]}/{shard[1]}"
+
+def shard_of(relative_path, shard_count):
+    """Shard of a source file: a hash of its '/'-separated relative path, so every machine and Python run agrees (unlike hash())."""
+    digest = hashlib.sha1(relative_path.replace(os.sep, "/").encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count
+
+def save_shard_state(file_states, base_output_dir, shard):
+    write_text_atomically(os.path.join(base_output_dir, SHARD_STATE_FILE),
+                          json.dumps({"format": MANIFEST_FORMAT, "parser_version": PARSER_VERSION, "shard": format_shard(shard), "files": file_states}, ensure_ascii=False))
+
+def load_shard_state(shard_output_dir):
+    with open(os.path.join(shard_output_dir, SHARD_STATE_FILE), 'r', encoding='utf-8') as f: state = json.load(f)
+    if state.get("format") != MANIFEST_FORMAT or state.get("parser_version") != PARSER_VERSION:
+        raise ValueError(f"{shard_output_dir} was written by a different converter version")
+    return state
+
+def merge_shard_outputs(shard_output_dirs, root_dir, base_output_dir):
+    """Combines the outputs of a complete set of --shard runs into base_output_dir.
+
+    Unit outputs and skip logs are copied over, and the manifests are combined. derivedEquipment.json
+    is rebuilt from the shards' per-file states, ordered by a walk of root_dir, so it is the same as
+    the one a single run over root_dir on this machine would write.
+    Returns the number of unit outputs merged.
+    """
+    global DERIVED_EQUIPMENT
+    shards = []
+    for shard_output_dir in shard_output_dirs:
+        shard = parse_shard(load_shard_state(shard_output_dir)["shard"])
+        shards.append((shard, shard_output_dir, load_manifest_layout(shard_output_dir), load_manifest(shard_output_dir)))
+    shards.sort()
+    shard_count = shards[0][0][1]
+    if sorted(shard for shard, _, _, _ in shards) != [(index, shard_count) for index in range(shard_count)]:
+        raise ValueError(f"Need exactly one output for each of shards 0..{shard_count - 1}, got {', '.join(format_shard(shard) for shard, _, _, _ in shards)}")
+    layouts = {layout for _, _, layout, _ in shards}
+    if len(layouts) != 1: raise ValueError(f"Shards were written with different layouts: {', '.join(sorted(map(str, layouts)))}")
+    layout = layouts.pop()
+
+    mekfiles_output_dir = os.path.join(base_output_dir, "mekfiles")
+    os.makedirs(mekfiles_output_dir, exist_ok=True)
+    remove_stale_outputs(load_manifest(base_output_dir), set(), mekfiles_output_dir) # Whatever an earlier run left here
+    remove_bundle(mekfiles_output_dir)
+    bundle_compression = BUNDLE_COMPRESSION_BY_LAYOUT[layout]
+    bundle_writer = UnitBundleWriter(mekfiles_output_dir, bundle_compression) if bundle_compression else None
+
+    merged_manifest = {}
+    merged_count = 0
+    skipped_lines = []
+    for _, shard_output_dir, _, shard_manifest in shards:
+        shard_mekfiles_dir = os.path.join(shard_output_dir, "mekfiles")
+        for entry in shard_manifest.values():
+            if not entry.get("output") or entry.get("bundled"): continue
+            output_path = os.path.join(mekfiles_output_dir, entry["output"])
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            shutil.copyfile(os.path.join(shard_mekfiles_dir, entry["output"]), output_path)
+            merged_count += 1
+        if bundle_writer is not None:
+            shard_reader = UnitBundleReader(shard_mekfiles_dir)
+            for relative_path, raw_record in shard_reader.iter_raw(): bundle_writer.add_record(relative_path, raw_record); merged_count += 1
+        merged_manifest.update(shard_manifest)
+        shard_skip_log_path = os.path.join(shard_output_dir, SKIPPED_FILES_LOG)
+        if os.path.exists(shard_skip_log_path):
+            with open(shard_skip_log_path, 'r', encoding='utf-8') as shard_skip_log: skipped_lines.extend(shard_skip_log)
+    if bundle_writer is not None: bundle_writer.close()
+    if skipped_lines:
+        with open(os.path.join(base_output_dir, SKIPPED_FILES_LOG), 'a', encoding='utf-8') as merged_skip_log: merged_skip_log.writelines(skipped_lines)
+        print(f"{len(skipped_lines)} files/items were skipped or had errors in the shards. See {os.path.join(base_output_dir, SKIPPED_FILES_LOG)}")
+
+    # Same plan order as process_files: the parseable files in os.walk order.
+    plan_indices = {relative_path: plan_index for plan_index, relative_path in enumerate(snapshot_source_files(root_dir))}
+    indexed_file_states = []
+    for _, shard_output_dir, _, _ in shards:
+        for relative_path, state in load_shard_state(shard_output_dir)["files"]:
+            if relative_path not in plan_indices: raise ValueError(f"{relative_path} (from {shard_output_dir}) is not under {root_dir}")
+            indexed_file_states.append((plan_indices[relative_path], state))
+    DERIVED_EQUIPMENT = _merge_file_states(sorted(indexed_file_states))
+    derived_equipment_path = os.path.join(mekfiles_output_dir, "derivedEquipment.json")
+    derived_equipment_list = DERIVED_EQUIPMENT.to_list()
+    save_to_json(derived_equipment_list, derived_equipment_path, base_output_dir)
+    print(f"Merged {shard_count} shards: {merged_count} unit outputs, derived equipment saved to {derived_equipment_path}")
+
+    save_manifest(merged_manifest, base_output_dir, layout)
+    print(f"Run digest {save_run_digest(merged_manifest, derived_equipment_list, base_output_dir)} saved to {os.path.join(base_output_dir, DIGEST_FILE)}")
+    return merged_count
+
+class ConversionWatcher:
+    """--watch mode: polls the data directory and re-converts only the files that were touched.
+
+    Changed files are parsed in this process (one edit is a handful of files, so a pool would only add
+    latency). Their JSON/bundle outputs are rewritten, their rows upserted into SQLite, and the derived
+    equipment aggregate is updated through LiveEquipmentAggregate. derivedEquipment.json and the manifest
+    are large, so they are rewritten once the directory has been quiet for a poll rather than per edit.
+    Files created while watching are ordered after the known ones until the next full or incremental
+    run renumbers them.
+    """
+
+    def __init__(self, root_dir, base_output_dir, layout="files", sqlite_db=None, parse_cache_path=None):
+        self.root_dir = root_dir
+        self.parse_cache_path = parse_cache_path
+        self.base_output_dir = base_output_dir
+        self.mekfiles_output_dir = os.path.join(base_output_dir, "mekfiles")
+        self.layout = layout
+        self.bundle_compression = BUNDLE_COMPRESSION_BY_LAYOUT[layout]
+        self.write_json = layout != "none"
+        self.sqlite_db = os.path.abspath(sqlite_db) if sqlite_db else None
+        # Taken right after the incremental run in watch_files, so these match the states DERIVED_EQUIPMENT was merged from.
+        self.manifest = load_manifest(base_output_dir)
+        self.snapshot = snapshot_source_files(root_dir)
+        self.plan_indices = {relative_path: plan_index for plan_index, relative_path in enumerate(self.snapshot)}
+        self.equipment = LiveEquipmentAggregate(
+            ((relative_path, self.plan_indices[relative_path], entry["derived_equipment"]) for relative_path, entry in self.manifest.items()
+             if relative_path in self.plan_indices and entry.get("derived_equipment")), DERIVED_EQUIPMENT)
+        self.database_writer = SqliteUnitWriter(self.sqlite_db, fresh=False) if self.sqlite_db else None
+        self.flush_pending = False
+
+    def poll(self):
+        """Scans once and applies any changes; returns (changed, removed) relative paths."""
+        current = snapshot_source_files(self.root_dir)
+        changed = [relative_path for relative_path, stamp in current.items() if self.snapshot.get(relative_path) != stamp]
+        removed = [relative_path for relative_path in self.snapshot if relative_path not in current]
+        self.snapshot = current
+        if changed or removed: self.apply_changes(changed, removed)
+        elif self.flush_pending: self.flush()
+        return changed, removed
+
+    def apply_changes(self, changed, removed):
+        start = time.perf_counter()
+        bundle_writer = UnitBundleWriter(self.mekfiles_output_dir, self.bundle_compression, append=True) if self.bundle_compression else None
+        affected_equipment = set()
+        stale_unit_paths = []
+        with SkipLogWriter(self.base_output_dir) as skip_log:
+            for relative_path in removed:
+                entry = self.manifest.pop(relative_path, None)
+                if entry: remove_stale_outputs({relative_path: entry}, set(), self.mekfiles_output_dir, bundle_writer)
+                stale_unit_paths.append(str(Path(relative_path).with_suffix('.json')))
+                affected_equipment |= self.equipment.replace_file(relative_path, None, None)
+            for relative_path in changed:
+                plan_index = self.plan_indices.setdefault(relative_path, len(self.plan_indices))
+                (_, derived_state, skip_records, unsupported_file, output_relative_path, parse_error, fingerprint, bundle_record,
+                 sqlite_row, parse_cache_entry, output_sha256) = _process_file_worker((os.path.join(self.root_dir, relative_path), self.base_output_dir, self.mekfiles_output_dir,
+                                                                        self.root_dir, self.bundle_compression, self.write_json, self.database_writer is not None,
+                                                                        self.parse_cache_path))
+                if parse_cache_entry is not None: open_parse_cache(self.parse_cache_path).record(*parse_cache_entry)
+                for record in skip_records: print(f"Skipped: {record[0]} - Reason: {record[3]}")
+                skip_log.write_all(skip_records)
+                if bundle_record is not None: bundle_writer.add_record(output_relative_path, bundle_record)
+                if sqlite_row is not None: self.database_writer.add(*sqlite_row)
+                if fingerprint and not parse_error and not unsupported_file:
+                    entry = self.manifest[relative_path] = dict(fingerprint, output=output_relative_path if self.write_json else None,
+                                                                output_sha256=output_sha256, derived_equipment=derived_state)
+                    if bundle_record is not None: entry["bundled"] = True
+                else:
+                    # As in process_files: a file that no longer converts leaves the manifest, the bundle and the database.
+                    entry = self.manifest.pop(relative_path, None)
+                    if bundle_writer is not None and entry and entry.get("bundled"): bundle_writer.discard(entry["output"])
+                    stale_unit_paths.append(str(Path(relative_path).with_suffix('.json')))
+                affected_equipment |= self.equipment.replace_file(relative_path, plan_index, derived_state)
+        if bundle_writer is not None: bundle_writer.close()
+        if self.parse_cache_path: open_parse_cache(self.parse_cache_path).close()
+
+        if self.database_writer is not None:
+            if stale_unit_paths: self.database_writer.delete_units(stale_unit_paths)
+            self.database_writer.upsert_equipment(DERIVED_EQUIPMENT.entries_for(affected_equipment))
+            self.database_writer.delete_equipment([internal_id for internal_id in affected_equipment if internal_id not in DERIVED_EQUIPMENT._facts])
+            self.database_writer.commit()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"[{datetime.datetime.now():%H:%M:%S}] {len(changed)} changed, {len(removed)} removed: "
+              f"{len(affected_equipment)} equipment items updated in {elapsed_ms:.0f} ms")
+        self.flush_pending = True
+
+    def flush(self):
+        derived_equipment_list = DERIVED_EQUIPMENT.to_list()
+        if self.write_json:
+            save_to_json(derived_equipment_list, os.path.join(self.mekfiles_output_dir, "derivedEquipment.json"), self.base_output_dir)
+        # Written after the outputs, so the manifest never claims more than what is on disk.
+        save_manifest(self.manifest, self.base_output_dir, self.layout, self.sqlite_db)
+        save_run_digest(self.manifest, derived_equipment_list, self.base_output_dir)
+        self.flush_pending = False
+
+    def close(self):
+        if self.flush_pending: self.flush()
+        if self.database_writer is not None: self.database_writer.close()
+
+def watch_files(root_dir, base_output_dir, chunksize=DEFAULT_CHUNKSIZE, layout="files", sqlite_db=None, interval=WATCH_POLL_INTERVAL, parse_cache_path=None):
+    """Brings the outputs up to date with an incremental run, then re-converts touched files until interrupted."""
+    processed_count = process_files(root_dir, base_output_dir, incremental=True, chunksize=chunksize, layout=layout, sqlite_db=sqlite_db,
+                                    parse_cache_path=parse_cache_path)
+    print(f"Initial incremental run converted {processed_count} files.")
+    watcher = ConversionWatcher(root_dir, base_output_dir, layout, sqlite_db, parse_cache_path)
+    print(f"Watching {root_dir} for changes every {interval}s (Ctrl+C to stop)...")
+    try:
+        while True:
+            time.sleep(interval)
+            watcher.poll()
+    except KeyboardInterrupt: print("Watch stopped.")
+    finally: watcher.close()
+
+def _shard_argument(shard_spec):
+    try: return parse_shard(shard_spec)
+    except ValueError as e: raise argparse.ArgumentTypeError(str(e))
+
+def main(argv=None):
+    global MTF_PARSER_ENGINE
+    parser = argparse.ArgumentParser(description="Converts MegaMekLab MTF/BLK/XML unit files to JSON.")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"Only re-convert files that changed since the last run (tracked in {MANIFEST_FILE}).")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                        help=f"Most small files batched into one worker task (default {DEFAULT_CHUNKSIZE}).")
+    parser.add_argument("--layout", choices=OUTPUT_LAYOUTS, default="files",
+                        help="Unit output: one JSON file per unit (files), a packed JSON Lines bundle with an offset index, optionally zlib-compressed per record (bundle, bundle-zlib), or no JSON at all (none, requires --sqlite).")
+    parser.add_argument("--sqlite", metavar="DB_FILE",
+                        help="Also write the parsed units and equipment straight into this SQLite database (populate_db.py's schema and columns); "
+                             "recreated on full runs, updated in place with --incremental.")
+    parser.add_argument("--mtf-parser", choices=MTF_PARSER_ENGINES, default=MTF_PARSER_ENGINE,
+                        help="MTF parsing engine: the single-pass 'table' engine or the original 'legacy' parser (default from MEGAMEKLAB_MTF_PARSER, else table).")
+    parser.add_argument("--watch", action="store_true",
+                        help="After an incremental run, keep polling the data directory and re-convert (and upsert, with --sqlite) files as they change.")
+    parser.add_argument("--watch-interval", type=float, default=WATCH_POLL_INTERVAL,
+                        help=f"Seconds between scans in --watch mode (default {WATCH_POLL_INTERVAL}).")
+    parser.add_argument("--shard", type=_shard_argument, metavar="I/N",
+                        help="Convert only shard I of N (files split by a stable hash of their relative path); combine the shard outputs with --merge-shards.")
+    parser.add_argument("--resume", action="store_true",
+                        help=f"Continue a run that was killed partway: files it completed (recorded in {JOURNAL_FILE}) are not converted again.")
+    parser.add_argument("--merge-shards", nargs="+", metavar="SHARD_OUTPUT_DIR",
+                        help="Merge the outputs of a complete set of --shard runs into the output directory instead of converting.")
+    args = parser.parse_args(argv)
+    if args.layout == "none" and not args.sqlite: parser.error("--layout none writes no JSON, so it needs --sqlite")
+    if args.shard and (args.sqlite or args.watch): parser.error("--shard cannot be combined with --sqlite or --watch; merge the shards first")
+    if args.resume and args.watch: parser.error("--resume cannot be combined with --watch (its initial run is already incremental)")
+    if args.merge_shards and (args.shard or args.sqlite or args.watch or args.incremental or args.resume):
+        parser.error("--merge-shards only takes the shard output directories (and reads MEGAMEKLAB_DATA_DIR for the file order)")
+    MTF_PARSER_ENGINE = args.mtf_parser # Handed to the workers by _init_conversion_worker
+
     fixed_output_dir_name = os.environ.get("MEGAMEKLAB_OUTPUT_DIR", "megameklab_converted_output")
     os.makedirs(fixed_output_dir_name, exist_ok=True)
     current_run_log_path = os.path.join(fixed_output_dir_name, SKIPPED_FILES_LOG)
     if os.path.exists(current_run_log_path):
         try: os.remove(current_run_log_path)
         except OSError: pass
-    megameklab_data_dir = os.environ.get("MEGAMEKLAB_DATA_DIR", "megameklab/data/mekfiles") # Default path
-    if not os.path.isdir(megameklab_data_dir): print(f"Error: Data directory not found: {megameklab_data_dir}")
+    megameklab_data_dir = os.environ.get("MEGAMEKLAB_DATA_DIR", "megameklab/data/mekfiles") # Default path, or a .zip/.tar(.gz) of it
+    parse_cache_path = os.environ.get("MEGAMEKLAB_PARSE_CACHE", os.path.join(fixed_output_dir_name, PARSE_CACHE_FILE))
+    if parse_cache_path.lower() in ("", "off"): parse_cache_path = None
+    try: source_archive = open_source_tree(megameklab_data_dir)
+    except (OSError, zipfile.BadZipFile, tarfile.TarError) as e:
+        print(f"Error: Could not read data archive {megameklab_data_dir}: {e}"); return
+    if source_archive is None and not os.path.isdir(megameklab_data_dir): print(f"Error: Data directory not found: {megameklab_data_dir}")
+    elif source_archive is not None and args.watch: print("Error: --watch needs a data directory, not an archive")
     else:
+        if args.merge_shards:
+            try: merge_shard_outputs(args.merge_shards, megameklab_data_dir, fixed_output_dir_name)
+            except (OSError, ValueError) as e: print(f"Error: Could not merge shards: {e}")
+            return
         print(f"Starting conversion from '{megameklab_data_dir}'... Output will be in: '{fixed_output_dir_name}'")
-        processed_count = process_files(megameklab_data_dir, fixed_output_dir_name)
+        if args.watch:
+            watch_files(megameklab_data_dir, fixed_output_dir_name, chunksize=args.chunksize, layout=args.layout, sqlite_db=args.sqlite, interval=args.watch_interval,
+                        parse_cache_path=parse_cache_path)
+            return
+        processed_count = process_files(megameklab_data_dir, fixed_output_dir_name, incremental=args.incremental, chunksize=args.chunksize, layout=args.layout, sqlite_db=args.sqlite, shard=args.shard, resume=args.resume,
+                                        parse_cache_path=parse_cache_path)
         print(f"Processing complete. {processed_count} files converted.")
         print(f"Total unique equipment items derived: {len(DERIVED_EQUIPMENT)}")
         if os.path.exists(current_run_log_path):
@@ -976,3 +2462,6 @@ if __name__ == "__main__":
                     except OSError: pass
         else: print("No files were skipped or had errors.")
     print(f"Output directory name: {fixed_output_dir_name}")
+
+if __name__ == "__main__":
+    main()
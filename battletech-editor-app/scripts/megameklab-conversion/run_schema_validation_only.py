@@ -9,6 +9,7 @@ import sys
 sys.path.append(os.getcwd())
 try:
     from validator import validate_schema_compliance, load_json_schema # Corrected import
+    from unit_bundle import iter_unit_json # Reads the per-file JSON layout or the packed bundle
 except ImportError as e:
     print(f"Failed to import from validator.py: {e}")
     print("Ensure validator.py is in the current working directory or accessible via PYTHONPATH.")
@@ -50,44 +51,40 @@ def main():
     files_processed = 0
     files_with_errors = 0
 
-    for dirpath, _, filenames in os.walk(base_mekfiles_path):
-        for filename in filenames:
-            if filename.endswith(".json") and filename not in ["derivedEquipment.json", "UnitVerifierOptions.json"]:
-                filepath = Path(dirpath) / filename
-                unit_id_for_report = str(filepath.relative_to(base_mekfiles_path))
-                files_processed += 1
-
-                if files_processed % 500 == 0:
-                    print(f"Processed {files_processed} files...")
-
-                unit_type = determine_unit_type_from_path(filepath, base_mekfiles_path)
-                if unit_type == "unknown":
-                    validation_results[unit_id_for_report] = [f"Validator Error: Could not determine unit_type for {filepath}"]
-                    files_with_errors += 1
-                    continue
-
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        unit_json_data = json.load(f)
-                except json.JSONDecodeError as e:
-                    validation_results[unit_id_for_report] = [f"JSON Decode Error: {e}"]
-                    files_with_errors += 1
-                    continue
-                except Exception as e:
-                    validation_results[unit_id_for_report] = [f"File Read Error: {e}"]
-                    files_with_errors += 1
-                    continue
-
-                # Ensure unit_json_data is a dict, as expected by validate_schema_compliance
-                if not isinstance(unit_json_data, dict):
-                    validation_results[unit_id_for_report] = [f"Validator Error: Unit data is not a JSON object (dict). Found type: {type(unit_json_data)}"]
-                    files_with_errors +=1
-                    continue
-
-                errors = validate_schema_compliance(unit_json_data, unit_type, SCHEMAS_DIR)
-                if errors:
-                    validation_results[unit_id_for_report] = errors
-                    files_with_errors += 1
+    for unit_id_for_report, load_unit_json in iter_unit_json(base_mekfiles_path):
+        filepath = base_mekfiles_path / unit_id_for_report
+        files_processed += 1
+
+        if files_processed % 500 == 0:
+            print(f"Processed {files_processed} files...")
+
+        unit_type = determine_unit_type_from_path(filepath, base_mekfiles_path)
+        if unit_type == "unknown":
+            validation_results[unit_id_for_report] = [f"Validator Error: Could not determine unit_type for {filepath}"]
+            files_with_errors += 1
+            continue
+
+        try:
+            unit_json_data = load_unit_json()
+        except json.JSONDecodeError as e:
+            validation_results[unit_id_for_report] = [f"JSON Decode Error: {e}"]
+            files_with_errors += 1
+            continue
+        except Exception as e:
+            validation_results[unit_id_for_report] = [f"File Read Error: {e}"]
+            files_with_errors += 1
+            continue
+
+        # Ensure unit_json_data is a dict, as expected by validate_schema_compliance
+        if not isinstance(unit_json_data, dict):
+            validation_results[unit_id_for_report] = [f"Validator Error: Unit data is not a JSON object (dict). Found type: {type(unit_json_data)}"]
+            files_with_errors +=1
+            continue
+
+        errors = validate_schema_compliance(unit_json_data, unit_type, SCHEMAS_DIR)
+        if errors:
+            validation_results[unit_id_for_report] = errors
+            files_with_errors += 1
 
     print(f"Saving schema validation report to {OUTPUT_REPORT_FILE}...")
     try:
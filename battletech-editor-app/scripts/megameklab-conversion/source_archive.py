@@ -0,0 +1,172 @@
+"""
+Reading the MegaMekLab data files straight out of a .zip or .tar(.gz) archive.
+
+MEGAMEKLAB_DATA_DIR may name an archive ("mekfiles.zip") or a directory inside one ("data.tar.gz/mekfiles").
+Files in it are then addressed by virtual paths, the archive path joined with the member name
+(e.g. "mekfiles.zip/meks/3050U/Atlas AS7-D.mtf"), so relative paths, and with them the output layout,
+are the same as for the extracted tree. The converter reads through the helpers here:
+
+  open_source_tree(root)  registers the archive named by root; None for a plain directory
+  walk_source_tree(root)  sorted os.walk() replacement: (dirpath, filenames) top-down, names in sorted order
+  open_source_file(path)  open() replacement for reading
+  stat_source_file(path)  os.stat() replacement (st_size and st_mtime_ns only)
+
+Each process opens its own handle on first use (a handle inherited through fork would share its file
+position with the parent), so pool workers read members directly from the archive in parallel.
+"""
+import io
+import os
+import tarfile
+import time
+import zipfile
+from collections import namedtuple
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz")
+COMPRESSED_TAR_SUFFIXES = (".tar.gz", ".tgz")
+
+SourceStat = namedtuple("SourceStat", ["st_size", "st_mtime_ns"])
+
+_archives = {} # absolute archive path -> SourceArchive, for every archive registered in this process
+
+def split_archive_path(path):
+    """(archive path, directory inside the archive or "") if path names an archive or a directory in one, else None."""
+    archive_path, inner_parts = os.path.normpath(path), []
+    while not os.path.isfile(archive_path):
+        head, tail = os.path.split(archive_path)
+        if not tail or head == archive_path: return None
+        archive_path = head; inner_parts.insert(0, tail)
+    if not archive_path.lower().endswith(ARCHIVE_SUFFIXES): return None
+    return archive_path, "/".join(inner_parts)
+
+def _normalize_member_name(name):
+    # Member names as extraction would place them; None for names that would land outside the target directory.
+    parts = [part for part in name.replace("\\", "/").split("/") if part and part != "."]
+    if not parts or ".." in parts or name.startswith("/"): return None
+    return "/".join(parts)
+
+class SourceArchive:
+    """The regular-file members of a zip or tar archive, readable by member name."""
+
+    def __init__(self, archive_path):
+        self.archive_path = archive_path
+        self.is_zip = archive_path.lower().endswith(".zip")
+        # A compressed tar only reads efficiently front to back; see process_files' scheduling.
+        self.sequential = archive_path.lower().endswith(COMPRESSED_TAR_SUFFIXES)
+        self._handle = None; self._handle_pid = None
+        self._last_read = (None, None) # (member name, bytes) of the latest read
+        self.members = {} # member name -> (size, mtime_ns, zip member name or TarInfo), in archive order
+        handle = self._open()
+        if self.is_zip:
+            for info in handle.infolist():
+                name = _normalize_member_name(info.filename)
+                if name is None or info.is_dir(): continue
+                self.members[name] = (info.file_size, int(time.mktime(info.date_time + (0, 0, -1))) * 10**9, info.filename)
+        else:
+            for info in handle.getmembers():
+                name = _normalize_member_name(info.name)
+                if name is None or not info.isreg(): continue # Links and devices are not unit files
+                self.members[name] = (info.size, int(info.mtime) * 10**9, info)
+        self.positions = {name: position for position, name in enumerate(self.members)}
+
+    def _open(self):
+        # One handle per process, opened on first use in each.
+        if self._handle is None or self._handle_pid != os.getpid():
+            self._handle = zipfile.ZipFile(self.archive_path) if self.is_zip else tarfile.open(self.archive_path)
+            self._handle_pid = os.getpid()
+        return self._handle
+
+    def read(self, name):
+        """The bytes of one member (KeyError if there is no such file)."""
+        # A converted file is read twice in a row (parse, then fingerprint); a second read would seek a compressed tar backwards.
+        if self._last_read[0] == name: return self._last_read[1]
+        reference = self.members[name][2]
+        handle = self._open()
+        if self.is_zip: data = handle.read(reference)
+        else:
+            with handle.extractfile(reference) as member_file: data = member_file.read()
+        self._last_read = (name, data)
+        return data
+
+    def walk(self, inner_dir=""):
+        """(relative directory, [file names]) for every directory under inner_dir, top-down like os.walk, names sorted."""
+        prefix = inner_dir + "/" if inner_dir else ""
+        files_by_dir = {"": []}; subdirs_by_dir = {"": []}
+        for name in self.members:
+            if not name.startswith(prefix): continue
+            relative_dir, _, filename = name[len(prefix):].rpartition("/")
+            if relative_dir not in files_by_dir:
+                # Register the directory and any missing ancestors with their parents.
+                parts = relative_dir.split("/")
+                for depth in range(1, len(parts) + 1):
+                    directory = "/".join(parts[:depth])
+                    if directory in files_by_dir: continue
+                    files_by_dir[directory] = []; subdirs_by_dir[directory] = []
+                    subdirs_by_dir["/".join(parts[:depth - 1])].append(directory)
+            files_by_dir[relative_dir].append(filename)
+        pending = [""]
+        while pending:
+            directory = pending.pop()
+            yield directory, sorted(files_by_dir[directory])
+            pending.extend(sorted(subdirs_by_dir[directory], reverse=True))
+
+    def close(self):
+        if self._handle is not None and self._handle_pid == os.getpid(): self._handle.close()
+        self._handle = None
+
+def open_source_tree(root_dir):
+    """Registers and returns the SourceArchive that root_dir points into, or None for a plain directory.
+
+    Raises OSError (or zipfile.BadZipFile / tarfile.ReadError) for an archive that cannot be read.
+    """
+    split = split_archive_path(root_dir)
+    if split is None: return None
+    archive_path = os.path.abspath(split[0])
+    if archive_path not in _archives: _archives[archive_path] = SourceArchive(archive_path)
+    return _archives[archive_path]
+
+def _find_member(path):
+    # (SourceArchive, member name) for a virtual path inside a registered archive, else None.
+    path = os.path.abspath(path)
+    for archive_path, archive in _archives.items():
+        if path.startswith(archive_path + os.sep): return archive, path[len(archive_path) + 1:].replace(os.sep, "/")
+    return None
+
+def walk_source_tree(root_dir):
+    """(dirpath, filenames) like os.walk(root_dir), for a directory or over an archive's members.
+
+    Directory and file names are sorted, so the walk order (the converter's plan order) is the same on every
+    filesystem and for an archive of the same tree.
+    """
+    archive = open_source_tree(root_dir)
+    if archive is None:
+        for dirpath, dirnames, filenames in os.walk(root_dir):
+            dirnames.sort() # Sorting in place also orders the descent
+            yield dirpath, sorted(filenames)
+        return
+    inner_dir = split_archive_path(root_dir)[1]
+    for relative_dir, filenames in archive.walk(inner_dir):
+        yield (os.path.join(root_dir, *relative_dir.split("/")) if relative_dir else root_dir), filenames
+
+def open_source_file(path, mode='r', encoding=None, errors=None):
+    """open(path, mode, ...) for reading, also for virtual paths inside a registered archive."""
+    found = _find_member(path) if _archives else None
+    if found is None: return open(path, mode, encoding=encoding, errors=errors)
+    archive, name = found
+    try: data = archive.read(name)
+    except KeyError: raise FileNotFoundError(f"No such file in {archive.archive_path}: {name}")
+    if 'b' in mode: return io.BytesIO(data)
+    return io.TextIOWrapper(io.BytesIO(data), encoding=encoding, errors=errors)
+
+def stat_source_file(path):
+    """os.stat(path), or the size and modification time recorded for an archive member."""
+    found = _find_member(path) if _archives else None
+    if found is None: return os.stat(path)
+    archive, name = found
+    if name not in archive.members: raise FileNotFoundError(f"No such file in {archive.archive_path}: {name}")
+    size, mtime_ns, _ = archive.members[name]
+    return SourceStat(size, mtime_ns)
+
+def source_read_position(path):
+    """Position of an archive member in its archive (0 for files on disk); sorts reads into archive order."""
+    found = _find_member(path) if _archives else None
+    return found[0].positions.get(found[1], 0) if found else 0
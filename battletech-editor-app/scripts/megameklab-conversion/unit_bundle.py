@@ -0,0 +1,248 @@
+"""
+Packed bundle layout for converted units.
+
+Instead of one pretty-printed JSON file per unit, the converter can write every unit into a single
+append-only data file next to derivedEquipment.json, plus an index sidecar:
+
+  units.bundle.jsonl    one JSON object per line: {"path": <relative .json path>, "data": <unit>}
+  units.bundle.jsonl.z  the same records, each compressed on its own with zlib so any record can be read alone
+  units.bundle.idx      JSON: {"format", "compression", "data_file", "entries": [[path, offset, length], ...]}
+
+Entries are kept in file order, so a full read is one sequential pass. A single unit can be fetched by
+its relative path (e.g. "meks/3050U/Atlas AS7-D.json") with one seek. Rewriting a unit appends a new
+record and repoints the index; the data file is compacted once stale records outweigh live ones, or
+whenever records are out of path order if the writer keeps path order. The index is replaced atomically after the data is written, so an interrupted append leaves the previous
+index, and every record it points to, intact.
+
+iter_unit_json() gives the downstream scripts one way to read either layout; iter_unit_paths() and
+read_unit_record() also give them each unit's stored bytes, e.g. to hash them without decoding.
+"""
+import json
+import os
+import zlib
+
+BUNDLE_FORMAT = 1
+BUNDLE_INDEX_FILE = "units.bundle.idx"
+BUNDLE_DATA_FILES = {"none": "units.bundle.jsonl", "zlib": "units.bundle.jsonl.z"}
+BUNDLE_COMPRESSIONS = tuple(BUNDLE_DATA_FILES)
+NON_UNIT_JSON_FILES = ("derivedEquipment.json", "UnitVerifierOptions.json") # Never bundled; always separate files
+READ_BUFFER_SIZE = 1 << 20
+
+def encode_record(relative_path, data, compression="none"):
+    """Serialises one unit as a bundle record (bytes)."""
+    line = (json.dumps({"path": relative_path, "data": data}, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+    return zlib.compress(line) if compression == "zlib" else line
+
+def decode_record(raw_record, compression="none"):
+    """Returns (relative_path, unit data) for a record produced by encode_record."""
+    if compression == "zlib": raw_record = zlib.decompress(raw_record)
+    record = json.loads(raw_record)
+    return record["path"], record["data"]
+
+def has_bundle(mekfiles_dir):
+    return os.path.exists(os.path.join(mekfiles_dir, BUNDLE_INDEX_FILE))
+
+def load_bundle_index(mekfiles_dir):
+    """Loads the index sidecar, or returns None if there is no usable bundle."""
+    index_path = os.path.join(mekfiles_dir, BUNDLE_INDEX_FILE)
+    if not os.path.exists(index_path): return None
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f: index = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Warning: Could not read bundle index {index_path}: {e}")
+        return None
+    if not isinstance(index, dict) or index.get("format") != BUNDLE_FORMAT or index.get("compression") not in BUNDLE_COMPRESSIONS: return None
+    return index
+
+def remove_bundle(mekfiles_dir):
+    """Deletes the index and data files of any bundle in mekfiles_dir; returns True if something was removed."""
+    removed = False
+    for filename in (BUNDLE_INDEX_FILE,) + tuple(BUNDLE_DATA_FILES.values()):
+        path = os.path.join(mekfiles_dir, filename)
+        if os.path.exists(path): os.remove(path); removed = True
+    return removed
+
+class UnitBundleWriter:
+    """Appends unit records to a bundle and rewrites its index on close().
+
+    With append=True an existing bundle of the same compression is extended (unchanged units keep
+    their records); otherwise any existing bundle is replaced. With keep_path_order (the default for a
+    fresh bundle) close() rewrites records that arrived out of path order, e.g. from parallel workers or
+    an append, so the bundle's bytes only depend on its content.
+    """
+
+    def __init__(self, mekfiles_dir, compression="none", append=False, keep_path_order=None):
+        if compression not in BUNDLE_COMPRESSIONS: raise ValueError(f"Unknown bundle compression '{compression}'")
+        os.makedirs(mekfiles_dir, exist_ok=True)
+        self.mekfiles_dir = mekfiles_dir
+        self.compression = compression
+        self.data_path = os.path.join(mekfiles_dir, BUNDLE_DATA_FILES[compression])
+        self.entries = {} # relative path -> (offset, length)
+        self.keep_path_order = not append if keep_path_order is None else keep_path_order
+
+        existing_index = load_bundle_index(mekfiles_dir) if append else None
+        if existing_index and existing_index["compression"] == compression and os.path.exists(self.data_path):
+            self.entries = {path: (offset, length) for path, offset, length in existing_index["entries"]}
+            self.data_file = open(self.data_path, 'r+b')
+            # Drop anything past the last indexed record (left by a writer that never got to close()).
+            self.data_file.truncate(max((offset + length for offset, length in self.entries.values()), default=0))
+            self.data_file.seek(0, os.SEEK_END)
+        else:
+            remove_bundle(mekfiles_dir)
+            self.data_file = open(self.data_path, 'w+b')
+        self.offset = self.data_file.tell()
+
+    def add_record(self, relative_path, raw_record):
+        """Appends a record already produced by encode_record (e.g. in a worker process)."""
+        self.data_file.write(raw_record)
+        self.entries[relative_path] = (self.offset, len(raw_record))
+        self.offset += len(raw_record)
+
+    def add(self, relative_path, data):
+        self.add_record(relative_path, encode_record(relative_path, data, self.compression))
+
+    def discard(self, relative_path):
+        """Drops a unit from the index; its bytes are reclaimed by the next compaction."""
+        return self.entries.pop(relative_path, None) is not None
+
+    def __contains__(self, relative_path): return relative_path in self.entries
+    def __len__(self): return len(self.entries)
+
+    def checkpoint(self):
+        """Makes the records added so far durable: an append after a crash resumes from this index."""
+        self.data_file.flush(); os.fsync(self.data_file.fileno())
+        self._write_index()
+
+    def close(self):
+        self.data_file.flush(); os.fsync(self.data_file.fileno())
+        live_bytes = sum(length for _, length in self.entries.values())
+        # Without keep_path_order (e.g. --watch appends) out-of-order records stay until the next compaction.
+        if self.offset > 2 * live_bytes or (self.keep_path_order and not self._in_path_order()): self._compact()
+        self.data_file.close()
+        self._write_index()
+
+    def _in_path_order(self):
+        paths_in_file_order = [path for path, _ in sorted(self.entries.items(), key=lambda item: item[1][0])]
+        return paths_in_file_order == sorted(paths_in_file_order)
+
+    def _compact(self):
+        # Rewrites the live records, in path order, into a fresh data file.
+        compact_path = self.data_path + ".compact"
+        new_entries = {}; new_offset = 0
+        with open(compact_path, 'wb') as compact_file:
+            for relative_path, (offset, length) in sorted(self.entries.items()):
+                self.data_file.seek(offset)
+                compact_file.write(self.data_file.read(length))
+                new_entries[relative_path] = (new_offset, length); new_offset += length
+            compact_file.flush(); os.fsync(compact_file.fileno())
+        self.data_file.close()
+        os.replace(compact_path, self.data_path)
+        self.data_file = open(self.data_path, 'rb')
+        self.entries = new_entries; self.offset = new_offset
+
+    def _write_index(self):
+        index_path = os.path.join(self.mekfiles_dir, BUNDLE_INDEX_FILE)
+        entries = [[path, offset, length] for path, (offset, length) in sorted(self.entries.items(), key=lambda item: item[1][0])]
+        temp_path = index_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"format": BUNDLE_FORMAT, "compression": self.compression,
+                       "data_file": os.path.basename(self.data_path), "entries": entries}, f, ensure_ascii=False)
+            f.flush(); os.fsync(f.fileno())
+        os.replace(temp_path, index_path)
+
+    def __enter__(self): return self
+    def __exit__(self, exc_type, exc_value, traceback): self.close()
+
+class UnitBundleReader:
+    """Sequential and random access to the units in a bundle."""
+
+    def __init__(self, mekfiles_dir):
+        index = load_bundle_index(mekfiles_dir)
+        if index is None: raise FileNotFoundError(f"No unit bundle in {mekfiles_dir}")
+        self.compression = index["compression"]
+        self.data_path = os.path.join(mekfiles_dir, index["data_file"])
+        self.entries = index["entries"] # [path, offset, length] in file order
+        self.offsets = {path: (offset, length) for path, offset, length in self.entries}
+        self._data_file = None
+
+    def __len__(self): return len(self.entries)
+    def __contains__(self, relative_path): return relative_path in self.offsets
+    def paths(self): return [path for path, _, _ in self.entries]
+
+    def read_raw(self, relative_path):
+        offset, length = self.offsets[relative_path]
+        if self._data_file is None: self._data_file = open(self.data_path, 'rb')
+        self._data_file.seek(offset)
+        return self._data_file.read(length)
+
+    def get(self, relative_path):
+        """Returns the unit stored under relative_path (KeyError if absent)."""
+        return decode_record(self.read_raw(relative_path), self.compression)[1]
+
+    def iter_raw(self):
+        # One forward pass with a large buffer; only seeks over gaps left by replaced records.
+        with open(self.data_path, 'rb', buffering=READ_BUFFER_SIZE) as data_file:
+            position = 0
+            for path, offset, length in self.entries:
+                if offset != position: data_file.seek(offset)
+                yield path, data_file.read(length)
+                position = offset + length
+
+    def __iter__(self):
+        for path, raw_record in self.iter_raw(): yield path, decode_record(raw_record, self.compression)[1]
+
+    def close(self):
+        if self._data_file is not None: self._data_file.close(); self._data_file = None
+
+    def __enter__(self): return self
+    def __exit__(self, exc_type, exc_value, traceback): self.close()
+
+def iter_unit_json(mekfiles_dir, exclude=NON_UNIT_JSON_FILES):
+    """Yields (relative_path, load) for every converted unit, from the bundle if there is one, else from the .json files.
+
+    load() returns the unit's data and raises json.JSONDecodeError / OSError like json.load(open(...)) would,
+    so callers keep their per-unit error handling for either layout.
+    """
+    if has_bundle(mekfiles_dir):
+        reader = UnitBundleReader(mekfiles_dir)
+        for relative_path, raw_record in reader.iter_raw():
+            yield relative_path, lambda raw_record=raw_record: decode_record(raw_record, reader.compression)[1]
+        return
+    for dirpath, dirnames, filenames in os.walk(mekfiles_dir):
+        dirnames.sort() # Same order on every filesystem
+        relative_dir = os.path.relpath(dirpath, mekfiles_dir) # Once per directory; relpath is slow enough to matter per file
+        for filename in sorted(filenames):
+            if filename.endswith(".json") and filename not in exclude:
+                filepath = os.path.join(dirpath, filename)
+                relative_path = filename if relative_dir == os.curdir else os.path.join(relative_dir, filename)
+                yield relative_path, lambda filepath=filepath: _load_json_file(filepath)
+
+def iter_unit_paths(mekfiles_dir, exclude=NON_UNIT_JSON_FILES):
+    """Yields the relative path of every converted unit, in the order iter_unit_json yields the units."""
+    if has_bundle(mekfiles_dir):
+        yield from UnitBundleReader(mekfiles_dir).paths()
+        return
+    for relative_path, _ in iter_unit_json(mekfiles_dir, exclude): yield relative_path
+
+# mekfiles_dir -> (pid, UnitBundleReader, or None for the per-file layout). Per process: a reader inherited through
+# fork would share its file position with the parent.
+_record_readers = {}
+
+def read_unit_record(mekfiles_dir, relative_path):
+    """(raw, load) for one unit: its stored bytes (bundle record or .json file) and a function decoding them.
+
+    Raises OSError if the unit cannot be read (KeyError for a path missing from the bundle). The layout is looked up
+    once per process and a bundle is kept open, so the output must not be rewritten while units are being read.
+    """
+    cached = _record_readers.get(mekfiles_dir)
+    if cached is None or cached[0] != os.getpid():
+        cached = _record_readers[mekfiles_dir] = (os.getpid(), UnitBundleReader(mekfiles_dir) if has_bundle(mekfiles_dir) else None)
+    reader = cached[1]
+    if reader is not None:
+        raw_record = reader.read_raw(relative_path)
+        return raw_record, lambda: decode_record(raw_record, reader.compression)[1]
+    with open(os.path.join(mekfiles_dir, relative_path), 'rb') as f: raw = f.read()
+    return raw, lambda: json.loads(raw)
+
+def _load_json_file(filepath):
+    with open(filepath, 'r', encoding='utf-8') as f: return json.load(f)
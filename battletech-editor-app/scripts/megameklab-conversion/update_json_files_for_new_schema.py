@@ -2,6 +2,7 @@
 """
 Script to update all converted JSON files to match the new schema requirements.
 Adds tech_base fields to equipment items and OmniMech-specific fields.
+Works on either converter layout: one JSON file per unit, or the packed unit bundle (see unit_bundle.py).
 """
 
 import os
@@ -9,6 +10,8 @@ import json
 import re
 from pathlib import Path
 
+from unit_bundle import UnitBundleReader, UnitBundleWriter, has_bundle
+
 # Base directory for the converted files
 CONVERTED_DIR = Path("battletech-editor-app/data/megameklab_converted_output/mekfiles")
 
@@ -120,6 +123,44 @@ def is_equipment_omnipod(item_name: str, unit_data: dict) -> bool:
     # Most weapons and ammo are pod-mounted on OmniMechs
     return True
 
+def update_unit_data(unit_data: dict) -> bool:
+    """
+    Apply the new schema requirements to one unit in place. Returns True if anything changed.
+    """
+    # Track if we made any changes
+    changed = False
+        
+    # Add OmniMech information
+    omnimech_info = determine_omnimech_info(unit_data)
+    if omnimech_info:
+        for key, value in omnimech_info.items():
+            if key not in unit_data:
+                unit_data[key] = value
+                changed = True
+    
+    # Update weapons and equipment
+    if 'weapons_and_equipment' in unit_data:
+        unit_tech_base = unit_data.get('tech_base', 'Inner Sphere')
+        
+        for item in unit_data['weapons_and_equipment']:
+            # Add tech_base if missing
+            if 'tech_base' not in item:
+                item['tech_base'] = determine_equipment_tech_base(
+                    item.get('item_name', ''), 
+                    unit_tech_base
+                )
+                changed = True
+            
+            # Add is_omnipod if missing and it's an OmniMech
+            if 'is_omnipod' not in item:
+                item['is_omnipod'] = is_equipment_omnipod(
+                    item.get('item_name', ''), 
+                    unit_data
+                )
+                changed = True
+
+    return changed
+
 def update_unit_file(file_path: Path):
     """
     Update a single unit JSON file with new schema requirements.
@@ -128,37 +169,7 @@ def update_unit_file(file_path: Path):
         with open(file_path, 'r', encoding='utf-8') as f:
             unit_data = json.load(f)
         
-        # Track if we made any changes
-        changed = False
-        
-        # Add OmniMech information
-        omnimech_info = determine_omnimech_info(unit_data)
-        if omnimech_info:
-            for key, value in omnimech_info.items():
-                if key not in unit_data:
-                    unit_data[key] = value
-                    changed = True
-        
-        # Update weapons and equipment
-        if 'weapons_and_equipment' in unit_data:
-            unit_tech_base = unit_data.get('tech_base', 'Inner Sphere')
-            
-            for item in unit_data['weapons_and_equipment']:
-                # Add tech_base if missing
-                if 'tech_base' not in item:
-                    item['tech_base'] = determine_equipment_tech_base(
-                        item.get('item_name', ''), 
-                        unit_tech_base
-                    )
-                    changed = True
-                
-                # Add is_omnipod if missing and it's an OmniMech
-                if 'is_omnipod' not in item:
-                    item['is_omnipod'] = is_equipment_omnipod(
-                        item.get('item_name', ''), 
-                        unit_data
-                    )
-                    changed = True
+        changed = update_unit_data(unit_data)
         
         # Save the file if we made changes
         if changed:
@@ -177,6 +188,10 @@ def update_all_unit_files():
     """
     Update all unit JSON files in the converted directory.
     """
+    if has_bundle(CONVERTED_DIR):
+        update_bundled_units()
+        return
+
     total_files = 0
     updated_files = 0
     
@@ -196,6 +211,49 @@ def update_all_unit_files():
     
     print(f"\nCompleted: {total_files} files processed, {updated_files} files updated")
 
+def update_bundled_units():
+    """
+    Update the units of a packed bundle. Changed units are appended as new records and the index is repointed.
+    """
+    total_files = 0
+    updated_files = 0
+    
+    with UnitBundleReader(CONVERTED_DIR) as reader, UnitBundleWriter(CONVERTED_DIR, reader.compression, append=True) as writer:
+        for relative_path, unit_data in reader:
+            total_files += 1
+            try:
+                if update_unit_data(unit_data):
+                    writer.add(relative_path, unit_data)
+                    print(f"Updated: {relative_path}")
+                    updated_files += 1
+            except Exception as e:
+                print(f"Error processing {relative_path}: {e}")
+            
+            # Progress indicator
+            if total_files % 100 == 0:
+                print(f"Processed {total_files} units, updated {updated_files}")
+    
+    print(f"\nCompleted: {total_files} bundled units processed, {updated_files} units updated")
+
+def sample_unit_exists(sample_file: str) -> bool:
+    """
+    Check whether a converted unit exists in whichever layout is present.
+    """
+    if has_bundle(CONVERTED_DIR):
+        with UnitBundleReader(CONVERTED_DIR) as reader:
+            return sample_file in reader
+    return (CONVERTED_DIR / sample_file).exists()
+
+def load_sample_unit(sample_file: str) -> dict:
+    """
+    Load a converted unit by its relative path from whichever layout is present.
+    """
+    if has_bundle(CONVERTED_DIR):
+        with UnitBundleReader(CONVERTED_DIR) as reader:
+            return reader.get(sample_file)
+    with open(CONVERTED_DIR / sample_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
 def validate_sample_files():
     """
     Validate a few sample files to ensure updates are working correctly.
@@ -208,11 +266,9 @@ def validate_sample_files():
     
     print("Validating sample files:")
     for sample_file in sample_files:
-        file_path = CONVERTED_DIR / sample_file
-        if file_path.exists():
+        if sample_unit_exists(sample_file):
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    unit_data = json.load(f)
+                unit_data = load_sample_unit(sample_file)
                 
                 # Check if equipment has tech_base
                 equipment_valid = True